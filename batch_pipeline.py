@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import copy
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+from main_pipeline import run_pipeline_async, run_with_db, request_checkpoint_key
+from script_bundle import write_bundle, load_plan_checkpoint
+from review_queue import UnmatchedRequest
+from utils.config import BATCH_CONCURRENCY, PROJECT_DIR, get_local_timestamp_string
+from utils.checkpoint_utils import hash_json
+from utils.llm_scheduler import PRIORITY_BATCH, priority, counting_calls
+from utils.logging_utils import log_pipeline_event
+from utils.db_utils import close_pool
+from utils.json_extract import json_extract_stats
+
+pipeline_name = "batch_pipeline"
+
+
+# ----------------------------------------------------------------------
+# Coalescing of identical requests
+# ----------------------------------------------------------------------
+
+def coalesce_key(context_for_agents: dict) -> str:
+    """
+    Two requests are identical for planning when they matched the same use
+    case with the same normalized params.
+    """
+    use_case_sql = context_for_agents.get("use_case_sql") or {}
+    doc_id = use_case_sql.get("doc_id", use_case_sql.get("id"))
+    params = {
+        k: v.strip() if isinstance(v, str) else v
+        for k, v in (context_for_agents.get("params") or {}).items()
+    }
+    return hash_json([doc_id, params])
+
+
+class RequestCoalescer:
+    """
+    Shares one discovery + planning run between identical requests of a
+    batch. The first request (leader) runs the agents; every other request
+    with the same key awaits the same task and gets its own copy of the
+    plan, marked with "shared_plan_of".
+    """
+
+    def __init__(self):
+        self._runs: Dict[str, asyncio.Task] = {}
+        self._leaders: Dict[str, str] = {}
+        self.stats = {
+            "requests": 0,
+            "shared_runs": 0,
+            "coalesced_requests": 0,
+            "llm_calls_in_shared_runs": 0,
+            "llm_calls_saved": 0,
+        }
+
+    async def _run_counted(self, factory):
+        with counting_calls() as counter:
+            plan = await factory()
+        self.stats["llm_calls_in_shared_runs"] += counter["calls"]
+        return plan, counter["calls"]
+
+    async def run(self, context_for_agents: dict, request_id: str, factory) -> dict:
+        key = coalesce_key(context_for_agents)
+        self.stats["requests"] += 1
+
+        task = self._runs.get(key)
+        if task is None:
+            self._leaders[key] = request_id
+            task = asyncio.ensure_future(self._run_counted(factory))
+            self._runs[key] = task
+            self.stats["shared_runs"] += 1
+            plan, _ = await task
+            return plan
+
+        leader_id = self._leaders[key]
+        plan, calls = await task
+        self.stats["coalesced_requests"] += 1
+        self.stats["llm_calls_saved"] += calls
+
+        log_pipeline_event(
+            request_id=request_id, pipeline_name=pipeline_name, stage="coalesce:shared_plan",
+            data={"shared_plan_of": leader_id, "llm_calls_saved": calls}
+        )
+
+        shared = copy.deepcopy(plan)
+        shared["request_id"] = request_id
+        shared["shared_plan_of"] = leader_id
+        return shared
+
+
+# ----------------------------------------------------------------------
+# Batch runner
+# ----------------------------------------------------------------------
+
+async def run_batch_async(input_files: List[str], concurrency: int = BATCH_CONCURRENCY,
+                          resume: bool = False) -> Dict[str, Any]:
+    coalescer = RequestCoalescer()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(input_file: str) -> Dict[str, Any]:
+        async with semaphore:
+            with priority(PRIORITY_BATCH):
+                try:
+                    script = await run_pipeline_async(input_file, resume=resume, coalescer=coalescer)
+                    return {"input_file": input_file, "checkpoint_key": request_checkpoint_key(input_file),
+                            "script": script["path"], "error": None}
+                except UnmatchedRequest as error:
+                    print(f" run_batch : {input_file} routed to review: {error}")
+                    return {"input_file": input_file, "script": None, "error": str(error),
+                            "review": error.review["source"]}
+                except Exception as error:
+                    print(f" run_batch : {input_file} failed: {error}")
+                    return {"input_file": input_file, "script": None, "error": str(error)}
+
+    with counting_calls() as counter:
+        results = await asyncio.gather(*(run_one(f) for f in input_files))
+
+    report = {
+        "requests": len(input_files),
+        "failed": sum(1 for r in results if r["error"]),
+        "routed_to_review": sum(1 for r in results if r.get("review")),
+        "review_from_negative_cache": sum(1 for r in results if r.get("review") == "negative_cache"),
+        "llm_calls": counter["calls"],
+        "coalescing": coalescer.stats,
+        "model_json": json_extract_stats(),
+        "results": results,
+    }
+
+    log_pipeline_event(
+        request_id="BATCH", pipeline_name=pipeline_name, stage="run_batch:end",
+        data=lambda: {k: v for k, v in report.items() if k != "results"}
+    )
+    return report
+
+
+def resolve_input_files(patterns: List[str]) -> List[str]:
+    """File names or glob patterns, relative to data_files/."""
+    data_dir = PROJECT_DIR / "data_files"
+    files = []
+    for pattern in patterns:
+        matches = sorted(p.name for p in data_dir.glob(pattern)) if any(c in pattern for c in "*?[") else [pattern]
+        files.extend(m for m in matches if m not in files)
+    return files
+
+
+def approved_plans(results: List[Dict[str, Any]]) -> List[str]:
+    """
+    Checkpoint keys of the requests whose plan goes into the bundle: the
+    pipeline succeeded and a dry run, if one was made, did not fail.
+    """
+    approved = []
+    for result in results:
+        if result["error"] or not result["script"]:
+            continue
+        dry_run_path = Path(result["script"]).with_suffix(".dryrun.json")
+        if dry_run_path.exists():
+            with open(dry_run_path, "r", encoding="utf-8") as f:
+                if json.load(f).get("script", {}).get("error"):
+                    continue
+        approved.append(result["checkpoint_key"])
+    return approved
+
+
+def run_batch(patterns: List[str], concurrency: int = BATCH_CONCURRENCY, resume: bool = False,
+              bundle: bool = False) -> Dict[str, Any]:
+    input_files = resolve_input_files(patterns)
+    report = asyncio.run(run_with_db(run_batch_async(input_files, concurrency=concurrency, resume=resume)))
+
+    run_stamp = get_local_timestamp_string()
+    data_dir = PROJECT_DIR / "data_files"
+    if bundle:
+        # one execution bundle (+ manifest) for all approved plans of the run
+        bundle_info = write_bundle(approved_plans(report["results"]), load_plan_checkpoint,
+                                   str(data_dir / f"bundle_{run_stamp}.sql"))
+        close_pool()
+        report["bundle"] = {k: bundle_info[k] for k in ("path", "manifest_path", "actions", "sha256")}
+
+    report_path = data_dir / f"batch_report_{run_stamp}.json"
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+
+    stats = report["coalescing"]
+    print(f"Done. {report['requests']} request(s), {report['failed']} failed "
+          f"({report['routed_to_review']} routed to review, {report['review_from_negative_cache']} without model calls), "
+          f"{stats['coalesced_requests']} coalesced, {report['llm_calls']} LLM call(s), "
+          f"{stats['llm_calls_saved']} LLM call(s) saved by dedup, "
+          f"{report['model_json']['reruns_avoided']} re-run(s) avoided by JSON repair. Report: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the TEXT-TO-DML pipeline for a batch of request files")
+    parser.add_argument("inputs", nargs="+", help="request files or glob patterns inside data_files/")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--resume", action="store_true", help="reuse valid stage checkpoints")
+    parser.add_argument("--bundle", action="store_true",
+                        help="also write one transactional bundle + manifest for all approved plans")
+    args = parser.parse_args()
+    run_batch(args.inputs, concurrency=args.concurrency, resume=args.resume, bundle=args.bundle)
@@ -0,0 +1,79 @@
+"""
+Concurrent-request scaling: blocking connect-per-call vs the shared async pool.
+
+Every simulated request issues the same DB round trips as one pipeline run
+(1 retrieval query, 1 probe query, N log inserts). Server work is simulated
+with pg_sleep so no table is touched.
+
+    python benchmarks/bench_async_db.py --requests 1 2 4 8 16 --latency-ms 5
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import psycopg  # noqa: E402
+
+from utils import db_utils  # noqa: E402
+
+SLEEP_SQL = "SELECT pg_sleep(%s)"
+
+
+def round_trips(log_inserts: int) -> int:
+    return 2 + log_inserts  # retrieval + probe + logs
+
+
+# --- before: blocking calls inside coroutines (old psycopg2 style) -----
+
+async def blocking_request(latency: float, log_inserts: int) -> None:
+    for _ in range(round_trips(log_inserts)):
+        conn = psycopg.connect(db_utils.get_conninfo())
+        try:
+            with conn.cursor() as cur:
+                cur.execute(SLEEP_SQL, (latency,))
+                cur.fetchone()
+        finally:
+            conn.close()
+
+
+# --- after: shared async pool ------------------------------------------
+
+async def async_request(latency: float, log_inserts: int) -> None:
+    for _ in range(round_trips(log_inserts)):
+        await db_utils.fetch_one(SLEEP_SQL, (latency,))
+
+
+async def run_level(request_fn, concurrency: int, latency: float, log_inserts: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(request_fn(latency, log_inserts) for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def main(levels, latency_ms: float, log_inserts: int) -> None:
+    latency = latency_ms / 1000.0
+
+    # warm the pool so the first level does not pay for pool startup
+    await db_utils.fetch_one("SELECT 1")
+
+    print(f"{'requests':>8} | {'blocking (s)':>12} | {'async pool (s)':>14} | {'speedup':>7}")
+    print("-" * 52)
+    for n in levels:
+        t_block = await run_level(blocking_request, n, latency, log_inserts)
+        t_async = await run_level(async_request, n, latency, log_inserts)
+        print(f"{n:>8} | {t_block:>12.3f} | {t_async:>14.3f} | {t_block / t_async:>6.1f}x")
+
+    await db_utils.close_async_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--latency-ms", type=float, default=5.0,
+                        help="simulated server time per round trip")
+    parser.add_argument("--log-inserts", type=int, default=8,
+                        help="log rows written per request")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.latency_ms, args.log_inserts))
@@ -0,0 +1,109 @@
+"""
+DML script rendering: one statement per action vs batched set-based groups.
+
+A synthetic plan with --actions actions (inserts, updates and
+expire_and_insert on one table) is rendered in both modes; each script is
+then executed against a scratch table seeded with the rows the plan
+touches, inside a transaction that is rolled back, so both runs see the
+same data.
+
+    python benchmarks/bench_dml_render.py --actions 10000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gen_dml_script_file import render_sql_text  # noqa: E402
+from utils import db_utils  # noqa: E402
+
+SCHEMA = "bench_dml"
+TABLE = f"{SCHEMA}.tariff"
+
+# metadata of TABLE as utils/table_metadata returns it (the table is created after rendering)
+COLUMNS = {TABLE: {
+    name: {"type": col_type, "category": category, "not_null": False, "has_default": False}
+    for name, col_type, category in [
+        ("id", "integer", "N"), ("code", "character varying(20)", "S"), ("amount", "numeric(12,2)", "N"),
+        ("date_in", "date", "D"), ("date_out", "date", "D"),
+    ]
+}}
+
+
+def build_plan(actions: int) -> dict:
+    items = []
+    next_id = actions + 1
+    for i in range(1, actions + 1):
+        kind = i % 5
+        if kind in (0, 1):
+            items.append({"target_table": TABLE, "action": "insert", "reason": "new tariff",
+                          "fields": {"id": next_id, "code": f"N{next_id}", "amount": "1.00"}})
+            next_id += 1
+        elif kind in (2, 3):
+            items.append({"target_table": TABLE, "action": "update", "reason": "new amount",
+                          "keys": {"id": i}, "fields": {"amount": f"{i % 100}.50"}})
+        else:
+            items.append({"target_table": TABLE, "action": "expire_and_insert", "reason": "new version",
+                          "keys": {"id": i}, "fields": {"id": next_id, "code": f"C{i}", "amount": "2.00"}})
+            next_id += 1
+    return {"request_id": "BENCH", "title": "bench", "actions": items}
+
+
+def setup(conn, actions: int) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+            CREATE SCHEMA {SCHEMA};
+            CREATE TABLE {TABLE} (
+                id integer PRIMARY KEY, code varchar(20), amount numeric(12,2),
+                date_in date NOT NULL DEFAULT CURRENT_DATE, date_out date);
+        """)
+        cur.execute(f"INSERT INTO {TABLE} (id, code, amount) "
+                    f"SELECT g, 'C' || g, 1 FROM generate_series(1, %s) g", (actions,))
+        cur.execute(f"ANALYZE {TABLE}")
+    conn.commit()
+
+
+def execute_rolled_back(conn, script: str) -> float:
+    began = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(script)
+    elapsed = time.perf_counter() - began
+    conn.rollback()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-action vs batched DML rendering")
+    parser.add_argument("--actions", type=int, default=10_000)
+    parser.add_argument("--no-exec", action="store_true", help="only measure rendering")
+    args = parser.parse_args()
+
+    plan = build_plan(args.actions)
+    results = {"actions": args.actions}
+    scripts = {}
+    for mode in ("per_action", "batched"):
+        began = time.perf_counter()
+        scripts[mode] = render_sql_text(plan, mode=mode, columns=COLUMNS)
+        results[mode] = {
+            "render_s": round(time.perf_counter() - began, 3),
+            "script_kb": len(scripts[mode].encode("utf-8")) // 1024,
+        }
+
+    if not args.no_exec:
+        with db_utils.connection() as conn:
+            setup(conn, args.actions)
+            for mode, script in scripts.items():
+                results[mode]["execute_s"] = round(execute_rolled_back(conn, script), 3)
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+            conn.commit()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
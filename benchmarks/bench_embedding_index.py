@@ -0,0 +1,184 @@
+"""
+Reduced-dimension / halfvec ANN indexes vs the full-precision baseline, on a
+synthetic catalog (default 100k rows x 768 dims) in a scratch schema.
+
+Synthetic vectors: --centers cluster centres plus noise, with a
+per-dimension scale decaying as j^-decay, so that (like text-embedding-004)
+the leading dimensions carry most of the variance. Queries are noisy copies
+of the centres.
+
+Ground truth: exact top-k on the full vectors (sequential scan, no index).
+Variants (--dims; 0 = full vector, d = first d dimensions as halfvec, see
+embedding_index.ann_expression), one index at a time:
+  - build_s           CREATE INDEX time
+  - index_kb          pg_relation_size of the index
+  - bytes_per_vector  4 * dims for vector, 2 * dims for halfvec
+  - index_used        the planner picked the index (EXPLAIN)
+  - ann     p50 / p95 ms and recall@k of the top-k straight from the index
+  - rerank  same for the top --candidates from the index re-ranked on the
+            full vectors (what get_info_use_case does)
+
+    python benchmarks/bench_embedding_index.py --rows 100000 --dims 0 768 384 256 128
+The scratch schema is dropped at the end (--keep to inspect it).
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import psycopg  # noqa: E402
+
+from embedding_index import ann_expression, reduced_index_name, reduced_index_sql  # noqa: E402
+from utils import db_utils  # noqa: E402
+
+
+def setup_catalog(cur, schema: str, rows: int, dim: int, centers: int, queries: int,
+                  decay: float, noise: float) -> float:
+    """Scratch tables centers / items / queries; -> seconds."""
+    began = time.perf_counter()
+    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"CREATE TABLE {schema}.centers (id int PRIMARY KEY, v float8[] NOT NULL)")
+    cur.execute(f"CREATE TABLE {schema}.items (id int PRIMARY KEY, embedding vector({dim}) NOT NULL)")
+    cur.execute(f"CREATE TABLE {schema}.queries (id int PRIMARY KEY, embedding vector({dim}) NOT NULL)")
+
+    cur.execute(
+        f"""INSERT INTO {schema}.centers
+            SELECT c, array_agg((random() - 0.5) * power(j, -%(decay)s::float8) ORDER BY j)
+              FROM generate_series(1, %(centers)s) c CROSS JOIN generate_series(1, %(dim)s) j
+             GROUP BY c""",
+        {"decay": decay, "centers": centers, "dim": dim},
+    )
+    noisy = """(SELECT array_agg(cv + (random() - 0.5) * %(noise)s::float8 * power(j, -%(decay)s::float8) ORDER BY j)
+                  FROM unnest(c.v) WITH ORDINALITY AS t(cv, j))::vector"""
+    cur.execute(
+        f"""INSERT INTO {schema}.items
+            SELECT i, {noisy}
+              FROM generate_series(1, %(rows)s) i
+              JOIN {schema}.centers c ON c.id = 1 + i %% %(centers)s""",
+        {"rows": rows, "centers": centers, "noise": noise, "decay": decay},
+    )
+    cur.execute(
+        f"""INSERT INTO {schema}.queries
+            SELECT q, {noisy}
+              FROM generate_series(1, %(queries)s) q
+              JOIN {schema}.centers c ON c.id = 1 + (q * 7919) %% %(centers)s""",
+        {"queries": queries, "centers": centers, "noise": noise, "decay": decay},
+    )
+    cur.execute(f"ANALYZE {schema}.items")
+    return time.perf_counter() - began
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 3)
+
+
+def timed_queries(cur, sql: str, query_vectors: list, params: dict) -> tuple:
+    """-> (ids per query, latencies ms)"""
+    results, latencies = [], []
+    for vector in query_vectors:
+        began = time.perf_counter()
+        cur.execute(sql, {**params, "q": vector})
+        results.append([row[0] for row in cur.fetchall()])
+        latencies.append((time.perf_counter() - began) * 1000)
+    return results, latencies
+
+
+def recall(found: list, truth: list) -> float:
+    return round(sum(len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)) / len(truth), 4)
+
+
+def run_variant(cur, schema: str, dim: int, full_dim: int, method: str, k: int, candidates: int,
+                probes: int, lists: int, query_vectors: list, truth: list) -> dict:
+    table = f"{schema}.items"
+    began = time.perf_counter()
+    cur.execute(reduced_index_sql(dim, method, table=table, concurrently=False, lists=lists))
+    build_s = time.perf_counter() - began
+    index = f"{schema}.{reduced_index_name(dim, method, table)}"
+    cur.execute("SELECT pg_relation_size(%s::regclass)", (index,))
+    index_bytes = cur.fetchone()[0]
+
+    cur.execute(f"SET hnsw.ef_search = {max(40, candidates)}")
+    cur.execute(f"SET ivfflat.probes = {probes}")
+
+    order = f"{ann_expression(dim, 'embedding')} <=> {ann_expression(dim, '%(q)s::vector')}"
+    ann_sql = f"SELECT id FROM {table} ORDER BY {order} LIMIT %(k)s"
+    rerank_sql = (f"SELECT id FROM (SELECT id, embedding FROM {table} ORDER BY {order} LIMIT %(candidates)s) c "
+                  f"ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s")
+
+    # client-side binding: EXPLAIN takes no server-side parameters
+    with psycopg.ClientCursor(cur.connection) as explain:
+        explain.execute("EXPLAIN (FORMAT JSON) " + ann_sql, {"q": query_vectors[0], "k": k})
+        index_used = index.split(".")[-1] in json.dumps(explain.fetchone()[0])
+
+    ann_ids, ann_ms = timed_queries(cur, ann_sql, query_vectors, {"k": k})
+    rerank_ids, rerank_ms = timed_queries(cur, rerank_sql, query_vectors, {"k": k, "candidates": candidates})
+    cur.execute(f"DROP INDEX {index}")
+
+    return {
+        "variant": "vector" if not dim else f"halfvec({dim})",
+        "dims": dim or full_dim,
+        "bytes_per_vector": 4 * full_dim if not dim else 2 * dim,
+        "method": method,
+        "build_s": round(build_s, 2),
+        "index_kb": index_bytes // 1024,
+        "index_used": index_used,
+        "ann": {"recall_at_k": recall(ann_ids, truth), "p50_ms": percentile(ann_ms, 0.5),
+                "p95_ms": percentile(ann_ms, 0.95)},
+        "rerank": {"candidates": candidates, "recall_at_k": recall(rerank_ids, truth),
+                   "p50_ms": percentile(rerank_ms, 0.5), "p95_ms": percentile(rerank_ms, 0.95)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reduced / halfvec embedding indexes vs full precision")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768, help="full embedding dimensions")
+    parser.add_argument("--dims", type=int, nargs="+", default=[0, 768, 384, 256, 128],
+                        help="index variants: 0 = full vector, d = first d dimensions as halfvec")
+    parser.add_argument("--method", choices=("hnsw", "ivfflat"), default="hnsw")
+    parser.add_argument("--lists", type=int, default=300, help="ivfflat lists")
+    parser.add_argument("--probes", type=int, default=10, help="ivfflat probes")
+    parser.add_argument("--centers", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=50, help="index candidates re-ranked at full precision")
+    parser.add_argument("--decay", type=float, default=0.5, help="per-dimension scale j^-decay")
+    parser.add_argument("--noise", type=float, default=0.5)
+    parser.add_argument("--maintenance-work-mem", default="1GB")
+    parser.add_argument("--schema", default="bench_embedding_index")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    args = parser.parse_args()
+
+    with psycopg.connect(db_utils.get_conninfo(), autocommit=True) as conn:
+        cur = conn.cursor()
+        cur.execute(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'")
+        try:
+            setup_s = setup_catalog(cur, args.schema, args.rows, args.dim, args.centers, args.queries,
+                                    args.decay, args.noise)
+            cur.execute(f"SELECT embedding::text FROM {args.schema}.queries ORDER BY id")
+            query_vectors = [row[0] for row in cur.fetchall()]
+
+            exact_sql = f"SELECT id FROM {args.schema}.items ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+            truth, exact_ms = timed_queries(cur, exact_sql, query_vectors, {"k": args.k})
+
+            results = [run_variant(cur, args.schema, dim, args.dim, args.method, args.k, args.candidates,
+                                   args.probes, args.lists, query_vectors, truth)
+                       for dim in args.dims]
+        finally:
+            if not args.keep:
+                cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+
+    print(json.dumps({
+        "rows": args.rows, "dim": args.dim, "queries": args.queries, "k": args.k, "setup_s": round(setup_s, 1),
+        "exact": {"p50_ms": percentile(exact_ms, 0.5), "p95_ms": percentile(exact_ms, 0.95)},
+        "variants": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Start-up cost of the CLI entry points, from `python -X importtime`.
+
+For each module (--modules, default main_pipeline and batch_pipeline) a fresh
+interpreter runs `import <module>` --runs times; per module:
+  - module_ms     median import time of the module and everything it pulls
+                  in (its cumulative time; this is what --budget-ms checks)
+  - total_ms      same plus the interpreter's own start-up imports (site,
+                  encodings): what a CLI invocation pays
+  - heaviest      the --top imports with the largest cumulative time
+  - forbidden     heavy SDKs that should only load on first use
+                  (--forbid: google.adk, google.genai, google.generativeai,
+                  psycopg2) but were imported at start-up
+
+Exit code 1 when a module is over --budget-ms or imports a forbidden
+module, so the check can run in CI:
+
+    python benchmarks/bench_import_time.py --budget-ms 800
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_FORBIDDEN = ["google.adk", "google.genai", "google.generativeai", "psycopg2"]
+
+
+def parse_importtime(stderr: str) -> list:
+    """-> [(module, depth, self_us, cumulative_us)] in the order printed."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def import_once(module: str) -> list:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr.strip().splitlines()[-1]}")
+    return parse_importtime(completed.stderr)
+
+
+def measure(module: str, runs: int, top: int, forbidden: list) -> dict:
+    module_times, totals, rows = [], [], []
+    for _ in range(runs):
+        rows = import_once(module)
+        top_level = [(name, cumulative) for name, depth, _, cumulative in rows if depth == 0]
+        module_times.append(sum(cumulative for name, cumulative in top_level if name == module) / 1000)
+        totals.append(sum(cumulative for _, cumulative in top_level) / 1000)
+
+    names = {name for name, _, _, _ in rows}
+    heaviest = sorted(rows, key=lambda row: -row[3])[:top]
+    return {
+        "module": module,
+        "module_ms": round(statistics.median(module_times), 1),
+        "total_ms": round(statistics.median(totals), 1),
+        "runs_ms": [round(t, 1) for t in module_times],
+        "modules_imported": len(names),
+        "heaviest": [{"module": name, "cumulative_ms": round(cumulative / 1000, 1), "self_ms": round(own / 1000, 1)}
+                     for name, _, own, cumulative in heaviest],
+        "forbidden": sorted(f for f in forbidden if f in names),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of the CLI entry points (python -X importtime)")
+    parser.add_argument("--modules", nargs="+", default=["main_pipeline", "batch_pipeline"])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module (median reported)")
+    parser.add_argument("--top", type=int, default=10, help="heaviest imports listed")
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="modules that must not be imported at start-up")
+    args = parser.parse_args()
+
+    results = [measure(module, args.runs, args.top, args.forbid) for module in args.modules]
+    print(json.dumps({"budget_ms": args.budget_ms, "results": results}, indent=2))
+
+    failed = False
+    for r in results:
+        over = r["module_ms"] > args.budget_ms
+        status = "FAIL" if over or r["forbidden"] else "ok"
+        failed = failed or status == "FAIL"
+        print(f"{status:<5} {r['module']:<20} {r['module_ms']:>8.1f} ms (budget {args.budget_ms:.0f}, "
+              f"with interpreter start-up {r['total_ms']:.1f} ms)"
+              + (f"  forbidden: {', '.join(r['forbidden'])}" if r["forbidden"] else ""))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
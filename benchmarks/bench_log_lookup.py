@@ -0,0 +1,139 @@
+"""
+Log lookups on a large table: single heap without indexes (old layout) vs
+monthly partitions with the indexes of db_setup/init_log.sql.
+
+Both tables are filled with the same synthetic rows (generate_series) spread
+over `--months` months, in a scratch schema. Measured queries:
+  - by request : all rows of one request_id (the per-request debug query)
+  - by stage   : one stage over the last 7 days (dashboards)
+
+    python benchmarks/bench_log_lookup.py --rows 10000000 --lookups 50
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import db_utils  # noqa: E402
+from log_maintenance import next_period  # noqa: E402
+
+SCHEMA = "bench_logs"
+STAGES = ["step1_normalize", "step2_get_context", "step3_sql_probe", "step4_dml_plan", "step6_write_sql"]
+
+FILL_SQL = """
+INSERT INTO {table} (request_id, app_name, pipeline_name, stage, log_data, created_at)
+SELECT 'REQ_' || (g / 8),
+       'agents',
+       'main_pipeline',
+       (%(stages)s::text[])[1 + g %% 5],
+       jsonb_build_object('n', g),
+       %(start)s::timestamp + (g::double precision / %(rows)s) * (%(end)s::timestamp - %(start)s::timestamp)
+  FROM generate_series(0, %(rows)s - 1) g
+"""
+
+BY_REQUEST_SQL = "SELECT id, stage, created_at FROM {table} WHERE request_id = %s ORDER BY created_at"
+BY_STAGE_SQL = ("SELECT count(*) FROM {table} "
+                "WHERE stage = %s AND created_at >= %s::timestamp - interval '7 days' AND created_at < %s")
+
+
+def setup(conn, rows: int, months: int) -> tuple:
+    end = next_period(date.today().replace(day=1), "month")
+    start = end
+    for _ in range(months):
+        start = (start.replace(day=1) - date.resolution).replace(day=1)
+
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};")
+        cur.execute(f"""
+            CREATE TABLE {SCHEMA}.heap_logs (
+                id BIGSERIAL PRIMARY KEY, request_id TEXT, app_name TEXT, pipeline_name TEXT,
+                stage TEXT, log_data JSONB, created_at TIMESTAMP DEFAULT now());
+            CREATE TABLE {SCHEMA}.part_logs (
+                id BIGSERIAL, request_id TEXT, app_name TEXT, pipeline_name TEXT,
+                stage TEXT, log_data JSONB, created_at TIMESTAMP NOT NULL DEFAULT now(),
+                PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at);
+            CREATE TABLE {SCHEMA}.part_logs_default PARTITION OF {SCHEMA}.part_logs DEFAULT;
+        """)
+        month = start
+        while month < end:
+            cur.execute(f"CREATE TABLE {SCHEMA}.part_logs_p{month:%Y%m} PARTITION OF {SCHEMA}.part_logs "
+                        f"FOR VALUES FROM ('{month}') TO ('{next_period(month, 'month')}')")
+            month = next_period(month, "month")
+    conn.commit()
+
+    params = {"stages": STAGES, "start": start, "end": end, "rows": rows}
+    timings = {}
+    for table in ("heap_logs", "part_logs"):
+        began = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(FILL_SQL.format(table=f"{SCHEMA}.{table}"), params)
+        conn.commit()
+        timings[f"fill_{table}_s"] = round(time.perf_counter() - began, 1)
+
+    began = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE INDEX ON {SCHEMA}.part_logs (request_id, created_at);
+            CREATE INDEX ON {SCHEMA}.part_logs (stage, created_at);
+            CREATE INDEX ON {SCHEMA}.part_logs USING BRIN (created_at);
+            ANALYZE {SCHEMA}.heap_logs;
+            ANALYZE {SCHEMA}.part_logs;
+        """)
+    conn.commit()
+    timings["index_part_logs_s"] = round(time.perf_counter() - began, 1)
+    return end, timings
+
+
+def measure(conn, sql: str, param_sets: list) -> dict:
+    latencies = []
+    with conn.cursor() as cur:
+        for params in param_sets:
+            began = time.perf_counter()
+            cur.execute(sql, params)
+            cur.fetchall()
+            latencies.append((time.perf_counter() - began) * 1000)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log lookup benchmark (heap vs partitioned + indexed)")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--lookups", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help=f"keep the {SCHEMA} schema afterwards")
+    args = parser.parse_args()
+
+    with db_utils.connection() as conn:
+        end, timings = setup(conn, args.rows, args.months)
+
+        request_ids = [(f"REQ_{random.randrange(args.rows // 8)}",) for _ in range(args.lookups)]
+        stage_windows = [(random.choice(STAGES), end, end) for _ in range(args.lookups)]
+
+        results = {"rows": args.rows, "setup": timings}
+        for table in ("heap_logs", "part_logs"):
+            name = f"{SCHEMA}.{table}"
+            results[table] = {
+                "by_request": measure(conn, BY_REQUEST_SQL.format(table=name), request_ids),
+                "by_stage_last_7d": measure(conn, BY_STAGE_SQL.format(table=name), stage_windows),
+            }
+
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+            conn.commit()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
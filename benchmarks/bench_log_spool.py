@@ -0,0 +1,93 @@
+"""
+Logging latency while the log database hangs.
+
+A local TCP server accepts connections and never answers, standing in for
+an overloaded Postgres. log_pipeline_event is called --events times (sync
+and from inside an event loop); the first insert waits for the connection
+timeout, opens the circuit, and the following records go to the local
+spool. Pipeline-side latency per call is reported, then the spool content.
+
+    python benchmarks/bench_log_spool.py --events 500
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# must be set before utils.config is imported
+_hang = socket.socket()
+_hang.bind(("127.0.0.1", 0))
+_hang.listen(128)
+os.environ["PGHOST"] = "127.0.0.1"
+os.environ["PGPORT"] = str(_hang.getsockname()[1])
+os.environ.setdefault("LOG_SPOOL_DIR", tempfile.mkdtemp(prefix="log_spool_"))
+os.environ.setdefault("LOG_DB_TIMEOUT_S", "0.5")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import asyncio  # noqa: E402
+
+from utils import logging_utils  # noqa: E402
+from utils.log_spool import get_spool  # noqa: E402
+
+
+def percentiles(latencies_ms: list) -> dict:
+    latencies_ms = sorted(latencies_ms)
+    return {
+        "p50_ms": round(statistics.median(latencies_ms), 3),
+        "p95_ms": round(latencies_ms[int(0.95 * (len(latencies_ms) - 1))], 3),
+        "max_ms": round(latencies_ms[-1], 2),
+    }
+
+
+def run_sync(events: int) -> dict:
+    latencies = []
+    for i in range(events):
+        began = time.perf_counter()
+        logging_utils.log_pipeline_event(f"BENCH_{i}", "bench", "sync", {"i": i, "text": "x" * 2048})
+        latencies.append((time.perf_counter() - began) * 1000)
+    return percentiles(latencies)
+
+
+async def run_async(events: int) -> dict:
+    latencies = []
+    for i in range(events):
+        began = time.perf_counter()
+        logging_utils.log_pipeline_event(f"BENCH_{i}", "bench", "async", {"i": i})
+        latencies.append((time.perf_counter() - began) * 1000)
+        await asyncio.sleep(0)
+    await logging_utils.flush_log_tasks()
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Log latency with a hanging log database")
+    parser.add_argument("--events", type=int, default=500)
+    args = parser.parse_args()
+
+    # keep accepted sockets open (and silent)
+    accepted = []
+    threading.Thread(target=lambda: accepted.extend(iter(lambda: _hang.accept()[0], None)), daemon=True).start()
+
+    result = {"sync": run_sync(args.events)}
+    logging_utils._log_circuit.success()  # close the circuit again for the async run
+    result["async"] = asyncio.run(run_async(args.events))
+
+    spool = get_spool()
+    spool.rotate()
+    result["spool"] = {
+        "dir": str(spool.spool_dir),
+        "files": [p.name for p in spool.ready_files()],
+        **spool.stats,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+DML script rendering with the compiled templates (render_sql), for plans
+of 10, 1k and 100k actions.
+
+For every size and mode (per_action, batched) each way of collecting the
+script is timed (best of --repeat runs for small plans) and run once more
+under tracemalloc for its peak memory:
+  - compiled  : render_sql_text, pieces joined once
+  - streamed  : render_sql writing straight to a file
+
+The SQL itself is checked by the golden tests
+(tests/test_gen_dml_script_file.py), not here.
+
+No database needed: column metadata is the fixed one of bench_dml_render.
+
+    python benchmarks/bench_sql_render.py --sizes 10 1000 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from gen_dml_script_file import render_sql, render_sql_text  # noqa: E402
+from bench_dml_render import build_plan, COLUMNS  # noqa: E402
+
+
+def renderers(out_path: str):
+    def compiled(plan, mode):
+        return len(render_sql_text(plan, mode=mode, columns=COLUMNS))
+
+    def streamed(plan, mode):
+        with open(out_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+            render_sql(plan, f.write, mode=mode, columns=COLUMNS)
+        return os.path.getsize(out_path)
+
+    return {"compiled": compiled, "streamed": streamed}
+
+
+def measure(fn, plan: dict, mode: str, repeat: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        size = fn(plan, mode)
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    fn(plan, mode)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "best_ms": round(best * 1000, 3),
+        "actions_per_s": int(len(plan["actions"]) / best) if best else None,
+        "output_kb": size // 1024,
+        "peak_kb": peak // 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiled-template DML rendering: joined text vs streamed to a file")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs for plans below 10k actions")
+    args = parser.parse_args()
+
+    out_path = os.path.join(tempfile.mkdtemp(prefix="bench_sql_render_"), "script.sql")
+    results = []
+    for size in args.sizes:
+        plan = build_plan(size)
+        for mode in ("per_action", "batched"):
+            row = {"actions": size, "mode": mode}
+            for name, fn in renderers(out_path).items():
+                row[name] = measure(fn, plan, mode, args.repeat if size < 10_000 else 1)
+            results.append(row)
+    os.remove(out_path)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Typed DML rendering: cached column metadata vs introspection per script.
+
+--tables scratch tables with --columns columns each are created; --scripts
+plans of --actions actions spread over those tables are rendered with
+render_sql_text:
+  - cached    : column metadata loaded once, reused from the cache
+  - per_script: cache invalidated before every script (one pg_catalog
+                query per script, the behaviour without the cache)
+
+    python benchmarks/bench_table_metadata.py --scripts 200 --actions 2000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gen_dml_script_file import render_sql_text  # noqa: E402
+from utils import db_utils  # noqa: E402
+from utils.table_metadata import invalidate_table_metadata, table_metadata_stats  # noqa: E402
+
+SCHEMA = "bench_meta"
+
+
+def setup(tables: int, columns: int) -> list:
+    names = [f"{SCHEMA}.t{i}" for i in range(tables)]
+    cols = ", ".join(f"c{j} numeric(12,2)" for j in range(columns))
+    with db_utils.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};")
+            for name in names:
+                cur.execute(f"CREATE TABLE {name} (id integer PRIMARY KEY, code varchar(20), {cols}, "
+                            f"date_in date NOT NULL DEFAULT CURRENT_DATE, date_out date)")
+        conn.commit()
+    return names
+
+
+def build_plan(request_id: int, tables: list, actions: int, columns: int) -> dict:
+    items = []
+    for i in range(actions):
+        table = random.choice(tables)
+        field = f"c{random.randrange(columns)}"
+        if i % 2:
+            items.append({"target_table": table, "action": "update",
+                          "keys": {"id": i}, "fields": {field: f"{i % 100}.25"}})
+        else:
+            items.append({"target_table": table, "action": "insert",
+                          "fields": {"id": i, "code": f"C{i}", field: "1.00"}})
+    return {"request_id": f"BENCH_{request_id}", "actions": items}
+
+
+def render_all(plans: list, invalidate: bool) -> float:
+    began = time.perf_counter()
+    for plan in plans:
+        if invalidate:
+            invalidate_table_metadata()
+        render_sql_text(plan)
+    return time.perf_counter() - began
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cached vs per-script column metadata")
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--columns", type=int, default=30)
+    parser.add_argument("--scripts", type=int, default=200)
+    parser.add_argument("--actions", type=int, default=2000)
+    args = parser.parse_args()
+
+    tables = setup(args.tables, args.columns)
+    plans = [build_plan(i, tables, args.actions, args.columns) for i in range(args.scripts)]
+
+    invalidate_table_metadata()
+    per_script = render_all(plans, invalidate=True)
+    queries_per_script = table_metadata_stats()["misses"]
+
+    invalidate_table_metadata()
+    misses_before = table_metadata_stats()["misses"]
+    cached = render_all(plans, invalidate=False)
+    queries_cached = table_metadata_stats()["misses"] - misses_before
+
+    with db_utils.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.commit()
+    db_utils.close_pool()
+
+    print(json.dumps({
+        "scripts": args.scripts,
+        "actions_per_script": args.actions,
+        "per_script": {"total_s": round(per_script, 3), "table_misses": queries_per_script},
+        "cached": {"total_s": round(cached, 3), "table_misses": queries_cached},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
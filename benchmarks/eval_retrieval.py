@@ -0,0 +1,333 @@
+"""
+Use case retrieval: quality and latency per configuration, on a labeled set.
+
+Every entry of the eval set (JSON lines) holds the request, its normalized
+text (as normalize_request would produce it, so no normalizer call is
+needed) and the expected use case, by title or doc_id, or null when no use
+case should match:
+
+    {"id": "ev-01", "request": {"request_id": ..., "title": ..., "content": ...},
+     "normalized": "title:... request_text:...", "locale": "EN", "expected_title": "Update fee tariff"}
+    {"id": "ev-02", ..., "expected_doc_id": 7}
+
+Each configuration of the grid (mode x threshold x top-K x probes x ANN
+candidates x ANN dimensions x locale routing x bundle source) runs
+get_context_bundle once per entry. Reported per configuration:
+  - recall@1 / recall@k / MRR   expected use case at rank 1 / in the top-K / 1/rank
+  - false_matches               a use case returned for a request that has none
+  - margin                      best - second best score (nearest use cases,
+                                regardless of the threshold): small = fragile
+  - threshold_window            [best score of the unmatched requests, lowest
+                                score of an expected use case]: thresholds in
+                                between separate them
+  - fast_path / embedding_calls hybrid answers given without an embedding
+  - routed / fallback           searched in the locale partition only / in
+                                the partition, then globally (no match there)
+  - latency p50 / p95 ms        retrieval (search_ms: without the embedding call)
+  - pareto                      no other configuration is both more accurate
+                                (recall@1, false matches) and faster (p95)
+plus the embedding index found on setup.catalog_use_cases (type, options)
+and the accuracy of the locale detection on the entries labeled "locale".
+
+Embeddings (--embeddings):
+  live    embed_text for every retrieval (embedding latency included)
+  cache   --embedding-file read first, embed_text on a miss, file updated
+  replay  --embedding-file only (no API call; a miss is an error)
+
+Probes are applied per connection (PGOPTIONS: ivfflat.probes and
+hnsw.ef_search); they only matter with --ann-candidates > 0, the exact mode
+scores every use case.
+
+    python benchmarks/eval_retrieval.py --modes vector hybrid --thresholds 0.4 0.5 0.6 \\
+        --top-k 3 5 --ann-candidates 0 20 --ann-dims 0 256 --probes 1 10 --routing 0 1 --bundles 0 1 \\
+        --embeddings cache
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from get_info_use_case import get_context_bundle, embed_text, route_locale, RETRIEVAL_MODES  # noqa: E402
+from utils import db_utils  # noqa: E402
+from utils.checkpoint_utils import hash_text  # noqa: E402
+from utils.config import EMBEDDING_MODEL  # noqa: E402
+from utils.locale_detect import detect_locale  # noqa: E402
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_EVAL_SET = BENCH_DIR / "retrieval_eval_set.jsonl"
+DEFAULT_EMBEDDING_FILE = BENCH_DIR / "retrieval_eval_embeddings.json"
+
+INDEX_INFO_QUERY = """
+SELECT indexname, indexdef
+FROM pg_indexes
+WHERE schemaname = 'setup' AND tablename = 'catalog_use_cases'
+  AND indexdef ~* 'using (ivfflat|hnsw)';
+"""
+
+
+# --- Embeddings -------------------------------------------------------
+
+class EmbeddingStore:
+    """Embedding backend of the harness: live, cache or replay (see module doc)."""
+
+    def __init__(self, mode: str, path: str, model: str = EMBEDDING_MODEL):
+        self.mode = mode
+        self.path = Path(path)
+        self.model = model
+        self.vectors = {}
+        self.stats = {"hits": 0, "api_calls": 0}
+        if mode in ("cache", "replay") and self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.vectors = json.load(f)
+
+    def key(self, text: str) -> str:
+        return hash_text(f"{self.model}\n{text}")
+
+    def __call__(self, text: str) -> list:
+        if self.mode == "live":
+            self.stats["api_calls"] += 1
+            return embed_text(text)
+
+        key = self.key(text)
+        if key in self.vectors:
+            self.stats["hits"] += 1
+            return self.vectors[key]
+        if self.mode == "replay":
+            raise KeyError(f"no recorded embedding for {text[:60]!r} in {self.path} (run with --embeddings cache)")
+        self.stats["api_calls"] += 1
+        self.vectors[key] = embed_text(text)
+        return self.vectors[key]
+
+    def save(self) -> None:
+        if self.mode != "cache":
+            return
+        tmp_path = self.path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.vectors, f)
+        os.replace(tmp_path, self.path)
+
+
+# --- Helpers ----------------------------------------------------------
+
+def load_eval_set(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))], 4)
+
+
+def is_expected(entry: dict, use_case: dict) -> bool:
+    if entry.get("expected_doc_id") is not None:
+        return str(use_case.get("doc_id")) == str(entry["expected_doc_id"])
+    return use_case.get("doc_title") == entry.get("expected_title")
+
+
+def has_expected(entry: dict) -> bool:
+    return entry.get("expected_doc_id") is not None or entry.get("expected_title") is not None
+
+
+def locale_accuracy(entries: list) -> dict:
+    """detect_locale against the "locale" labels; routed = above LOCALE_MIN_CONFIDENCE."""
+    labeled = [e for e in entries if e.get("locale")]
+    errors, routed = [], 0
+    for entry in labeled:
+        locale, confidence = detect_locale(entry["normalized"])
+        routed += route_locale(entry["normalized"], routing=True)[2] is not None
+        if locale != entry["locale"]:
+            errors.append({"id": entry["id"], "expected": entry["locale"], "detected": locale,
+                           "confidence": round(confidence, 3)})
+    return {
+        "labeled": len(labeled),
+        "accuracy": round(1 - len(errors) / len(labeled), 4) if labeled else None,
+        "routable": routed,
+        "errors": errors,
+    }
+
+
+def index_info() -> list:
+    return [{"name": name, "type": "hnsw" if " hnsw " in definition.lower() else "ivfflat", "definition": definition}
+            for name, definition in db_utils.fetch_all_sync(INDEX_INFO_QUERY)]
+
+
+def apply_probes(probes) -> None:
+    """Session settings of the next pooled connections (the pool is reopened)."""
+    db_utils.close_pool()
+    if probes is None:
+        os.environ.pop("PGOPTIONS", None)
+    else:
+        os.environ["PGOPTIONS"] = f"-c ivfflat.probes={probes} -c hnsw.ef_search={probes}"
+
+
+# --- Evaluation -------------------------------------------------------
+
+def evaluate(entries: list, config: dict, embed: EmbeddingStore, warmup: int = 1) -> dict:
+    for entry in entries[:warmup]:
+        run_entry(entry, config, embed)
+
+    latencies, search_latencies, margins, misses = [], [], [], []
+    negative_best, expected_scores = [], []
+    hits_1 = hits_k = false_matches = positives = fast_path = embedding_calls = routed = fallback = 0
+    reciprocal_ranks = []
+
+    for entry in entries:
+        bundle = run_entry(entry, config, embed)
+        retrieval = bundle.get("retrieval", {})
+        latencies.append(retrieval.get("ms", 0.0))
+        search_latencies.append(retrieval.get("ms", 0.0) - retrieval.get("embed_ms", 0.0))
+        fast_path += bool(retrieval.get("fast_path"))
+        embedding_calls += bool(retrieval.get("embedding_call"))
+        routed += bool(retrieval.get("routed"))
+        fallback += bool(retrieval.get("fallback"))
+
+        matches = bundle.get("use_cases_sql", [])
+        nearest = bundle.get("nearest", [])
+        if len(nearest) >= 2:
+            margins.append(nearest[0]["score"] - nearest[1]["score"])
+
+        if not has_expected(entry):
+            if nearest:
+                negative_best.append(nearest[0]["score"])
+            if matches:
+                false_matches += 1
+                misses.append({"id": entry["id"], "expected": None, "found": matches[0].get("doc_title")})
+            continue
+
+        positives += 1
+        rank = next((i for i, uc in enumerate(matches, start=1) if is_expected(entry, uc)), None)
+        hits_1 += rank == 1
+        hits_k += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        expected_score = next((n["score"] for n in nearest if is_expected(entry, n)), None)
+        if expected_score is not None:
+            expected_scores.append(expected_score)
+        if rank != 1:
+            misses.append({"id": entry["id"], "expected": entry.get("expected_title", entry.get("expected_doc_id")),
+                           "found": matches[0].get("doc_title") if matches else None, "rank": rank})
+
+    return {
+        **config,
+        "entries": len(entries),
+        "recall_at_1": round(hits_1 / positives, 4) if positives else None,
+        "recall_at_k": round(hits_k / positives, 4) if positives else None,
+        "mrr": round(statistics.mean(reciprocal_ranks), 4) if reciprocal_ranks else None,
+        "false_matches": false_matches,
+        "margin": {"min": percentile(margins, 0.0), "p10": percentile(margins, 0.1),
+                   "p50": percentile(margins, 0.5), "p90": percentile(margins, 0.9)},
+        "threshold_window": [max(negative_best) if negative_best else None,
+                             min(expected_scores) if expected_scores else None],
+        "fast_path": fast_path,
+        "embedding_calls": embedding_calls,
+        "routed": routed,
+        "fallback": fallback,
+        "p50_ms": percentile(latencies, 0.5),
+        "p95_ms": percentile(latencies, 0.95),
+        "search_p50_ms": percentile(search_latencies, 0.5),
+        "search_p95_ms": percentile(search_latencies, 0.95),
+        "misses": misses,
+    }
+
+
+def run_entry(entry: dict, config: dict, embed: EmbeddingStore) -> dict:
+    request = entry["request"]
+    return get_context_bundle(
+        search_text=entry["normalized"],
+        request_id=str(request["request_id"]),
+        subject=request["title"],
+        body_text=request["content"],
+        top_k=config["top_k"],
+        mode=config["mode"],
+        min_score=config["threshold"],
+        ann_candidates=config["ann_candidates"],
+        ann_dim=config["ann_dim"],
+        embed=embed,
+        routing=config["routing"],
+        materialized=config["materialized"],
+    )
+
+
+def mark_pareto(results: list) -> None:
+    """pareto = True when no other configuration is at least as good on all of
+    recall@1, false matches and p95, and better on one."""
+    def key(r):
+        return (-(r["recall_at_1"] or 0), r["false_matches"], r["p95_ms"] or 0)
+
+    for r in results:
+        k = key(r)
+        r["pareto"] = not any(
+            all(a <= b for a, b in zip(key(o), k)) and key(o) != k for o in results if o is not r
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality and latency per configuration")
+    parser.add_argument("--eval-set", default=str(DEFAULT_EVAL_SET))
+    parser.add_argument("--modes", nargs="+", choices=RETRIEVAL_MODES, default=list(RETRIEVAL_MODES))
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[None],
+                        help="min score (default: the mode's configured one)")
+    parser.add_argument("--top-k", type=int, nargs="+", default=[3])
+    parser.add_argument("--probes", type=int, nargs="+", default=[None],
+                        help="ivfflat.probes / hnsw.ef_search (default: server setting)")
+    parser.add_argument("--ann-candidates", type=int, nargs="+", default=[0],
+                        help="0 = exact scoring, n = n nearest through the embedding index")
+    parser.add_argument("--ann-dims", type=int, nargs="+", default=[0],
+                        help="0 = ANN search on the full embedding, d = on its first d dims as halfvec "
+                             "(index: embedding_index.py create --dim d)")
+    parser.add_argument("--routing", type=int, nargs="+", choices=(0, 1), default=[0, 1],
+                        help="0 = global search, 1 = locale partition first (LOCALE_ROUTING)")
+    parser.add_argument("--bundles", type=int, nargs="+", choices=(0, 1), default=[1],
+                        help="0 = bundles built per request, 1 = read from setup.catalog_bundles")
+    parser.add_argument("--embeddings", choices=("live", "cache", "replay"), default="cache")
+    parser.add_argument("--embedding-file", default=str(DEFAULT_EMBEDDING_FILE))
+    parser.add_argument("--warmup", type=int, default=1, help="untimed entries per configuration")
+    parser.add_argument("--out", default=None, help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    entries = load_eval_set(args.eval_set)
+    embed = EmbeddingStore(args.embeddings, args.embedding_file)
+    results = []
+    try:
+        indexes = index_info()
+        for probes in args.probes:
+            apply_probes(probes)
+            for mode, threshold, top_k, ann, ann_dim, routing, bundles in itertools.product(
+                    args.modes, args.thresholds, args.top_k, args.ann_candidates, args.ann_dims, args.routing,
+                    args.bundles):
+                if ann == 0 and ann_dim != args.ann_dims[0]:
+                    continue  # exact scoring: the ANN dimension plays no role
+                config = {"mode": mode, "threshold": threshold, "top_k": top_k,
+                          "probes": probes, "ann_candidates": ann, "ann_dim": ann_dim, "routing": bool(routing),
+                          "materialized": bool(bundles)}
+                results.append(evaluate(entries, config, embed, warmup=args.warmup))
+    finally:
+        embed.save()
+        db_utils.close_pool()
+
+    mark_pareto(results)
+    report = {"eval_set": args.eval_set, "indexes": indexes, "embeddings": {"mode": args.embeddings, **embed.stats},
+              "locale_detection": locale_accuracy(entries), "results": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    print("\nmode     thr   k  probes ann  dim  route mat R@1    R@k    MRR    false  fallb p50ms    p95ms    pareto")
+    for r in results:
+        print(f"{r['mode']:<8} {str(r['threshold']):<5} {r['top_k']:<2} {str(r['probes']):<6} "
+              f"{r['ann_candidates']:<4} {r['ann_dim']:<4} {'on' if r['routing'] else 'off':<5} "
+              f"{'on' if r['materialized'] else 'off':<3} "
+              f"{r['recall_at_1']!s:<6} {r['recall_at_k']!s:<6} {r['mrr']!s:<6} "
+              f"{r['false_matches']:<6} {r['fallback']:<5} {r['p50_ms']!s:<8} {r['p95_ms']!s:<8} {'*' if r['pareto'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Local fake LLM endpoint with quota errors, driven through the LLM scheduler.
+
+The fake server enforces a requests-per-minute window and answers 429 (with
+Retry-After) once it is exceeded; a fraction of requests also fail with 503.
+The same workload runs twice:
+  - naive   : every worker calls the endpoint directly, no retry
+  - schedule: calls go through utils.llm_scheduler (token buckets, priorities,
+              jittered retry, adaptive concurrency)
+
+    python benchmarks/sim_llm_quota.py --calls 60 --rpm 120 --workers 16
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.llm_scheduler import LLMScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE  # noqa: E402
+
+MODEL = "fake-model"
+
+
+def make_handler(rpm: int, error_rate: float, latency_s: float):
+    window = deque()
+    lock = threading.Lock()
+
+    class FakeModelHandler(BaseHTTPRequestHandler):
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            now = time.monotonic()
+            with lock:
+                while window and now - window[0] > 60:
+                    window.popleft()
+                over_quota = len(window) >= rpm
+                if not over_quota:
+                    window.append(now)
+
+            if over_quota:
+                retry_after = max(0.1, 60 - (now - window[0]))
+                self.send_response(429)
+                self.send_header("Retry-After", f"{retry_after:.2f}")
+                self.end_headers()
+                self.wfile.write(b'{"error":"RESOURCE_EXHAUSTED"}')
+                return
+
+            if random.random() < error_rate:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            time.sleep(latency_s)
+            body = json.dumps({"text": "{}", "usage_metadata": {"total_token_count": 50}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return FakeModelHandler
+
+
+def call_fake_model(url: str) -> dict:
+    req = urllib.request.Request(url, data=b'{"prompt":"x"}', method="POST")
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+def run_naive(url: str, calls: int, workers: int) -> dict:
+    failures = 0
+
+    def one(_):
+        nonlocal failures
+        try:
+            call_fake_model(url)
+        except urllib.error.HTTPError:
+            failures += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(one, range(calls)))
+    return {"elapsed_s": time.perf_counter() - started, "failed": failures}
+
+
+def run_scheduled(url: str, calls: int, workers: int, rpm: int) -> dict:
+    # limits slightly under the server quota, as in production config
+    scheduler = LLMScheduler({MODEL: {"rpm": rpm * 0.9, "tpm": 10_000_000, "concurrency": workers}},
+                             backoff_base_s=0.2, backoff_max_s=5)
+    failures = 0
+
+    def one(i):
+        nonlocal failures
+        prio = PRIORITY_INTERACTIVE if i % 10 == 0 else PRIORITY_BATCH
+        try:
+            scheduler.call(MODEL, call_fake_model, url, est_tokens=50, prio=prio)
+        except urllib.error.HTTPError:
+            failures += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(one, range(calls)))
+    return {"elapsed_s": time.perf_counter() - started, "failed": failures, **scheduler.stats()[MODEL]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM quota simulation")
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--rpm", type=int, default=120, help="fake server quota")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="share of 503 answers")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    def serve():
+        handler = make_handler(args.rpm, args.error_rate, args.latency_ms / 1000.0)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    server = serve()
+    naive = run_naive(f"http://127.0.0.1:{server.server_port}/", args.calls, args.workers)
+    server.shutdown()
+
+    # fresh server so both runs start with an empty quota window
+    server = serve()
+    scheduled = run_scheduled(f"http://127.0.0.1:{server.server_port}/", args.calls, args.workers, args.rpm)
+    server.shutdown()
+
+    print(json.dumps({"naive": naive, "scheduled": scheduled}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
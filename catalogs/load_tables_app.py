@@ -1,20 +1,12 @@
-import os
 import json
 import textwrap
-import psycopg2
-from psycopg2.extras import execute_values
-from dotenv import load_dotenv
 
+# project root on sys.path when run as `python catalogs/<loader>.py`
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-load_dotenv()
-
-PG_CONN = {
-    "host": os.getenv("PGHOST", "localhost"),
-    "port": int(os.getenv("PGPORT", "5434")),
-    "dbname": os.getenv("PGDATABASE"),
-    "user": os.getenv("PGUSER"),
-    "password": os.getenv("PGPASSWORD"),
-}
+from utils import db_utils
 
 
 TABLES_TO_DOCUMENT = [
@@ -25,9 +17,6 @@ TABLES_TO_DOCUMENT = [
     ("public", "fee_tariff"),
 ]
 
-def get_conn():
-    return psycopg2.connect(**PG_CONN)
-
 def fetch_columns(conn, schema, table):
     sql = """
     SELECT
@@ -68,7 +57,7 @@ def upsert_catalog_rows(conn, rows):
     """
     sql = """
     INSERT INTO setup.catalog_tables (schema_name, table_name, title, content)
-    VALUES %s
+    VALUES (%s, %s, %s, %s)
     ON CONFLICT (schema_name, table_name)
     DO UPDATE SET
       title = EXCLUDED.title,
@@ -85,13 +74,13 @@ def upsert_catalog_rows(conn, rows):
         for r in rows
     ]
     with conn.cursor() as cur:
-        execute_values(cur, sql, values)
+        cur.executemany(sql, values)
     conn.commit()
 
 def main():
    
 
-    with get_conn() as conn:
+    with db_utils.connection() as conn:
         rows_to_upsert = []
         contents = []
         meta = []
@@ -116,3 +105,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    db_utils.close_pool()
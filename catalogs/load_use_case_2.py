@@ -1,26 +1,14 @@
-import os
 import json
-import psycopg2
-from psycopg2.extras import execute_values
-from dotenv import load_dotenv
 
+# project root on sys.path when run as `python catalogs/<loader>.py`
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-import google.generativeai as genai
-
-load_dotenv()
-
-PG_CONN = {
-    "host": os.getenv("PGHOST", "localhost"),
-    "port": int(os.getenv("PGPORT", "5434")),
-    "dbname": os.getenv("PGDATABASE"),
-    "user": os.getenv("PGUSER"),
-    "password": os.getenv("PGPASSWORD"),
-}
-
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+from utils import db_utils
+from utils.config import GOOGLE_API_KEY, EMBEDDING_MODEL
+from utils.genai_client import get_genai
+from utils.llm_scheduler import get_scheduler, estimate_tokens, PRIORITY_BATCH
 
 
 USE_CASES = [
@@ -82,10 +70,6 @@ USE_CASES = [
 ]
 
 
-def get_conn():
-    return psycopg2.connect(**PG_CONN)
-
-
 def build_text_for_embedding(uc: dict) -> str:
     """
     Embed lowercase title + lowercase request_text.
@@ -96,15 +80,18 @@ def build_text_for_embedding(uc: dict) -> str:
 
 
 def embed_texts(texts):
-    
-    genai.configure(api_key=GOOGLE_API_KEY)
 
+    genai = get_genai()
     vectors = []
 
     for t in texts:
-        response = genai.embed_content(
-            model=EMBEDDING_MODEL,    
-            content=t
+        response = get_scheduler().call(
+            EMBEDDING_MODEL,
+            genai.embed_content,
+            model=EMBEDDING_MODEL,
+            content=t,
+            est_tokens=estimate_tokens(t),
+            prio=PRIORITY_BATCH,
         )
         vectors.append(response['embedding'])
 
@@ -119,7 +106,7 @@ def upsert_use_cases(conn, rows):
     sql = """
     INSERT INTO setup.catalog_use_cases
       (locale, title, request_text, solution_text, tables_hint, sql_info_json, embedding)
-    VALUES %s
+    VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s::vector)
     ON CONFLICT (title)
     DO UPDATE SET
       locale        = EXCLUDED.locale,
@@ -130,7 +117,7 @@ def upsert_use_cases(conn, rows):
       embedding     = EXCLUDED.embedding;
     """
     with conn.cursor() as cur:
-        execute_values(cur, sql, rows)
+        cur.executemany(sql, rows)
     conn.commit()
 
 
@@ -160,7 +147,7 @@ def main():
         ))
 
     # 4) UPSERT
-    with get_conn() as conn:
+    with db_utils.connection() as conn:
         upsert_use_cases(conn, rows)
 
     print(f"Upserted {len(rows)} use-case(s) into setup.catalog_use_cases.")
@@ -168,3 +155,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    db_utils.close_pool()
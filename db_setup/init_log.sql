@@ -1,21 +1,121 @@
 CREATE SCHEMA IF NOT EXISTS logs;
 
+-- Both log tables are range-partitioned on their timestamp. Partitions are
+-- named <table>_pYYYYMM (monthly) or <table>_pYYYYMMDD (daily) and managed
+-- by log_maintenance.py (create ahead, retention, migration of old heap
+-- tables). Only the DEFAULT partitions are created here, so the interval
+-- (LOG_PARTITION_INTERVAL) is chosen by `log_maintenance.py create`; the
+-- DEFAULT partition catches rows no partition covers.
+
 CREATE TABLE IF NOT EXISTS logs.agent_llm_logs (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     session_id VARCHAR(255) NOT NULL,
 	app_name VARCHAR(255) NOT NULL,
 	agent_name  VARCHAR(255) NOT NULL,  
         log_data JSONB NOT NULL,
-	run_timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
+	run_timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, run_timestamp)
+) PARTITION BY RANGE (run_timestamp);
+
+CREATE TABLE IF NOT EXISTS logs.agent_llm_logs_default
+    PARTITION OF logs.agent_llm_logs DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_agent_llm_logs_session
+    ON logs.agent_llm_logs (session_id, run_timestamp);
+CREATE INDEX IF NOT EXISTS idx_agent_llm_logs_time
+    ON logs.agent_llm_logs USING brin (run_timestamp);
 
 
 CREATE TABLE IF NOT EXISTS logs.db_pipeline_logs (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     request_id VARCHAR(255) NOT NULL,
     app_name VARCHAR(255) NOT NULL,
     pipeline_name VARCHAR(255) NOT NULL,
     stage VARCHAR(255) NOT NULL,
     log_data JSONB NOT NULL,
-    created_at TIMESTAMP DEFAULT now()
-);
\ No newline at end of file
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS logs.db_pipeline_logs_default
+    PARTITION OF logs.db_pipeline_logs DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_db_pipeline_logs_request
+    ON logs.db_pipeline_logs (request_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_db_pipeline_logs_stage
+    ON logs.db_pipeline_logs (stage, created_at);
+CREATE INDEX IF NOT EXISTS idx_db_pipeline_logs_time
+    ON logs.db_pipeline_logs USING brin (created_at);
+
+
+-- Content-addressed payloads: large log values are stored once, keyed by the
+-- sha256 of their canonical JSON. Log rows keep {"$payload_ref": "<hash>"}.
+-- last_referenced_at is stamped by every insert of the blob (also when it is
+-- already stored) and is what vacuum-payloads ages blobs by.
+CREATE TABLE IF NOT EXISTS logs.log_payloads (
+    payload_hash CHAR(64) PRIMARY KEY,
+    payload JSONB NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_referenced_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE logs.log_payloads
+    ADD COLUMN IF NOT EXISTS last_referenced_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP;
+
+
+-- Debugging views: log rows with every payload reference re-hydrated
+CREATE OR REPLACE VIEW logs.db_pipeline_logs_full AS
+SELECT
+    l.id,
+    l.request_id,
+    l.app_name,
+    l.pipeline_name,
+    l.stage,
+    COALESCE(
+        (SELECT jsonb_object_agg(e.key, COALESCE(p.payload, e.value))
+           FROM jsonb_each(l.log_data) AS e(key, value)
+           LEFT JOIN logs.log_payloads p
+             ON p.payload_hash = e.value ->> '$payload_ref'),
+        l.log_data
+    ) AS log_data,
+    l.created_at
+FROM logs.db_pipeline_logs l;
+
+
+CREATE OR REPLACE VIEW logs.agent_llm_logs_full AS
+SELECT
+    a.id,
+    a.session_id,
+    a.app_name,
+    a.agent_name,
+    COALESCE(
+        (SELECT jsonb_agg(
+                  i.item || jsonb_build_object(
+                    'prompt_contents',
+                      COALESCE((SELECT jsonb_agg(
+                                         CASE WHEN p.payload IS NULL THEN c.part
+                                              ELSE c.part || jsonb_build_object('text', p.payload) END
+                                         ORDER BY c.ord)
+                                  FROM jsonb_array_elements(i.item -> 'prompt_contents')
+                                       WITH ORDINALITY AS c(part, ord)
+                                  LEFT JOIN logs.log_payloads p
+                                    ON p.payload_hash = c.part -> 'text' ->> '$payload_ref'),
+                               '[]'::jsonb),
+                    'response_contents',
+                      COALESCE((SELECT jsonb_agg(
+                                         CASE WHEN p.payload IS NULL THEN c.part
+                                              ELSE c.part || jsonb_build_object('text', p.payload) END
+                                         ORDER BY c.ord)
+                                  FROM jsonb_array_elements(i.item -> 'response_contents')
+                                       WITH ORDINALITY AS c(part, ord)
+                                  LEFT JOIN logs.log_payloads p
+                                    ON p.payload_hash = c.part -> 'text' ->> '$payload_ref'),
+                               '[]'::jsonb)
+                  )
+                  ORDER BY i.ord)
+           FROM jsonb_array_elements(a.log_data) WITH ORDINALITY AS i(item, ord)),
+        a.log_data
+    ) AS log_data,
+    a.run_timestamp
+FROM logs.agent_llm_logs a;
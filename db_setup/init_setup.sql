@@ -49,4 +49,110 @@ CREATE INDEX IF NOT EXISTS idx_catalog_use_cases_embed
   WITH (lists = 200);
 
  ALTER TABLE setup.catalog_use_cases
-  ADD CONSTRAINT catalog_use_cases_2_title_key UNIQUE (title);
\ No newline at end of file
+  ADD CONSTRAINT catalog_use_cases_2_title_key UNIQUE (title);
+
+-- Lexical retrieval (get_info_use_case.py: LEXICAL_QUERY, hybrid scoring):
+-- full-text over title + request_text ('simple' config: codes such as COD_SIND,
+-- column names and RO / EN words are indexed as written) and trigram
+-- similarity of the request subject / body to title / request_text
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE setup.catalog_use_cases
+  ADD COLUMN IF NOT EXISTS search_tsv tsvector
+  GENERATED ALWAYS AS (
+    to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(request_text, ''))
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_catalog_use_cases_tsv
+  ON setup.catalog_use_cases USING gin (search_tsv);
+
+CREATE INDEX IF NOT EXISTS idx_catalog_use_cases_title_trgm
+  ON setup.catalog_use_cases USING gin (lower(title) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_catalog_use_cases_request_trgm
+  ON setup.catalog_use_cases USING gin (lower(request_text) gin_trgm_ops);
+
+-- Locale routing (get_info_use_case.py: LOCALE_PARTITIONS): one partial ANN
+-- index per locale partition. The WHERE clause must stay identical to the
+-- partition predicate of the query for the planner to use the index.
+CREATE INDEX IF NOT EXISTS idx_catalog_use_cases_embed_en
+  ON setup.catalog_use_cases
+  USING ivfflat (embedding vector_cosine_ops)
+  WITH (lists = 100)
+  WHERE locale IN ('EN', 'mixed');
+
+CREATE INDEX IF NOT EXISTS idx_catalog_use_cases_embed_ro
+  ON setup.catalog_use_cases
+  USING ivfflat (embedding vector_cosine_ops)
+  WITH (lists = 100)
+  WHERE locale IN ('RO', 'mixed');
+
+-- Materialized context bundles (get_info_use_case.py, MATERIALIZED_BUNDLES):
+-- the static part of a context bundle for each use case, read by doc_id
+-- instead of being built from sql_info_json and catalog_tables on every
+-- request:
+--   use_case  use_cases_sql[0] of sql_info_json + doc_id, doc_title,
+--             tables_hint, solution_instructions (the scores are added
+--             per request)
+--   tables    the catalog_tables docs of its tables_hint
+-- Any statement on catalog_use_cases or catalog_tables (load_tables_app.py,
+-- load_use_case_*.py, manual edits) rebuilds every bundle in the same
+-- transaction, so a bundle is never older than the catalog it was built
+-- from. A full rebuild is cheap at catalog scale and also covers a table
+-- doc shared by several use cases.
+CREATE TABLE IF NOT EXISTS setup.catalog_bundles (
+  doc_id       bigint PRIMARY KEY,
+  use_case     jsonb NOT NULL,
+  tables       jsonb NOT NULL,
+  built_at     timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION setup.rebuild_catalog_bundles() RETURNS void
+LANGUAGE sql AS $$
+  DELETE FROM setup.catalog_bundles;
+  INSERT INTO setup.catalog_bundles (doc_id, use_case, tables)
+  SELECT u.doc_id,
+         (u.sql_info_json->'use_cases_sql'->0)
+         || jsonb_build_object(
+              'doc_id',      u.doc_id,
+              'doc_title',   u.title,
+              'tables_hint', u.tables_hint,
+              'solution_instructions', u.solution_text
+            ),
+         COALESCE(
+           (SELECT jsonb_agg(
+                     jsonb_build_object(
+                       'schema_name', t.schema_name,
+                       'table_name',  t.table_name,
+                       'title',       t.title,
+                       'content',     t.content
+                     )
+                     ORDER BY t.table_name
+                   )
+              FROM setup.catalog_tables t
+             WHERE t.schema_name = 'public'
+               AND t.table_name = ANY (u.tables_hint)),
+           '[]'::jsonb
+         )
+    FROM setup.catalog_use_cases u;
+$$;
+
+CREATE OR REPLACE FUNCTION setup.catalog_bundles_refresh() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM setup.rebuild_catalog_bundles();
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_catalog_use_cases_bundles ON setup.catalog_use_cases;
+CREATE TRIGGER trg_catalog_use_cases_bundles
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON setup.catalog_use_cases
+  FOR EACH STATEMENT EXECUTE FUNCTION setup.catalog_bundles_refresh();
+
+DROP TRIGGER IF EXISTS trg_catalog_tables_bundles ON setup.catalog_tables;
+CREATE TRIGGER trg_catalog_tables_bundles
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON setup.catalog_tables
+  FOR EACH STATEMENT EXECUTE FUNCTION setup.catalog_bundles_refresh();
+
+SELECT setup.rebuild_catalog_bundles();
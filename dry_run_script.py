@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+
+import gen_dml_script_file
+from utils import db_utils
+from utils.config import (
+    DRY_RUN_LOCK_TIMEOUT_MS, DRY_RUN_STATEMENT_TIMEOUT_MS, DRY_RUN_MAX_EXPLAINS,
+    DRY_RUN_SLOW_MS, DRY_RUN_LOCK_POLL_S,
+)
+
+# ----------------------------------------------------------------------
+# Dry run of a generated script against a target database.
+#
+# Everything runs in one transaction that is always rolled back:
+#   1) the DO-block script as written (wall time, NOTICE lines, error)
+#   2) back to the savepoint, the plan's statements one by one: row count
+#      and time per action, EXPLAIN (ANALYZE, BUFFERS) for every UPDATE /
+#      expire (first DRY_RUN_MAX_EXPLAINS of them)
+# A second connection samples pg_stat_activity meanwhile to record lock
+# waits. The report is written next to the script as req-<id>.dryrun.json.
+# ----------------------------------------------------------------------
+
+LOCK_WAIT_QUERY = """
+    SELECT wait_event, pg_blocking_pids(pid)
+      FROM pg_stat_activity
+     WHERE pid = %s AND wait_event_type = 'Lock'
+"""
+
+
+class LockWaitMonitor:
+    """Samples the lock waits of backend `pid` from a separate connection."""
+
+    def __init__(self, conninfo: str, pid: int, interval_s: float = DRY_RUN_LOCK_POLL_S):
+        self.conninfo = conninfo
+        self.pid = pid
+        self.interval_s = interval_s
+        self.samples = 0
+        self.waits: Dict[str, Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        try:
+            with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                while not self._stop.is_set():
+                    row = conn.execute(LOCK_WAIT_QUERY, (self.pid,)).fetchone()
+                    if row is not None:
+                        wait_event, blockers = row
+                        entry = self.waits.setdefault(wait_event, {"wait_s": 0.0, "blocking_pids": []})
+                        entry["wait_s"] += self.interval_s
+                        entry["blocking_pids"] = sorted(set(entry["blocking_pids"]) | set(blockers or []))
+                    self.samples += 1
+                    self._stop.wait(self.interval_s)
+        except Exception as error:
+            print(f" LockWaitMonitor : Error while sampling lock waits: {error}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total_wait_s": round(sum(w["wait_s"] for w in self.waits.values()), 3),
+            "by_event": {k: {**v, "wait_s": round(v["wait_s"], 3)} for k, v in self.waits.items()},
+        }
+
+
+def plan_nodes(node: Dict[str, Any]):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain_summary(explain: Any) -> Dict[str, Any]:
+    """Key figures of an EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) result."""
+    root = explain[0] if isinstance(explain, list) else explain
+    plan = root["Plan"]
+    # ModifyTable reports 0 rows: the affected rows are those of its input
+    source = plan["Plans"][0] if plan.get("Node Type") == "ModifyTable" and plan.get("Plans") else plan
+    return {
+        "rows": int(source.get("Actual Rows", 0) * source.get("Actual Loops", 1)),
+        "execution_ms": root.get("Execution Time"),
+        "planning_ms": root.get("Planning Time"),
+        "shared_hit_blocks": plan.get("Shared Hit Blocks"),
+        "shared_read_blocks": plan.get("Shared Read Blocks"),
+        "seq_scans": [
+            {"relation": n.get("Relation Name"), "rows_removed_by_filter": n.get("Rows Removed by Filter")}
+            for n in plan_nodes(plan) if n.get("Node Type") == "Seq Scan"
+        ],
+        "plan": root,
+    }
+
+
+def run_script(cur, script: str) -> Dict[str, Any]:
+    notices: List[str] = []
+    cur.connection.add_notice_handler(lambda diag: notices.append(diag.message_primary))
+    began = time.perf_counter()
+    error = None
+    try:
+        cur.execute(script)
+    except psycopg.Error as exc:
+        error = str(exc)
+    return {"wall_ms": round((time.perf_counter() - began) * 1000, 2), "error": error, "notices": notices}
+
+
+def run_actions(cur, plan: dict, columns: dict) -> List[Dict[str, Any]]:
+    results = []
+    explains = 0
+    for i, act in enumerate(plan.get("actions", [])):
+        entry = {"action": i, "type": act.get("action"), "table": act.get("target_table"), "statements": []}
+        results.append(entry)
+        for statement in gen_dml_script_file.action_statements(act, columns):
+            step = {"kind": statement["kind"], "sql": statement["sql"]}
+            entry["statements"].append(step)
+            began = time.perf_counter()
+            try:
+                if statement["kind"] in ("update", "expire") and explains < DRY_RUN_MAX_EXPLAINS:
+                    explains += 1
+                    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement['sql']}")
+                    step["explain"] = explain_summary(cur.fetchone()[0])
+                    step["rows"] = step["explain"]["rows"]
+                else:
+                    cur.execute(statement["sql"])
+                    step["rows"] = cur.rowcount
+            except psycopg.Error as exc:
+                step["error"] = str(exc)
+                return results
+            finally:
+                step["wall_ms"] = round((time.perf_counter() - began) * 1000, 2)
+
+            if statement["kind"] == "expire" and step["rows"] == 0:
+                step["error"] = "no active row to expire (the script raises no_data_found)"
+                return results
+    return results
+
+
+def review_flags(report: Dict[str, Any]) -> List[str]:
+    flags = []
+    if report["script"]["error"]:
+        flags.append(f"script fails: {report['script']['error']}")
+    if report["script"]["wall_ms"] >= DRY_RUN_SLOW_MS:
+        flags.append(f"slow script: {report['script']['wall_ms']} ms")
+    if report["lock_waits"]["total_wait_s"] > 0:
+        flags.append(f"waited {report['lock_waits']['total_wait_s']} s on locks")
+    for entry in report["actions"]:
+        for step in entry["statements"]:
+            for scan in (step.get("explain") or {}).get("seq_scans", []):
+                flags.append(f"action {entry['action']}: seq scan on {scan['relation']}")
+            if step.get("error"):
+                flags.append(f"action {entry['action']}: {step['error']}")
+    return flags
+
+
+def dry_run_script(plan: dict, script: Dict[str, Any], columns: Optional[dict] = None,
+                   conninfo: Optional[str] = None) -> Dict[str, Any]:
+    """
+    plan    : the plan the script was rendered from
+    script  : result of gen_dml_script_file.write_sql_script
+    columns : column metadata used for rendering (loaded when None)
+    conninfo: target database (default: the pipeline database)
+    """
+    columns = columns or gen_dml_script_file.load_plan_columns(plan)
+    conninfo = conninfo or db_utils.get_conninfo()
+
+    report = {"request_id": script["request_id"], "script_path": str(script["path"]),
+              "target": conninfo_to_dict(conninfo).get("dbname")}
+
+    conn = psycopg.connect(conninfo)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SET LOCAL lock_timeout = {int(DRY_RUN_LOCK_TIMEOUT_MS)}")
+            cur.execute(f"SET LOCAL statement_timeout = {int(DRY_RUN_STATEMENT_TIMEOUT_MS)}")
+            cur.execute("SAVEPOINT dry_run_start")
+
+            with LockWaitMonitor(conninfo, conn.info.backend_pid) as monitor:
+                report["script"] = run_script(cur, script["fileContent"])
+                cur.execute("ROLLBACK TO SAVEPOINT dry_run_start")
+                report["actions"] = run_actions(cur, plan, columns)
+            report["lock_waits"] = monitor.summary()
+    finally:
+        conn.rollback()
+        conn.close()
+
+    report["flags"] = review_flags(report)
+
+    report_path = Path(script["path"]).with_suffix(".dryrun.json")
+    tmp_path = report_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp_path, report_path)
+    report["report_path"] = str(report_path)
+
+    print(f" dry_run_script : {script['request_id']} ran in {report['script']['wall_ms']} ms, "
+          f"{len(report['flags'])} flag(s), report: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a plan and dry-run its script (always rolled back)")
+    parser.add_argument("plan_file", help="plan JSON (or a plan checkpoint file)")
+    parser.add_argument("--dsn", default=None, help="target database conninfo (default: pipeline database)")
+    args = parser.parse_args()
+
+    with open(args.plan_file, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    plan = plan.get("payload", plan)
+
+    columns = gen_dml_script_file.load_plan_columns(plan)
+    script = gen_dml_script_file.write_sql_script(plan, str(Path(args.plan_file).resolve().parent), columns=columns)
+    dry_run_script(plan, script, columns=columns, conninfo=args.dsn)
@@ -0,0 +1,124 @@
+import argparse
+import time
+from typing import Any, Dict, List
+
+import psycopg
+
+from utils import db_utils
+from utils.config import RETRIEVAL_ANN_DIM
+
+# ----------------------------------------------------------------------
+# Reduced-precision ANN index for setup.catalog_use_cases.embedding
+#
+# The candidate search (get_info_use_case: ann CTE, RETRIEVAL_ANN_CANDIDATES
+# > 0) can run on the first RETRIEVAL_ANN_DIM dimensions of the embedding
+# stored as halfvec (2 bytes per dimension instead of 4): 256 halfvec
+# dimensions make an index about 6x smaller than 768 float32 ones.
+# The candidates are then scored on the full-precision embedding
+# (uc_raw), which is the re-rank step. text-embedding-004 is trained so
+# that its leading dimensions carry most of the signal, so truncation
+# needs no fitted projection.
+#
+# The index is an expression index, the heap keeps the full embedding:
+#   CREATE INDEX ... USING hnsw ((subvector(embedding, 1, 256)::halfvec(256)) halfvec_cosine_ops)
+# The search expression must be the same (ann_expression) for the planner
+# to use it. Needs pgvector >= 0.7 (halfvec, subvector).
+#
+#   python embedding_index.py create --dim 256 [--method hnsw|ivfflat] [--print]
+#   python embedding_index.py status
+#   python embedding_index.py drop --dim 256
+# ----------------------------------------------------------------------
+
+CATALOG_TABLE = "setup.catalog_use_cases"
+INDEX_METHODS = ("hnsw", "ivfflat")
+
+EMBEDDING_INDEXES_QUERY = """
+    SELECT c.relname, am.amname, pg_get_indexdef(i.indexrelid), pg_relation_size(i.indexrelid)
+      FROM pg_index i
+      JOIN pg_class c ON c.oid = i.indexrelid
+      JOIN pg_am am ON am.oid = c.relam
+     WHERE i.indrelid = to_regclass(%s)
+       AND am.amname IN ('hnsw', 'ivfflat')
+     ORDER BY c.relname
+"""
+
+
+def ann_expression(dim: int, operand: str = "embedding") -> str:
+    """The full vector (dim 0) or its first `dim` dimensions as halfvec."""
+    if not dim:
+        return operand
+    dim = int(dim)
+    return f"(subvector({operand}, 1, {dim})::halfvec({dim}))"
+
+
+def ann_opclass(dim: int) -> str:
+    return "halfvec_cosine_ops" if dim else "vector_cosine_ops"
+
+
+def reduced_index_name(dim: int, method: str = "hnsw", table: str = CATALOG_TABLE) -> str:
+    return f"idx_{table.split('.')[-1]}_embed_{method}_h{int(dim)}"
+
+
+def reduced_index_sql(dim: int, method: str = "hnsw", table: str = CATALOG_TABLE,
+                      concurrently: bool = True, lists: int = 100) -> str:
+    if method not in INDEX_METHODS:
+        raise ValueError(f"Unknown index method {method!r} (expected one of {', '.join(INDEX_METHODS)})")
+    options = f" WITH (lists = {int(lists)})" if method == "ivfflat" else ""
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+        f"{reduced_index_name(dim, method, table)} ON {table} "
+        f"USING {method} ({ann_expression(dim)} {ann_opclass(dim)}){options}"
+    )
+
+
+def embedding_indexes(table: str = CATALOG_TABLE) -> List[Dict[str, Any]]:
+    return [
+        {"name": name, "method": method, "definition": definition, "bytes": size}
+        for name, method, definition, size in db_utils.fetch_all_sync(EMBEDDING_INDEXES_QUERY, (table,))
+    ]
+
+
+def create_reduced_index(dim: int, method: str = "hnsw", lists: int = 100) -> float:
+    """Build the index (CONCURRENTLY: needs its own autocommit connection); -> seconds."""
+    sql = reduced_index_sql(dim, method, lists=lists)
+    began = time.perf_counter()
+    with psycopg.connect(db_utils.get_conninfo(), autocommit=True) as conn:
+        conn.execute(sql)
+    elapsed = time.perf_counter() - began
+    print(f" create_reduced_index : {reduced_index_name(dim, method)} built in {elapsed:.1f}s")
+    return elapsed
+
+
+def drop_reduced_index(dim: int, method: str = "hnsw") -> None:
+    schema = CATALOG_TABLE.split(".")[0]
+    with psycopg.connect(db_utils.get_conninfo(), autocommit=True) as conn:
+        conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {schema}.{reduced_index_name(dim, method)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reduced-precision ANN index of the use case embeddings")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p_create = commands.add_parser("create", help="build the halfvec index of the first --dim dimensions")
+    p_create.add_argument("--dim", type=int, default=RETRIEVAL_ANN_DIM or 256)
+    p_create.add_argument("--method", choices=INDEX_METHODS, default="hnsw")
+    p_create.add_argument("--lists", type=int, default=100, help="ivfflat lists")
+    p_create.add_argument("--print", action="store_true", help="only print the statement")
+
+    p_drop = commands.add_parser("drop")
+    p_drop.add_argument("--dim", type=int, default=RETRIEVAL_ANN_DIM or 256)
+    p_drop.add_argument("--method", choices=INDEX_METHODS, default="hnsw")
+
+    commands.add_parser("status", help="embedding indexes and their size")
+
+    args = parser.parse_args()
+    if args.command == "create" and args.print:
+        print(reduced_index_sql(args.dim, args.method, lists=args.lists) + ";")
+    elif args.command == "create":
+        create_reduced_index(args.dim, args.method, lists=args.lists)
+    elif args.command == "drop":
+        drop_reduced_index(args.dim, args.method)
+    else:
+        for index in embedding_indexes():
+            print(f"{index['name']:<48} {index['method']:<8} {index['bytes'] / 1024:>10.0f} KB  {index['definition']}")
+    db_utils.close_pool()
@@ -1,5 +1,24 @@
 import os
+import textwrap
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from string import Formatter
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.config import DML_RENDER_MODE, DML_BATCH_MIN_ACTIONS, DML_BATCH_MAX_ROWS
+from utils.helper_utils import run_steps, run_steps_async
+from utils.table_metadata import load_table_metadata, load_table_metadata_async, invalidate_table_metadata
+
+# Validity columns of versioned tables (expire_and_insert)
+VALID_FROM_COLUMN = "date_in"
+VALID_TO_COLUMN = "date_out"
+# never taken from the plan: set by the renderer ("data_*" are old misspellings)
+VERSION_COLUMNS = (VALID_FROM_COLUMN, VALID_TO_COLUMN, "data_in", "data_out")
+
+INTEGER_TYPES = ("smallint", "integer", "bigint")
+DATE_KEYWORDS = ("CURRENT_DATE", "CURRENT_TIMESTAMP", "NOW()", "LOCALTIMESTAMP")
+BOOLEAN_VALUES = {"TRUE": "TRUE", "T": "TRUE", "YES": "TRUE", "Y": "TRUE", "1": "TRUE",
+                  "FALSE": "FALSE", "F": "FALSE", "NO": "FALSE", "N": "FALSE", "0": "FALSE"}
 
 # ----------------------------------------------------------------------
 # Helper functions
@@ -27,156 +46,608 @@ def to_sql_literal(v):
     return f"'{esc(t)}'"
 
 
-def build_where(keys: dict) -> str:
-    """Convert a dict of key/value into SQL WHERE conditions."""
+def typed_literal(v, column: Optional[Dict[str, Any]], cast: bool = False) -> str:
+    """
+    Render a value for a column of known type (utils/table_metadata):
+    - numbers bare (136, 1.00), after checking they parse; integer columns
+      get an integer literal (136.0 -> 136)
+    - booleans as TRUE / FALSE
+    - CURRENT_DATE & co. bare only for date/time columns
+    - anything else quoted; with cast=True also ::<column type>, used for
+      the first row of a VALUES list so every row takes the column type
+    Without metadata (column None) falls back to to_sql_literal.
+    Raises ValueError for values the column type cannot hold.
+    """
+    if column is None:
+        return to_sql_literal(v)
+
+    t = "NULL" if v is None else str(v).strip()
+    tu = t.upper()
+    col_type = column["type"]
+    category = column["category"]
+
+    if tu == "NULL":
+        return f"NULL::{col_type}" if cast else "NULL"
+
+    if category == "N":
+        try:
+            number = Decimal(t)
+        except InvalidOperation:
+            number = None
+        if number is None or not number.is_finite():
+            raise ValueError(f"'{t}' is not a valid {col_type} value")
+        if col_type in INTEGER_TYPES:
+            if number != number.to_integral_value():
+                raise ValueError(f"'{t}' is not a valid {col_type} value")
+            # integer literal ("136.0", "1e3" -> 136, 1000): an int = numeric
+            # comparison could not use the column's index
+            t = str(int(number))
+        return f"{t}::{col_type}" if cast else t
+
+    if category == "B":
+        if tu not in BOOLEAN_VALUES:
+            raise ValueError(f"'{t}' is not a valid {col_type} value")
+        return BOOLEAN_VALUES[tu]
+
+    if category == "D" and tu in DATE_KEYWORDS:
+        return t
+
+    quoted = f"'{esc(t)}'"
+    return f"{quoted}::{col_type}" if cast else quoted
+
+
+def build_where(keys: dict, table_columns: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+    """
+    Convert a dict of key/value into SQL WHERE conditions. With the table's
+    columns the values are typed (id=136, not id='136').
+    """
     if not keys:
         return "1=0"
-    return " AND ".join(f"{k}={to_sql_literal(v)}" for k, v in keys.items())
+    if table_columns is None:
+        return " AND ".join(f"{k}={to_sql_literal(v)}" for k, v in keys.items())
+    return " AND ".join(f"{k}={typed_literal(v, table_columns.get(k))}" for k, v in keys.items())
 
 
 # ----------------------------------------------------------------------
-# Main renderer
+# Plan validation against the catalog
 # ----------------------------------------------------------------------
 
-def generate_sql(plan: dict) -> str:
-    request_id = str(plan.get("request_id", "unknown"))
-    #scope_text = plan.get("scope") or plan.get("Scope") or plan.get("context") or "N/A"
-    scope_text = str(plan.get("title", "N/A"))
-    user_text = "automation_agent"
-    started_at = datetime.utcnow().isoformat()
-
-    border = "*" * 100
-    top_line = f"/* {border}"
-    bottom_line = f"{border} */"
-
-    header_comment = (
-        f"{top_line}\n"
-        f" * Request: {esc(request_id)}\n"
-        f" * Scope  : {esc(scope_text)}\n"
-        f" * User   : {esc(user_text)}\n"
-        f" * Start  : {esc(started_at)}\n"
-        f" {bottom_line}"
+def plan_tables(plan: dict) -> List[str]:
+    return list(dict.fromkeys(a["target_table"] for a in plan.get("actions", []) if a.get("target_table")))
+
+
+def validate_plan(plan: dict, columns: Dict[str, Dict[str, Dict[str, Any]]]) -> List[str]:
+    """Unknown tables / columns and values the column types cannot hold."""
+    errors = []
+    for i, act in enumerate(plan.get("actions", [])):
+        table = act.get("target_table")
+        table_columns = columns.get(table)
+        if not table_columns:
+            errors.append(f"action {i}: unknown table {table}")
+            continue
+
+        action = act.get("action", "").lower()
+        values = {**(act.get("keys") or {}), **clean_fields(act)}
+        for name, value in values.items():
+            if name not in table_columns:
+                errors.append(f"action {i}: unknown column {table}.{name}")
+                continue
+            try:
+                typed_literal(value, table_columns[name])
+            except ValueError as error:
+                errors.append(f"action {i}: {table}.{name}: {error}")
+
+        if action == "expire_and_insert" and VALID_TO_COLUMN not in table_columns:
+            errors.append(f"action {i}: {table} has no {VALID_TO_COLUMN} column to expire rows")
+    return errors
+
+
+def _checked_columns(plan: dict, columns: dict) -> dict:
+    errors = validate_plan(plan, columns)
+    if errors:
+        raise ValueError(f"Plan {plan.get('request_id', 'unknown')} rejected: " + "; ".join(errors))
+    return columns
+
+
+def _plan_columns_steps(plan: dict):
+    """
+    load_plan_columns(_async) as a step generator (utils.helper_utils.run_steps):
+    yields the tables whose metadata it needs, returns the checked columns.
+    """
+    tables = plan_tables(plan)
+    columns = yield tables
+    if validate_plan(plan, columns):
+        # cached metadata may predate a DDL change: reload once before rejecting
+        invalidate_table_metadata(tables)
+        columns = _checked_columns(plan, (yield tables))
+    return columns
+
+
+def load_plan_columns(plan: dict) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Column metadata of the plan's tables (cached), after validating the plan against it."""
+    return run_steps(_plan_columns_steps(plan), load_table_metadata)
+
+
+async def load_plan_columns_async(plan: dict) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    return await run_steps_async(_plan_columns_steps(plan), load_table_metadata_async)
+
+
+def version_fields(table_columns: Dict[str, Any]) -> Dict[str, str]:
+    """date_in / date_out of a new row, for the ones the table has."""
+    fields = {VALID_FROM_COLUMN: "CURRENT_DATE", VALID_TO_COLUMN: "NULL"}
+    return {k: v for k, v in fields.items() if k in table_columns}
+
+
+# ----------------------------------------------------------------------
+# Per-action statements
+# ----------------------------------------------------------------------
+
+def action_statements(act: dict, columns: Dict[str, Dict[str, Dict[str, Any]]]) -> List[Dict[str, str]]:
+    """
+    The plain SQL statements of one action (what render_sql wraps in
+    PL/pgSQL), for step-by-step execution by dry_run_script.py:
+    [{"kind": "insert" | "update" | "expire", "sql": ...}]
+    """
+    table = act["target_table"]
+    action = act.get("action", "").lower()
+    keys = act.get("keys", {})
+    table_columns = columns.get(table, {})
+    fields = clean_fields(act)
+
+    def insert_statement():
+        insert_fields = {**fields, **version_fields(table_columns)}
+        cols = list(insert_fields.keys())
+        vals = [typed_literal(insert_fields[c], table_columns.get(c)) for c in cols]
+        return {"kind": "insert", "sql": f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(vals)})"}
+
+    if action == "insert":
+        return [insert_statement()]
+
+    where = build_where(keys, table_columns)
+    if action == "update":
+        set_parts = [f"{k}={typed_literal(v, table_columns.get(k))}" for k, v in fields.items()]
+        return [{"kind": "update", "sql": f"UPDATE {table} SET {', '.join(set_parts)} WHERE {where}"}]
+
+    if action == "expire_and_insert":
+        return [
+            {"kind": "expire", "sql": f"UPDATE {table} SET {VALID_TO_COLUMN} = CURRENT_DATE "
+                                      f"WHERE {where} AND {VALID_TO_COLUMN} IS NULL"},
+            insert_statement(),
+        ]
+    return []
+
+
+# ----------------------------------------------------------------------
+# Batched rendering
+#
+# Actions are grouped by (table, action, key columns, field columns), in
+# order of first appearance, and each group becomes one set-based
+# statement per DML_BATCH_MAX_ROWS rows:
+#   insert            INSERT ... VALUES (..), (..)
+#   update            UPDATE ... FROM (VALUES ..) joined on the key columns
+#   expire_and_insert expire via UPDATE ... FROM (VALUES ..), then bulk insert
+# Row-count checks are kept per statement. Actions that cannot be batched
+# (no keys, unsupported action) are rendered one by one.
+# ----------------------------------------------------------------------
+
+BATCHABLE_ACTIONS = ("insert", "update", "expire_and_insert")
+
+
+def clean_fields(act: dict) -> dict:
+    return {k: v for k, v in (act.get("fields") or {}).items() if k not in VERSION_COLUMNS}
+
+
+def group_actions(actions: List[dict]) -> List[dict]:
+    """
+    -> [{"table", "action", "key_cols", "field_cols", "actions"} | {"single": act}]
+
+    Repeated keys inside an update group: the later action wins (as with
+    sequential updates). Repeated keys inside an expire group start a new
+    group, so each key is expired once per statement.
+
+    A group runs at the position of its first action, so it only stays open
+    while no other group (or single action) touches its table: a later
+    action after one that did starts a new group and keeps the plan order
+    per table.
+    """
+    groups: List[dict] = []
+    open_groups: Dict[tuple, dict] = {}
+
+    def close_other_groups(table: str, group_key: tuple = None) -> None:
+        for other in [k for k in open_groups if k[0] == table and k != group_key]:
+            del open_groups[other]
+
+    for act in actions:
+        action = act.get("action", "").lower()
+        keys = act.get("keys", {}) or {}
+        fields = clean_fields(act)
+
+        if action not in BATCHABLE_ACTIONS or (action != "insert" and not keys):
+            close_other_groups(act.get("target_table"))
+            groups.append({"single": act})
+            continue
+        if action == "update" and not fields:
+            raise ValueError(f"Nothing to update for table {act['target_table']}")
+
+        key_cols = tuple(keys) if action != "insert" else ()
+        group_key = (act["target_table"], action, key_cols, tuple(fields))
+        close_other_groups(act["target_table"], group_key)
+        group = open_groups.get(group_key)
+
+        key_values = tuple(str(keys[c]) for c in key_cols)
+        if group is not None and action == "expire_and_insert" and key_values in group["rows"]:
+            group = None
+
+        if group is None:
+            group = {
+                "table": act["target_table"], "action": action,
+                "key_cols": list(key_cols), "field_cols": list(fields), "rows": {},
+            }
+            open_groups[group_key] = group
+            groups.append(group)
+
+        # insert rows have no key: keep them all, in order
+        row_key = key_values if action != "insert" else len(group["rows"])
+        group["rows"].pop(row_key, None)
+        group["rows"][row_key] = {"keys": keys, "fields": fields, "reason": str(act.get("reason", ""))}
+
+    for group in groups:
+        if "rows" in group:
+            group["actions"] = list(group.pop("rows").values())
+    return groups
+
+
+def chunks(items: list, size: int) -> List[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)] or [[]]
+
+
+def reasons_comment(actions: List[dict], limit: int = 3) -> str:
+    reasons = list(dict.fromkeys(a["reason"] for a in actions if a["reason"]))
+    more = f" (+{len(reasons) - limit} more)" if len(reasons) > limit else ""
+    return f"/* {len(actions)} action(s): {esc('; '.join(reasons[:limit]))}{more} */"
+
+
+def typed_values(table_columns: Dict[str, Any], value_cols: List[str], rows: List[List[Any]],
+                 indent: int = 6) -> str:
+    """
+    VALUES list whose column types are the target table's: the first row is
+    cast to the column types, so every row resolves to them and the join on
+    the key columns can use their indexes.
+    """
+    lines = [
+        "(" + ", ".join(typed_literal(v, table_columns.get(c), cast=(i == 0)) for c, v in zip(value_cols, row)) + ")"
+        for i, row in enumerate(rows)
+    ]
+    return (",\n" + " " * indent).join(lines)
+
+
+# ----------------------------------------------------------------------
+# Compiled templates
+#
+# The large literals are not re-built for every action: each template is
+# parsed once into literal parts and field slots, with its whitespace
+# normalized (dedented, 2-space indent inside the DO block). render_sql
+# hands the script piece by piece to `write` (list.append, a file's
+# write, ...), so a caller can stream it to disk. The output for fixed
+# plans is frozen in tests/fixtures/sql/ (tests/test_gen_dml_script_file.py).
+# ----------------------------------------------------------------------
+
+class SqlTemplate:
+    """
+    A template parsed once. Fields are "{name}"; fields found in `constants`
+    are substituted at compile time.
+    """
+
+    def __init__(self, text: str, indent: int = 2, **constants):
+        lines = [line.rstrip() for line in textwrap.dedent(text).strip("\n").splitlines()]
+        text = "\n".join((" " * indent + line) if line else "" for line in lines) + "\n"
+
+        self.pieces: List[str] = []
+        self.slots: List[tuple] = []
+        for literal, field, _, _ in Formatter().parse(text):
+            if literal:
+                self.pieces.append(literal)
+            if field is None:
+                continue
+            if field in constants:
+                self.pieces.append(str(constants[field]))
+            else:
+                self.slots.append((len(self.pieces), field))
+                self.pieces.append("")
+
+    def render(self, values: Dict[str, str]) -> str:
+        pieces = self.pieces[:]
+        for slot, field in self.slots:
+            pieces[slot] = values[field]
+        return "".join(pieces)
+
+
+T_HEADER = SqlTemplate("""
+    /* {border}
+     * Request: {request_id}
+     * Scope  : {scope}
+     * User   : {user}
+     * Start  : {started_at}
+    {shared_line} {border} */
+""", indent=0, border="*" * 100)
+
+T_OPEN = SqlTemplate("""
+    -- Generated as a PostgreSQL PL/pgSQL DO-block
+    DECLARE
+      v_request_id text := '{request_id}';
+      v_started_at timestamptz := now();
+      v_rows int;
+      v_keys int;
+      v_err_text text;
+      v_err_state text;
+    BEGIN
+      RAISE NOTICE 'Request % started at %', v_request_id, v_started_at;
+""", indent=0)
+
+T_CLOSE = SqlTemplate("""
+      RAISE NOTICE 'Request % completed successfully', v_request_id;
+
+    EXCEPTION
+      WHEN OTHERS THEN
+        GET STACKED DIAGNOSTICS
+          v_err_text  = MESSAGE_TEXT,
+          v_err_state = RETURNED_SQLSTATE;
+        RAISE NOTICE 'Request % failed: % (SQLSTATE=%)', v_request_id, v_err_text, v_err_state;
+        RAISE;
+    END;
+    $$ LANGUAGE plpgsql;
+""", indent=0)
+
+T_INSERT = SqlTemplate("""
+    /* {reason} */
+    INSERT INTO {table} ({cols})
+    VALUES ({vals});
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RAISE NOTICE 'Inserted % row(s) into %', v_rows, '{table_lit}';
+""")
+
+T_UPDATE = SqlTemplate("""
+    /* {reason} */
+    UPDATE {table} SET {sets} WHERE {where};
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RAISE NOTICE 'Updated % row(s) in %', v_rows, '{table_lit}';
+""")
+
+T_EXPIRE_AND_INSERT = SqlTemplate("""
+    /* {reason} */
+    -- 1) expire current row(s)
+    UPDATE {table}
+       SET {valid_to} = CURRENT_DATE
+     WHERE {where}
+       AND {valid_to} IS NULL;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RAISE NOTICE 'Expired % row(s) in % for keys [{where_lit}]', v_rows, '{table_lit}';
+
+    IF v_rows = 0 THEN
+      RAISE EXCEPTION 'No active row to expire in % for keys [%]', '{table_lit}', '{where_lit}'
+        USING ERRCODE = 'no_data_found';
+    END IF;
+
+    -- 2) insert new version
+    INSERT INTO {table} ({cols}) VALUES ({vals});
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RAISE NOTICE 'Inserted % row(s) into %', v_rows, '{table_lit}';
+""", valid_to=VALID_TO_COLUMN)
+
+T_UNSUPPORTED = SqlTemplate("""
+    -- TODO unsupported action: {action} on {table_lit}
+""")
+
+T_BULK_INSERT = SqlTemplate("""
+    INSERT INTO {table} ({cols}) VALUES
+      {values};
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    IF v_rows <> {count} THEN
+      RAISE EXCEPTION 'Expected % inserted row(s) in %, got %', {count}, '{table_lit}', v_rows;
+    END IF;
+    RAISE NOTICE 'Inserted % row(s) into %', v_rows, '{table_lit}';
+""")
+
+T_BATCH_UPDATE = SqlTemplate("""
+    UPDATE {table} AS tgt
+       SET {sets}
+      FROM (VALUES
+        {values}
+      ) AS v({aliases})
+     WHERE {join};
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RAISE NOTICE 'Updated % row(s) in % for {count} key(s)', v_rows, '{table_lit}';
+""")
+
+T_BATCH_EXPIRE = SqlTemplate("""
+    -- 1) expire current row(s)
+    WITH expired AS (
+      UPDATE {table} AS tgt
+         SET {valid_to} = CURRENT_DATE
+        FROM (VALUES
+          {values}
+        ) AS v({aliases})
+       WHERE {join}
+         AND tgt.{valid_to} IS NULL
+      RETURNING {returning}
     )
+    SELECT count(*), count(DISTINCT ROW({aliases})) INTO v_rows, v_keys FROM expired;
+    RAISE NOTICE 'Expired % row(s) in % for % key(s)', v_rows, '{table_lit}', v_keys;
+
+    IF v_keys < {count} THEN
+      RAISE EXCEPTION 'No active row to expire in % for % of % key(s)', '{table_lit}', {count} - v_keys, {count}
+        USING ERRCODE = 'no_data_found';
+    END IF;
+
+    -- 2) insert new versions
+""", valid_to=VALID_TO_COLUMN)
+
 
-    # ---- Body of DO block ----
-    body = f"""
--- Generated as a PostgreSQL PL/pgSQL DO-block
-DECLARE
-  v_request_id text := '{esc(request_id)}';
-  v_started_at timestamptz := now();
-  v_rows int;
-  v_err_text text;
-  v_err_state text;
-BEGIN
-  RAISE NOTICE 'Request % started at %', v_request_id, v_started_at;
-"""
-
-    # ------------------------------------------------------------------
-    # Actions
-    # ------------------------------------------------------------------
-    for act in plan.get("actions", []):
+class _Renderer:
+    """Per-script state: escaped table names are computed once per table."""
+
+    def __init__(self, columns: Dict[str, Dict[str, Dict[str, Any]]], write: Callable[[str], Any]):
+        self.columns = columns
+        self.write = write
+        self._table_lits: Dict[str, str] = {}
+
+    def table_lit(self, table: str) -> str:
+        lit = self._table_lits.get(table)
+        if lit is None:
+            lit = self._table_lits[table] = esc(table)
+        return lit
+
+    def action(self, act: dict) -> None:
         table = act["target_table"]
         action = act.get("action", "").lower()
-        keys = act.get("keys", {})
-        reason = str(act.get("reason", ""))
-        fields = dict(act.get("fields", {}))
+        table_columns = self.columns.get(table, {})
+        fields = clean_fields(act)
+        values = {"table": table, "table_lit": self.table_lit(table), "reason": esc(str(act.get("reason", "")))}
 
-        # remove fields not needed
-        fields.pop("data_in", None)
-        fields.pop("data_out", None)
+        if action in ("insert", "expire_and_insert"):
+            insert_fields = {**fields, **version_fields(table_columns)}
+            values["cols"] = ", ".join(insert_fields)
+            values["vals"] = ", ".join(typed_literal(v, table_columns.get(c)) for c, v in insert_fields.items())
 
         if action == "insert":
-            insert_fields = {**fields, "data_in": "CURRENT_DATE", "data_out": "NULL"}
-            cols = list(insert_fields.keys())
-            vals = [to_sql_literal(insert_fields[c]) for c in cols]
-
-            body += f"""
-               /* {esc(reason)} */
-                 INSERT INTO {table} ({", ".join(cols)})
-                 VALUES ({", ".join(vals)});
-                 GET DIAGNOSTICS v_rows = ROW_COUNT;
-                 RAISE NOTICE 'Inserted % row(s) into %', v_rows, '{esc(table)}';
-            """
-
+            self.write("\n" + T_INSERT.render(values))
         elif action == "update":
-            set_parts = [f"{k}={to_sql_literal(v)}" for k, v in fields.items()]
-            if not set_parts:
+            if not fields:
                 raise ValueError(f"Nothing to update for table {table}")
-
-            where = build_where(keys)
-
-            body += f"""
-                   /* {esc(reason)} */
-                   UPDATE {table} SET {", ".join(set_parts)} WHERE {where};
-                   GET DIAGNOSTICS v_rows = ROW_COUNT;
-                   RAISE NOTICE 'Updated % row(s) in %', v_rows, '{esc(table)}';
-            """
-
+            values["sets"] = ", ".join(f"{k}={typed_literal(v, table_columns.get(k))}" for k, v in fields.items())
+            values["where"] = build_where(act.get("keys", {}), table_columns)
+            self.write("\n" + T_UPDATE.render(values))
         elif action == "expire_and_insert":
-            where = build_where(keys)
-            insert_fields = {**fields, "data_in": "CURRENT_DATE", "data_out": "NULL"}
-            cols = list(insert_fields.keys())
-            vals = [to_sql_literal(insert_fields[c]) for c in cols]
-
-            body += f"""
-  /* {esc(reason)} */
-  -- 1) expire current row(s)
-  UPDATE {table}
-     SET data_out = CURRENT_DATE
-   WHERE {where}
-     AND data_out IS NULL;
-  GET DIAGNOSTICS v_rows = ROW_COUNT;
-  RAISE NOTICE 'Expired % row(s) in % for keys [{esc(where)}]', v_rows, '{esc(table)}';
-
-  IF v_rows = 0 THEN
-    RAISE EXCEPTION 'No active row to expire in % for keys [%]', '{esc(table)}', '{esc(where)}'
-      USING ERRCODE = 'no_data_found';
-  END IF;
-
-  -- 2) insert new version
-  INSERT INTO {table} ({", ".join(cols)}) VALUES ({", ".join(vals)});
-  GET DIAGNOSTICS v_rows = ROW_COUNT;
-  RAISE NOTICE 'Inserted % row(s) into %', v_rows, '{esc(table)}';
-"""
-
+            values["where"] = build_where(act.get("keys", {}), table_columns)
+            values["where_lit"] = esc(values["where"])
+            self.write("\n" + T_EXPIRE_AND_INSERT.render(values))
         else:
-            body += f"""
-  -- TODO unsupported action: {esc(action)} on {esc(table)}
-"""
-
-    # ------------------------------------------------------------------
-    # Close block
-    # ------------------------------------------------------------------
-    body += """
-  RAISE NOTICE 'Request % completed successfully', v_request_id;
-
-EXCEPTION
-  WHEN OTHERS THEN
-    GET STACKED DIAGNOSTICS
-      v_err_text  = MESSAGE_TEXT,
-      v_err_state = RETURNED_SQLSTATE;
-    RAISE NOTICE 'Request % failed: % (SQLSTATE=%)', v_request_id, v_err_text, v_err_state;
-    RAISE;
-END;
-"""
-
-    # Final SQL text
-    sql = f"DO $$\n{header_comment}\n{body}\n$$ LANGUAGE plpgsql;\n"
-    return sql
+            self.write("\n" + T_UNSUPPORTED.render({"action": esc(action), "table_lit": values["table_lit"]}))
+
+    def bulk_insert(self, table: str, field_cols: List[str], actions: List[dict],
+                    table_columns: Dict[str, Any], lead: str = "\n") -> None:
+        versions = version_fields(table_columns)
+        version_values = list(versions.values())
+        cols = ", ".join(field_cols + list(versions))
+        field_types = [table_columns.get(c) for c in field_cols]
+        for chunk in chunks(actions, DML_BATCH_MAX_ROWS):
+            rows = ",\n    ".join(
+                "(" + ", ".join([typed_literal(a["fields"][c], t) for c, t in zip(field_cols, field_types)] +
+                                version_values) + ")"
+                for a in chunk
+            )
+            self.write(lead + T_BULK_INSERT.render({
+                "table": table, "table_lit": self.table_lit(table), "cols": cols,
+                "values": rows, "count": str(len(chunk)),
+            }))
+
+    def group(self, group: dict) -> None:
+        table = group["table"]
+        table_columns = self.columns.get(table, {})
+        key_cols, field_cols, actions = group["key_cols"], group["field_cols"], group["actions"]
+        self.write(f"\n  {reasons_comment(actions)}")
+
+        if group["action"] == "insert":
+            self.bulk_insert(table, field_cols, actions, table_columns)
+            return
+
+        key_alias = [f"k_{c}" for c in key_cols]
+        common = {
+            "table": table, "table_lit": self.table_lit(table),
+            "join": " AND ".join(f"tgt.{c} = v.k_{c}" for c in key_cols),
+        }
+
+        if group["action"] == "update":
+            common["sets"] = ", ".join(f"{c} = v.s_{c}" for c in field_cols)
+            common["aliases"] = ", ".join(key_alias + [f"s_{c}" for c in field_cols])
+            for chunk in chunks(actions, DML_BATCH_MAX_ROWS):
+                rows = [[a["keys"][c] for c in key_cols] + [a["fields"][c] for c in field_cols] for a in chunk]
+                self.write("\n" + T_BATCH_UPDATE.render({
+                    **common, "values": typed_values(table_columns, key_cols + field_cols, rows),
+                    "count": str(len(chunk)),
+                }))
+            return
+
+        # expire_and_insert
+        common["aliases"] = ", ".join(key_alias)
+        common["returning"] = ", ".join(f"v.{a}" for a in key_alias)
+        for chunk in chunks(actions, DML_BATCH_MAX_ROWS):
+            rows = [[a["keys"][c] for c in key_cols] for a in chunk]
+            self.write("\n" + T_BATCH_EXPIRE.render({
+                **common, "values": typed_values(table_columns, key_cols, rows, indent=8),
+                "count": str(len(chunk)),
+            }))
+            self.bulk_insert(table, field_cols, chunk, table_columns, lead="")
+
+
+def render_sql(plan: dict, write: Callable[[str], Any], mode: Optional[str] = None,
+               columns: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None,
+               header: bool = True) -> None:
+    """
+    The plan's DO-block script, written piece by piece to `write`.
+
+    mode    : "per_action", "batched" or "auto" (batched from
+              DML_BATCH_MIN_ACTIONS actions on); default DML_RENDER_MODE.
+    columns : column metadata of the plan's tables (load_plan_columns);
+              loaded (cached) when not given. The plan is validated against
+              it and rejected (ValueError) before anything is written.
+    header  : False drops the request comment box (script bundles keep
+              that information in their manifest).
+    """
+    mode = mode or DML_RENDER_MODE
+    columns = load_plan_columns(plan) if columns is None else _checked_columns(plan, columns)
+    request_id = esc(str(plan.get("request_id", "unknown")))
+    actions = plan.get("actions", [])
+    if mode == "auto":
+        mode = "batched" if len(actions) >= DML_BATCH_MIN_ACTIONS else "per_action"
+
+    write("DO $$\n")
+    if header:
+        shared_line = ""
+        if plan.get("shared_plan_of"):
+            shared_line = f" * Plan   : shared with request {esc(plan['shared_plan_of'])}\n"
+        write(T_HEADER.render({
+            "request_id": request_id, "scope": esc(str(plan.get("title", "N/A"))), "user": "automation_agent",
+            "started_at": esc(datetime.utcnow().isoformat()), "shared_line": shared_line,
+        }))
+    write("\n" + T_OPEN.render({"request_id": request_id}))
+
+    renderer = _Renderer(columns, write)
+    if mode == "batched":
+        for group in group_actions(actions):
+            if "single" in group:
+                renderer.action(group["single"])
+            else:
+                renderer.group(group)
+    else:
+        for act in actions:
+            renderer.action(act)
+
+    write("\n" + T_CLOSE.render({}))
+
+
+def render_sql_text(plan: dict, mode: Optional[str] = None,
+                    columns: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None,
+                    header: bool = True) -> str:
+    parts: List[str] = []
+    render_sql(plan, parts.append, mode=mode, columns=columns, header=header)
+    return "".join(parts)
 
 
 # ----------------------------------------------------------------------
 # Write file
 # ----------------------------------------------------------------------
 
-def write_sql_script(plan: dict, folder="db_setup_automation_project"):
+def write_sql_script(plan: dict, folder="db_setup_automation_project", mode: Optional[str] = None,
+                     columns: Optional[Dict[str, Dict[str, Dict[str, Any]]]] = None):
     
     
     request_id = str(plan.get("request_id", "unknown"))
     filename = f"req-{request_id}.sql"
     full_path = os.path.join(folder, filename)
 
-    sql = generate_sql(plan)
+    # rendered (and validated) before the file is opened: a rejected plan leaves no script
+    sql = render_sql_text(plan, mode=mode, columns=columns)
 
     with open(full_path, "w", encoding="utf-8") as f:
         f.write(sql)
@@ -1,9 +1,16 @@
 
-from dotenv import load_dotenv
+import json
+from typing import TYPE_CHECKING, Any, Optional
 
-from utils.config import  DEFAULT_LLM_MODEL
+from utils.config import  DEFAULT_LLM_MODEL, PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_TTL_S, PLAN_CACHE_FILE
+from utils.cache_utils import TTLCache
+from utils.checkpoint_utils import hash_json, hash_text
+from utils.json_extract import parse_model_json
 
-from google.adk.agents import LlmAgent
+if TYPE_CHECKING:  # ADK is imported by the factory / callbacks, on first use
+    from google.adk.agents import LlmAgent
+    from google.adk.agents.callback_context import CallbackContext
+    from google.genai import types
 
 
 DML_PLANNER_SYSTEM_PROMPT = """
@@ -121,6 +128,91 @@ def convert_input_to_context_bundle(data: dict) -> dict:
     return context_bundle
 
 
+# =====================================================================
+# Plan memoization
+#
+# The planner output is fully determined by (use case, params, probe
+# snapshot, prompt, model). A cached plan is only served when the stored
+# probe snapshot equals the current one, so any change in the data forces
+# a new planner call.
+# =====================================================================
+
+_plan_cache: Optional[TTLCache] = None
+
+
+def get_plan_cache() -> TTLCache:
+    global _plan_cache
+    if _plan_cache is None:
+        _plan_cache = TTLCache(PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_TTL_S, PLAN_CACHE_FILE or None)
+    return _plan_cache
+
+
+def probe_snapshot(sql_probe: Any) -> Optional[dict]:
+    """The parts of the discovery output the planner depends on (None if unreadable)."""
+    if isinstance(sql_probe, str):
+        try:
+            # cache key only: no repair call
+            sql_probe = parse_model_json(sql_probe, "sql_probe", repair=None)
+        except ValueError:
+            return None
+    if not isinstance(sql_probe, dict):
+        return None
+
+    result = sql_probe.get("result") or {}
+    return {
+        "table_name": result.get("table_name"),
+        "count_rows": result.get("v_count_rows"),
+        "rows": result.get("rows") or [],
+        "max_pk_plus_1": result.get("max_pk_plus_1"),
+    }
+
+
+def plan_cache_key(use_case_id: Any, params: Any, snapshot: dict,
+                   model_name: str = DEFAULT_LLM_MODEL) -> str:
+    return hash_json([use_case_id, params or {}, snapshot, hash_text(DML_PLANNER_SYSTEM_PROMPT), model_name])
+
+
+def lookup_cached_plan(use_case_id: Any, params: Any, sql_probe: Any, request_id: Any) -> Optional[dict]:
+    snapshot = probe_snapshot(sql_probe)
+    if use_case_id is None or snapshot is None:
+        return None
+
+    entry = get_plan_cache().get(plan_cache_key(use_case_id, params, snapshot))
+    if entry is None or entry["snapshot"] != snapshot:
+        return None
+
+    plan = dict(entry["plan"])
+    plan["request_id"] = request_id
+    return plan
+
+
+def store_cached_plan(use_case_id: Any, params: Any, sql_probe: Any, plan: dict) -> None:
+    snapshot = probe_snapshot(sql_probe)
+    if use_case_id is None or snapshot is None:
+        return
+    get_plan_cache().set(plan_cache_key(use_case_id, params, snapshot), {"snapshot": snapshot, "plan": plan})
+
+
+def plan_cache_before_agent(callback_context: "CallbackContext") -> Optional["types.Content"]:
+    """
+    before_agent_callback of the planner: on a cache hit the plan is written
+    to state and returned as the agent response, skipping the LLM call.
+    Expects request_id, use_case_id, params and sql_probe in session.state.
+    """
+    state = callback_context.state
+    plan = lookup_cached_plan(state.get("use_case_id"), state.get("params"),
+                              state.get("sql_probe"), state.get("request_id"))
+    if plan is None:
+        return None
+
+    from google.genai import types
+
+    text = json.dumps(plan, ensure_ascii=False)
+    callback_context.state["plan"] = text
+    callback_context.state["plan_cache_hit"] = True
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
 # =====================================================================
 # 5) Build DML-Planner Agent factory
 # # ===================================================================
@@ -129,15 +221,23 @@ def convert_input_to_context_bundle(data: dict) -> dict:
 def build_dml_planner_agent(
     model_name: str = DEFAULT_LLM_MODEL,
     output_key: str = "plan",
-) -> LlmAgent:
+    before_agent_callback=None,
+    before_model_callback=None,
+    after_model_callback=None,
+) -> "LlmAgent":
     """
     Factory for the DML planner agent.
     """
+    from google.adk.agents import LlmAgent
+
     return LlmAgent(
         name="dml_info_agent",
         model=model_name,
         instruction=DML_PLANNER_SYSTEM_PROMPT,
         output_key=output_key,
+        before_agent_callback=before_agent_callback,
+        before_model_callback=before_model_callback,
+        after_model_callback=after_model_callback,
     )  
 
 
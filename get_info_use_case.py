@@ -1,42 +1,150 @@
-import os
+import asyncio
 import json
-import psycopg2
-from psycopg2.extras import register_default_jsonb
-import google.generativeai as genai
-from dotenv import load_dotenv
+import time
 from pathlib import Path
-from utils.config import  PG_CONN, GOOGLE_API_KEY, EMBEDDING_MODEL
+from functools import lru_cache
+from typing import Callable
+from utils.config import (
+    EMBEDDING_MODEL, CONTEXT_TOP_K, RETRIEVAL_MODE, RETRIEVAL_MIN_SCORE, LEXICAL_MIN_SCORE,
+    HYBRID_LEXICAL_WEIGHT, LEXICAL_FAST_PATH, LEXICAL_FAST_PATH_MIN_SCORE, LEXICAL_FAST_PATH_MARGIN,
+    RETRIEVAL_ANN_CANDIDATES, RETRIEVAL_ANN_DIM, LOCALE_ROUTING, LOCALE_MIN_CONFIDENCE, MATERIALIZED_BUNDLES,
+)
+from embedding_index import ann_expression
+from utils import db_utils
+from utils.genai_client import get_genai
+from utils.helper_utils import run_steps, run_steps_async
+from utils.locale_detect import detect_locale
+from utils.llm_scheduler import get_scheduler, estimate_tokens
 
 
 # --- SQL: reduced to only what we actually use ------------------------------
+#
+# Scores of a use case (all in [0, 1]):
+#   vector_score  cosine similarity of the embeddings (0 without an embedding)
+#   lexical_score mean of
+#                   - full-text rank of the request words in title + request_text
+#                     (search_tsv, any word matches: fee, currency, cod_sind ...)
+#                   - trigram similarity of the request subject / body to the
+#                     use case title / example request_text
+#   score         vector_weight * vector_score + lexical_weight * lexical_score
+#                 (see retrieval_weights: vector, lexical or hybrid mode)
+
+# request words as an OR query ('fee' | 'tarif' | ...), simple config: codes,
+# column names and RO / EN words are kept as they are
+TSQUERY_SQL = "regexp_replace(plainto_tsquery('simple', %(search_text)s)::text, '&|<[0-9-]+>', '|', 'g')::tsquery"
 
-SQL_CONTEXT_QUERY = """
+LEXICAL_SCORE_SQL = """(
+      ts_rank_cd(u.search_tsv, q.tsq, 32)
+      + greatest(similarity(lower(u.title), q.subj), similarity(lower(u.request_text), q.body))
+    ) / 2"""
+
+# Cheap pre-filter (GIN indexes only, no embedding): the two best lexical
+# candidates, to decide whether the match is unambiguous (lexical_fast_path)
+LEXICAL_QUERY = f"""
+WITH q AS (
+  SELECT {TSQUERY_SQL} AS tsq,
+         lower(%(subject)s) AS subj,
+         lower(%(body_text)s) AS body
+)
+SELECT u.doc_id, u.title, {LEXICAL_SCORE_SQL} AS lexical_score
+FROM setup.catalog_use_cases u, q
+WHERE u.search_tsv @@ q.tsq
+   OR lower(u.title) %% q.subj
+   OR lower(u.request_text) %% q.body
+ORDER BY lexical_score DESC
+LIMIT 2;
+"""
+
+# Search part of the context query: the scored use cases (uc, best first)
+# and the nearest ones regardless of the threshold. {ann_order},
+# {locale_filter}: filled by context_query (full or reduced-precision ANN
+# search; global or single-locale partition)
+SQL_CONTEXT_SEARCH = f"""
 WITH
 q AS (
-  SELECT %s::vector AS emb
+  SELECT %(embedding)s::vector AS emb,
+         {TSQUERY_SQL} AS tsq,
+         lower(%(subject)s) AS subj,
+         lower(%(body_text)s) AS body
+),
+ann AS (
+  -- ann_candidates > 0: nearest neighbours through the embedding index
+  -- (ivfflat / hnsw, see ivfflat.probes / hnsw.ef_search) instead of
+  -- scoring every use case; lexical matches are always kept. uc_raw
+  -- re-ranks them on the full-precision embedding.
+  SELECT doc_id
+  FROM setup.catalog_use_cases
+  WHERE %(ann_candidates)s > 0 AND %(embedding)s::vector IS NOT NULL{{locale_filter}}
+  ORDER BY {{ann_order}}
+  LIMIT %(ann_candidates)s
 ),
 uc_raw AS (
   SELECT
-    doc_id,
-    title,
-    request_text,
-    solution_text,
-    sql_info_json,
-    tables_hint,
-    1 - (embedding <=> (SELECT emb FROM q)) AS score
-  FROM setup.catalog_use_cases
+    u.doc_id,
+    u.title,
+    u.request_text,
+    u.solution_text,
+    u.sql_info_json,
+    u.tables_hint,
+    COALESCE(1 - (u.embedding <=> q.emb), 0) AS vector_score,
+    {LEXICAL_SCORE_SQL} AS lexical_score
+  FROM setup.catalog_use_cases u, q
+  WHERE (%(ann_candidates)s = 0
+     OR q.emb IS NULL
+     OR u.doc_id IN (SELECT doc_id FROM ann)
+     OR u.search_tsv @@ q.tsq){{locale_filter}}
 ),
-uc AS (
-  SELECT *
+scored AS (
+  SELECT *,
+         %(vector_weight)s::float8 * vector_score + %(lexical_weight)s::float8 * lexical_score AS score
   FROM uc_raw
-  WHERE score >= 0.5              -- similarity threshold
+),
+uc AS (
+  SELECT *, row_number() OVER (ORDER BY score DESC) AS rank
+  FROM scored
+  WHERE score >= %(min_score)s::float8   -- similarity threshold
   ORDER BY score DESC
-  LIMIT 1                          -- top-K use-cases (1 for now)
+  LIMIT %(top_k)s                        -- top-K use-cases (best first)
 ),
+nearest AS (
+  -- best scores regardless of the threshold: review suggestions when nothing matches
+  SELECT doc_id, title, sql_info_json->'use_cases_sql'->0->>'id' AS use_case_id, score
+  FROM scored
+  ORDER BY score DESC
+  LIMIT %(top_k)s
+)"""
+
+SQL_CONTEXT_REQUEST = """
+  'request',
+    jsonb_build_object(
+      'request_id', %(request_id)s::text,
+      'subject'  , %(subject)s::text,
+      'body_text', %(body_text)s::text
+    ),"""
+
+SQL_CONTEXT_NEAREST = """
+  'nearest',
+    COALESCE(
+      (SELECT jsonb_agg(
+         jsonb_build_object(
+           'doc_id',      doc_id,
+           'doc_title',   title,
+           'use_case_id', use_case_id,
+           'score',       round(score::numeric, 4)
+         )
+         ORDER BY score DESC
+       )
+       FROM nearest),
+      '[]'::jsonb
+    ),"""
+
+# Bundle built on every request from sql_info_json and catalog_tables
+SQL_CONTEXT_TEMPLATE = SQL_CONTEXT_SEARCH + f""",
 hints AS (
+  -- tables of the best match only: the others are alternatives for review
   SELECT DISTINCT unnest(tables_hint) AS table_name
   FROM uc
-  WHERE tables_hint IS NOT NULL
+  WHERE rank = 1 AND tables_hint IS NOT NULL
 ),
 tbl AS (
   SELECT t.schema_name, t.table_name, t.title, t.content
@@ -44,13 +152,7 @@ tbl AS (
   JOIN hints h ON t.table_name = h.table_name
   WHERE t.schema_name = 'public'
 )
-SELECT jsonb_build_object(
-  'request',
-    jsonb_build_object(
-      'request_id', %s::text,
-      'subject'  , %s::text,
-      'body_text', %s::text
-    ),
+SELECT jsonb_build_object({SQL_CONTEXT_REQUEST}
 
   -- Flatten sql_info_json->'use_cases_sql'[0] and enrich with doc/meta info
   'use_cases_sql',
@@ -62,14 +164,18 @@ SELECT jsonb_build_object(
                       'doc_id',      uc.doc_id,
                       'doc_title',   uc.title,
                       'score',       round(uc.score::numeric, 4),
+                      'vector_score',  round(uc.vector_score::numeric, 4),
+                      'lexical_score', round(uc.lexical_score::numeric, 4),
                       'tables_hint', uc.tables_hint,
                       'solution_instructions', uc.solution_text
                     )
+                 ORDER BY uc.rank
                )
         FROM uc
       ),
       '[]'::jsonb
     ),
+{SQL_CONTEXT_NEAREST}
 
   'tables',
     COALESCE(
@@ -88,6 +194,80 @@ SELECT jsonb_build_object(
 ) AS context_bundle;
 """
 
+# Same bundle from setup.catalog_bundles (init_setup.sql): the static part
+# of each use case is fetched by doc_id, only the scores are added here
+SQL_CONTEXT_MATERIALIZED_TEMPLATE = SQL_CONTEXT_SEARCH + f"""
+SELECT jsonb_build_object({SQL_CONTEXT_REQUEST}
+
+  'use_cases_sql',
+    COALESCE(
+      (
+        SELECT jsonb_agg(
+                 b.use_case
+                 || jsonb_build_object(
+                      'score',         round(uc.score::numeric, 4),
+                      'vector_score',  round(uc.vector_score::numeric, 4),
+                      'lexical_score', round(uc.lexical_score::numeric, 4)
+                    )
+                 ORDER BY uc.rank
+               )
+        FROM uc
+        JOIN setup.catalog_bundles b ON b.doc_id = uc.doc_id
+      ),
+      '[]'::jsonb
+    ),
+{SQL_CONTEXT_NEAREST}
+
+  'tables',
+    COALESCE(
+      (SELECT b.tables
+       FROM uc
+       JOIN setup.catalog_bundles b ON b.doc_id = uc.doc_id
+       WHERE uc.rank = 1),
+      '[]'::jsonb
+    )
+) AS context_bundle;
+"""
+
+
+# Catalog partitions of the locale routing: a request detected as RO / EN
+# is searched among the use cases of its locale and the 'mixed' ones.
+# Same predicate as the partial indexes of init_setup.sql
+# (idx_catalog_use_cases_embed_ro / _en), so the planner can use them.
+LOCALE_PARTITIONS = {
+    "EN": "locale IN ('EN', 'mixed')",
+    "RO": "locale IN ('RO', 'mixed')",
+}
+
+
+@lru_cache(maxsize=32)
+def context_query(ann_dim: int = 0, locale: str = None, materialized: bool = False) -> str:
+    """
+    Context query with the ANN search on the full embedding (0) or on
+    its first ann_dim dimensions as halfvec (embedding_index.py index),
+    over the whole catalog (locale None) or one LOCALE_PARTITIONS entry;
+    bundles built per request or read from setup.catalog_bundles.
+    """
+    template = SQL_CONTEXT_MATERIALIZED_TEMPLATE if materialized else SQL_CONTEXT_TEMPLATE
+    order = f"{ann_expression(ann_dim, 'embedding')} <=> {ann_expression(ann_dim, '%(embedding)s::vector')}"
+    locale_filter = f"\n    AND {LOCALE_PARTITIONS[locale]}" if locale else ""
+    return template.replace("{ann_order}", order).replace("{locale_filter}", locale_filter)
+
+
+SQL_CONTEXT_QUERY = context_query(RETRIEVAL_ANN_DIM, materialized=MATERIALIZED_BUNDLES)
+
+
+# Changes whenever a use case or a table doc is added/edited/removed
+CATALOG_VERSION_QUERY = """
+SELECT md5(
+  COALESCE((SELECT string_agg(md5(u::text), ',' ORDER BY u.doc_id)
+              FROM setup.catalog_use_cases u), '')
+  || '|' ||
+  COALESCE((SELECT string_agg(md5(t::text), ',' ORDER BY t.schema_name, t.table_name)
+              FROM setup.catalog_tables t), '')
+) AS catalog_version;
+"""
+
 
 # --- Embedding --------------------------------------------------------------
 
@@ -95,11 +275,12 @@ def embed_text(text: str) -> list[float]:
     """
     Create a single embedding vector from the input text
     """
-    genai.configure(api_key=GOOGLE_API_KEY)
-
-    response = genai.embed_content(
+    response = get_scheduler().call(
+        EMBEDDING_MODEL,
+        get_genai().embed_content,
         model=EMBEDDING_MODEL,  
-        content=text
+        content=text,
+        est_tokens=estimate_tokens(text),
     )
 
     if isinstance(response, dict):
@@ -109,46 +290,220 @@ def embed_text(text: str) -> list[float]:
 
 # --- Get context_bundle from DB ---------------------------------------------
 
-def get_context_bundle(
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+
+def retrieval_weights(mode: str) -> tuple:
+    """-> (vector_weight, lexical_weight, min_score) of a retrieval mode."""
+    if mode == "vector":
+        return 1.0, 0.0, RETRIEVAL_MIN_SCORE
+    if mode == "lexical":
+        return 0.0, 1.0, LEXICAL_MIN_SCORE
+    if mode == "hybrid":
+        return 1.0 - HYBRID_LEXICAL_WEIGHT, HYBRID_LEXICAL_WEIGHT, RETRIEVAL_MIN_SCORE
+    raise ValueError(f"Unknown retrieval mode {mode!r} (expected one of {', '.join(RETRIEVAL_MODES)})")
+
+
+def lexical_fast_path(rows) -> bool:
+    """
+    rows: LEXICAL_QUERY result, best first. The match is unambiguous when the
+    best candidate scores high enough and clearly above the runner-up; the
+    embedding call is then skipped.
+    """
+    if not rows:
+        return False
+    best = float(rows[0][2])
+    runner_up = float(rows[1][2]) if len(rows) > 1 else 0.0
+    return best >= LEXICAL_FAST_PATH_MIN_SCORE and best - runner_up >= LEXICAL_FAST_PATH_MARGIN
+
+
+def _lexical_params(search_text: str, subject: str, body_text: str) -> dict:
+    return {"search_text": search_text or "", "subject": subject or "", "body_text": body_text or ""}
+
+
+def _context_params(embedding, search_text: str, request_id: str, subject: str, body_text: str,
+                    top_k: int, mode: str, min_score: float = None, ann_candidates: int = 0) -> dict:
+    vector_weight, lexical_weight, mode_min_score = retrieval_weights(mode)
+    return {
+        **_lexical_params(search_text, subject, body_text),
+        "embedding": embedding,          # None in lexical mode
+        "vector_weight": vector_weight,
+        "lexical_weight": lexical_weight,
+        "min_score": mode_min_score if min_score is None else min_score,
+        "top_k": top_k,
+        "ann_candidates": ann_candidates,
+        "request_id": request_id,
+    }
+
+
+def route_locale(search_text: str, routing: bool = LOCALE_ROUTING, locale: str = None) -> tuple:
+    """
+    -> (locale, confidence, partition): partition is the LOCALE_PARTITIONS
+    key to search, None for the global search (routing off, "mixed" or
+    confidence below LOCALE_MIN_CONFIDENCE). An explicit locale skips the
+    detection.
+    """
+    if locale:
+        locale, confidence = locale.upper(), 1.0
+    else:
+        locale, confidence = detect_locale(search_text)
+    routed = routing and locale in LOCALE_PARTITIONS and confidence >= LOCALE_MIN_CONFIDENCE
+    return locale, round(confidence, 3), locale if routed else None
+
+
+def _context_bundle_from_row(row, retrieval: dict = None) -> dict:
+    if row is None:
+        return {}
+
+    context_bundle = row[0]
+
+    if isinstance(context_bundle, str):
+        context_bundle = json.loads(context_bundle)
+    if retrieval is not None:
+        context_bundle["retrieval"] = retrieval
+    return context_bundle
+
+
+def _context_bundle_steps(search_text, request_id, subject, body_text, top_k, mode, min_score,
+                          ann_candidates, ann_dim, routing, locale, materialized):
+    """
+    Retrieval of get_context_bundle(_async), as a step generator
+    (utils.helper_utils.run_steps). Requests:
+      ("fetch_all", sql, params) -> rows
+      ("fetch_one", sql, params) -> row
+      ("embed", text)            -> embedding
+    """
+    began = time.perf_counter()
+    retrieval_weights(mode)  # unknown mode: ValueError before any call
+    used_mode, embedding, embed_ms = mode, None, 0.0
+    locale, confidence, partition = route_locale(search_text, routing, locale)
+
+    if mode == "hybrid" and LEXICAL_FAST_PATH:
+        rows = yield ("fetch_all", LEXICAL_QUERY, _lexical_params(search_text, subject, body_text))
+        if lexical_fast_path(rows):
+            used_mode = "lexical"
+    if used_mode != "lexical":
+        embed_began = time.perf_counter()
+        embedding = yield ("embed", search_text)
+        embed_ms = (time.perf_counter() - embed_began) * 1000
+
+    params = _context_params(embedding, search_text, request_id, subject, body_text, top_k, used_mode,
+                             min_score, ann_candidates)
+    row = yield ("fetch_one", context_query(ann_dim, partition, materialized), params)
+    fallback = partition is not None and not _context_bundle_from_row(row).get("use_cases_sql")
+    if fallback:
+        # nothing in the locale partition: global search, same embedding
+        row = yield ("fetch_one", context_query(ann_dim, materialized=materialized), params)
+    return _context_bundle_from_row(row, {
+        "mode": mode,
+        "used_mode": used_mode,
+        "fast_path": mode == "hybrid" and used_mode == "lexical",
+        "embedding_call": embedding is not None,
+        "locale": locale,
+        "locale_confidence": confidence,
+        "routed": partition is not None and not fallback,
+        "fallback": fallback,
+        "embed_ms": round(embed_ms, 3),
+        "ms": round((time.perf_counter() - began) * 1000, 3),
+    })
+
+
+async def get_context_bundle_async(
     search_text: str,
     request_id: str,
     subject: str,
     body_text: str,
+    top_k: int = CONTEXT_TOP_K,
+    mode: str = RETRIEVAL_MODE,
+    min_score: float = None,
+    ann_candidates: int = RETRIEVAL_ANN_CANDIDATES,
+    ann_dim: int = RETRIEVAL_ANN_DIM,
+    embed: Callable[[str], list] = None,
+    routing: bool = LOCALE_ROUTING,
+    locale: str = None,
+    materialized: bool = MATERIALIZED_BUNDLES,
 ) -> dict:
     """
-    1. Embed search_text
-    2. Run your SQL query with the embedding + request metadata
-    3. Return the context_bundle as a Python dict
+    1. hybrid mode: lexical pre-filter first; an unambiguous lexical match
+       skips the embedding (answered in lexical mode)
+    2. Embed search_text (blocking SDK call, run in a worker thread), unless lexical
+    3. Run your SQL query with the embedding + request metadata on the async pool
+    4. Return the context_bundle as a Python dict (use_cases_sql: up to
+       top_k matches, best first; tables: those of the best match;
+       retrieval: mode actually used, locale routing and timings)
+
+    min_score      : threshold override (default: the mode's, see retrieval_weights)
+    ann_candidates : 0 scores every use case; n > 0 only the n nearest
+                     through the embedding index (+ lexical matches)
+    ann_dim        : 0 searches them on the full embedding, d > 0 on its
+                     first d dimensions as halfvec (re-ranked at full precision)
+    embed          : embedding function (default embed_text; the eval
+                     harness passes a cached / replayed one)
+    routing        : search the catalog partition of the request's locale
+                     (see route_locale); global search again when it has
+                     no match
+    locale         : "RO" / "EN" instead of the detected one
+    materialized   : read the static part of the bundles from
+                     setup.catalog_bundles instead of building it
     """
+    async def io(request):
+        kind, *args = request
+        if kind == "embed":
+            return await asyncio.to_thread(embed or embed_text, *args)
+        if kind == "fetch_all":
+            return await db_utils.fetch_all(*args)
+        return await db_utils.fetch_one(*args)
 
-    embedding = embed_text(search_text)
-    conn = psycopg2.connect(**PG_CONN)
+    return await run_steps_async(_context_bundle_steps(
+        search_text, request_id, subject, body_text, top_k, mode, min_score,
+        ann_candidates, ann_dim, routing, locale, materialized,
+    ), io)
 
-    register_default_jsonb(conn)
 
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                SQL_CONTEXT_QUERY,
-                (
-                    embedding,          # %s -> %s::vector in SQL
-                    request_id,         # %s (request_id)
-                    subject,            # %s (subject)
-                    body_text,          # %s (body_text)
-                ),
-            )
-            row = cur.fetchone()
-            if row is None:
-                return {}
+def get_context_bundle(
+    search_text: str,
+    request_id: str,
+    subject: str,
+    body_text: str,
+    top_k: int = CONTEXT_TOP_K,
+    mode: str = RETRIEVAL_MODE,
+    min_score: float = None,
+    ann_candidates: int = RETRIEVAL_ANN_CANDIDATES,
+    ann_dim: int = RETRIEVAL_ANN_DIM,
+    embed: Callable[[str], list] = None,
+    routing: bool = LOCALE_ROUTING,
+    locale: str = None,
+    materialized: bool = MATERIALIZED_BUNDLES,
+) -> dict:
+    """
+    Sync variant of get_context_bundle_async (scripts, catalog tools, eval harness).
+    """
+    def io(request):
+        kind, *args = request
+        if kind == "embed":
+            return (embed or embed_text)(*args)
+        if kind == "fetch_all":
+            return db_utils.fetch_all_sync(*args)
+        return db_utils.fetch_one_sync(*args)
+
+    return run_steps(_context_bundle_steps(
+        search_text, request_id, subject, body_text, top_k, mode, min_score,
+        ann_candidates, ann_dim, routing, locale, materialized,
+    ), io)
 
-            context_bundle = row[0]
 
-            if isinstance(context_bundle, str):
-                return json.loads(context_bundle)
-            return context_bundle
+async def get_catalog_version_async() -> str:
+    """
+    Fingerprint of setup.catalog_use_cases + setup.catalog_tables.
+    Used to detect results computed against an older catalog.
+    """
+    row = await db_utils.fetch_one(CATALOG_VERSION_QUERY)
+    return row[0] if row else ""
+
 
-    finally:
-        conn.close()
+def get_catalog_version() -> str:
+    row = db_utils.fetch_one_sync(CATALOG_VERSION_QUERY)
+    return row[0] if row else ""
 
 
 # --- Transform context_bundle -> dbquery ------------------------------------
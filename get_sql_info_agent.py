@@ -1,17 +1,16 @@
 
 
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any
 from decimal import Decimal
 from datetime import date, datetime
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
-
-from google.adk.agents import LlmAgent
-from google.adk.tools import ToolContext
-
-from utils.config import  PG_CONN, DEFAULT_LLM_MODEL
+from utils.config import  DEFAULT_LLM_MODEL
 from utils.helper_utils import clean_model_json
+from utils import db_utils
+
+if TYPE_CHECKING:  # ADK is imported by build_sql_info_agent, on first use
+    from google.adk.agents import LlmAgent
+    from google.adk.tools import ToolContext
 
 
 
@@ -19,7 +18,7 @@ from utils.helper_utils import clean_model_json
 # 1) GENERIC DB TOOL: db_select
 # =====================================================================
 
-def db_query_select(sql: str, tool_context: ToolContext) -> Dict[str, Any]:
+async def db_query_select(sql: str, tool_context: "ToolContext") -> Dict[str, Any]:
     print("[db_query_select] START " )
     stripped = sql.lstrip().lower()
     if not (stripped.startswith("select") or stripped.startswith("with")):
@@ -33,22 +32,16 @@ def db_query_select(sql: str, tool_context: ToolContext) -> Dict[str, Any]:
         return result
     
     try:
-        conn = psycopg2.connect(**PG_CONN)
-        try:
-            with conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute(sql)
-                rows = [dict(r) for r in cur.fetchall()]
-                result = {
-                    "sql": sql,
-                    "rows": rows,
-                    "rowcount": len(rows),
-                    "error": None,
-                }
-                print("[db_query_select] EXECUTED:", result)
-                result=to_json_safe(result)
-                return result
-        finally:
-            conn.close()
+        rows = await db_utils.fetch_all(sql, as_dict=True)
+        result = {
+            "sql": sql,
+            "rows": [dict(r) for r in rows],
+            "rowcount": len(rows),
+            "error": None,
+        }
+        print("[db_query_select] EXECUTED:", result)
+        result=to_json_safe(result)
+        return result
     except Exception as e:
         result = {
             "sql": sql,
@@ -221,13 +214,20 @@ STRICTNESS RULES
 def build_sql_info_agent(
     model_name: str = DEFAULT_LLM_MODEL,
     output_key: str = "sql_probe",
-) -> LlmAgent:
+    before_agent_callback=None,
+    before_model_callback=None,
+    after_model_callback=None,
+) -> "LlmAgent":
+      from google.adk.agents import LlmAgent
+
       return LlmAgent(
         name="sql_discovery_agent",
         model=model_name,
         instruction=SQL_DISCOVERY_SYSTEM_PROMPT,
         output_key=output_key,  
         tools=[db_query_select],
-       
+        before_agent_callback=before_agent_callback,
+        before_model_callback=before_model_callback,
+        after_model_callback=after_model_callback,
     )
 
@@ -0,0 +1,390 @@
+import argparse
+import json
+import math
+import os
+import re
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from utils import db_utils
+from utils.table_metadata import load_table_metadata
+from utils.config import PROJECT_DIR, INDEX_ADVISOR_MAX_ROW_FRACTION
+from gen_dml_script_file import VALID_TO_COLUMN
+
+# ----------------------------------------------------------------------
+# Index advisor for the business tables targeted by the use cases.
+#
+# Every use case's where_template becomes the probe queries and the WHERE
+# of the generated UPDATE / expire. The advisor:
+#   1) reads all sql_info_json->'use_cases_sql' entries of setup.catalog_use_cases
+#   2) parses the predicate columns of each where_template (equality first,
+#      then one range column; "<valid_to> IS NULL" is the active-row filter)
+#   3) checks them against the existing indexes of the target table
+#   4) estimates rows per probe and pages read from pg_class / pg_stats
+#   5) writes a CREATE INDEX CONCURRENTLY script for review, partial
+#      (WHERE <valid_to> IS NULL) when the template filters active rows
+#
+#   python index_advisor.py [--out data_files/index_advisor.sql] [--json]
+# ----------------------------------------------------------------------
+
+USE_CASES_QUERY = """
+    SELECT uc.doc_id, uc.title, u.value
+      FROM setup.catalog_use_cases uc
+     CROSS JOIN LATERAL jsonb_array_elements(
+               COALESCE(uc.sql_info_json->'use_cases_sql', '[]'::jsonb)) AS u(value)
+     ORDER BY uc.doc_id
+"""
+
+INDEXES_QUERY = """
+    SELECT c.relname,
+           i.indisunique,
+           pg_get_expr(i.indpred, i.indrelid),
+           ARRAY(SELECT COALESCE(a.attname, '<expr>')
+                   FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                   LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                  ORDER BY k.ord)
+      FROM pg_index i
+      JOIN pg_class c ON c.oid = i.indexrelid
+     WHERE i.indrelid = to_regclass(%s)
+       AND i.indisvalid
+"""
+
+STATS_QUERY = """
+    SELECT c.reltuples, c.relpages, s.attname, s.n_distinct, s.null_frac
+      FROM pg_class c
+      JOIN pg_namespace n ON n.oid = c.relnamespace
+      LEFT JOIN pg_stats s ON s.schemaname = n.nspname AND s.tablename = c.relname
+     WHERE c.oid = to_regclass(%s)
+"""
+
+# planner defaults when a column has no statistics
+DEFAULT_EQ_SEL = 0.005
+DEFAULT_RANGE_SEL = 1 / 3
+BTREE_DESCENT_PAGES = 3
+
+EQUALITY_OPS = {"=", "IN", "IS NULL"}
+RANGE_OPS = {"<", ">", "<=", ">=", "BETWEEN", "LIKE"}
+
+PREDICATE_RE = re.compile(
+    r"^\(*\s*(?:\w+\.)?(\w+)\s*"
+    r"(IS\s+NOT\s+NULL|IS\s+NULL|<=|>=|<>|!=|=|<|>|NOT\s+IN|IN|NOT\s+LIKE|I?LIKE|BETWEEN)",
+    re.IGNORECASE,
+)
+AND_RE = re.compile(r"\s+AND\s+", re.IGNORECASE)
+OR_RE = re.compile(r"\bOR\b", re.IGNORECASE)
+
+
+# --- Predicates -------------------------------------------------------
+
+def parse_where_template(template: str, valid_to: str = VALID_TO_COLUMN) -> Dict[str, Any]:
+    """
+    Predicate columns of a where_template:
+      {"equality": [...], "range": [...], "active_filter": bool, "unsupported": [...]}
+    Placeholders (%(v_x)s, <<v_x>>) are never parsed: only the left side of
+    each conjunct is read.
+    """
+    result = {"equality": [], "range": [], "active_filter": False, "unsupported": []}
+    if not template:
+        return result
+    if OR_RE.search(template):
+        result["unsupported"].append(template)
+        return result
+
+    parts = AND_RE.split(template.strip().rstrip(";"))
+    skip_next = False
+    for part in parts:
+        if skip_next:  # upper bound of a BETWEEN
+            skip_next = False
+            continue
+        match = PREDICATE_RE.match(part.strip())
+        if not match:
+            result["unsupported"].append(part.strip())
+            continue
+        column = match.group(1).lower()
+        op = " ".join(match.group(2).upper().split())
+        if op == "BETWEEN":
+            skip_next = True
+
+        if op == "IS NULL" and column in (valid_to, "data_out"):
+            result["active_filter"] = True
+        elif op in EQUALITY_OPS:
+            result["equality"].append(column)
+        elif op in RANGE_OPS:
+            result["range"].append(column)
+        else:  # <>, NOT IN, IS NOT NULL: a btree index does not narrow these
+            result["unsupported"].append(part.strip())
+
+    result["equality"] = list(dict.fromkeys(result["equality"]))
+    result["range"] = [c for c in dict.fromkeys(result["range"]) if c not in result["equality"]]
+    return result
+
+
+def load_use_case_predicates() -> List[Dict[str, Any]]:
+    entries = []
+    for doc_id, title, uc in db_utils.fetch_all_sync(USE_CASES_QUERY):
+        if isinstance(uc, str):
+            uc = json.loads(uc)
+        table = uc.get("target_table")
+        if table and "." not in table:
+            table = f"{uc.get('schema') or 'public'}.{table}"
+        entries.append({
+            "doc_id": doc_id,
+            "title": title,
+            "use_case_id": uc.get("id"),
+            "table": table,
+            "where_template": uc.get("where_template"),
+            **parse_where_template(uc.get("where_template") or ""),
+        })
+    return entries
+
+
+# --- Catalog ----------------------------------------------------------
+
+def load_indexes(table: str) -> List[Dict[str, Any]]:
+    return [
+        {"name": name, "unique": unique, "predicate": predicate, "columns": list(columns)}
+        for name, unique, predicate, columns in db_utils.fetch_all_sync(INDEXES_QUERY, (table,))
+    ]
+
+
+def load_stats(table: str) -> Dict[str, Any]:
+    rows = db_utils.fetch_all_sync(STATS_QUERY, (table,))
+    if not rows:
+        return {"reltuples": None, "relpages": None, "columns": {}}
+    reltuples, relpages = rows[0][0], rows[0][1]
+    return {
+        # -1: never vacuumed / analyzed
+        "reltuples": None if reltuples is None or reltuples < 0 else float(reltuples),
+        "relpages": relpages,
+        "columns": {
+            attname: {"n_distinct": n_distinct, "null_frac": null_frac}
+            for _, _, attname, n_distinct, null_frac in rows if attname is not None
+        },
+    }
+
+
+def is_active_predicate(predicate: Optional[str], valid_to: str = VALID_TO_COLUMN) -> bool:
+    return bool(predicate) and re.sub(r"[()\s]", "", predicate).lower() == f"{valid_to}isnull"
+
+
+def covering_index(candidate: Dict[str, Any], indexes: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    An existing index serving the candidate's lookups: its leading columns
+    are the candidate's equality columns (any order), or it is a unique index
+    on equality columns only; partial only on the same active-row filter.
+    """
+    equality = set(candidate["equality"])
+    for index in indexes:
+        predicate = index["predicate"]
+        if predicate and not (candidate["active_filter"] and is_active_predicate(predicate)):
+            continue
+        leading = index["columns"][:len(equality)]
+        if equality and set(leading) == equality:
+            return index
+        if index["unique"] and set(index["columns"]) <= equality:
+            return index
+    return None
+
+
+# --- Estimates --------------------------------------------------------
+
+def equality_selectivity(column_stats: Optional[Dict[str, Any]], reltuples: float) -> float:
+    n_distinct = (column_stats or {}).get("n_distinct")
+    if not n_distinct:
+        return DEFAULT_EQ_SEL
+    if n_distinct < 0:  # fraction of the rows
+        n_distinct = -n_distinct * reltuples
+    return 1.0 / max(n_distinct, 1.0)
+
+
+def estimate(candidate: Dict[str, Any], stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rows per probe and pages read: sequential scan vs btree descent plus one
+    heap page per matching row (columns assumed independent, as the planner does).
+    """
+    reltuples, relpages = stats["reltuples"], stats["relpages"]
+    if reltuples is None or not relpages:
+        return {"analyzed": False}
+
+    columns = stats["columns"]
+    selectivity = 1.0
+    for column in candidate["equality"]:
+        selectivity *= equality_selectivity(columns.get(column), reltuples)
+    for _ in candidate["range"]:
+        selectivity *= DEFAULT_RANGE_SEL
+
+    active_fraction = 1.0
+    if candidate["active_filter"] and VALID_TO_COLUMN in columns:
+        active_fraction = columns[VALID_TO_COLUMN]["null_frac"] or 0.0
+        selectivity *= active_fraction
+
+    rows = max(reltuples * selectivity, 1.0)
+    index_pages = BTREE_DESCENT_PAGES + min(math.ceil(rows), relpages)
+    return {
+        "analyzed": True,
+        "reltuples": int(reltuples),
+        "relpages": relpages,
+        "rows_per_probe": round(rows, 1),
+        "row_fraction": round(rows / max(reltuples, 1.0), 6),
+        "index_entries": int(reltuples * active_fraction),
+        "seq_scan_pages": relpages,
+        "index_scan_pages": index_pages,
+        "pages_saved_pct": round(max(relpages - index_pages, 0) * 100.0 / relpages, 1),
+    }
+
+
+# --- Advice -----------------------------------------------------------
+
+def index_name(table: str, columns: List[str], partial: bool) -> str:
+    name = f"idx_{table.split('.')[-1]}_{'_'.join(columns)}{'_active' if partial else ''}"
+    if len(name) > 63:  # NAMEDATALEN - 1
+        name = f"{name[:54]}_{zlib.crc32(name.encode('utf-8')):08x}"
+    return name
+
+
+def build_candidates(entries: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+    """One candidate per (table, equality columns, range column, active filter)."""
+    candidates: Dict[tuple, Dict[str, Any]] = {}
+    for entry in entries:
+        if not entry["table"] or not (entry["equality"] or entry["range"]):
+            continue
+        key = (entry["table"], tuple(sorted(entry["equality"])), tuple(entry["range"][:1]), entry["active_filter"])
+        candidate = candidates.setdefault(key, {
+            "table": entry["table"],
+            "equality": list(entry["equality"]),
+            "range": entry["range"][:1],
+            "active_filter": entry["active_filter"],
+            "use_cases": [],
+        })
+        candidate["use_cases"].append({"doc_id": entry["doc_id"], "title": entry["title"],
+                                       "where_template": entry["where_template"]})
+    return candidates
+
+
+def advise(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    candidates = list(build_candidates(entries).values())
+    tables = sorted({c["table"] for c in candidates})
+    metadata = load_table_metadata(tables)
+    indexes = {t: load_indexes(t) for t in tables if metadata.get(t)}
+    stats = {t: load_stats(t) for t in tables if metadata.get(t)}
+
+    advice = []
+    for candidate in candidates:
+        table = candidate["table"]
+        table_columns = metadata.get(table) or {}
+        item = {**candidate, "flags": []}
+        advice.append(item)
+
+        unknown = [c for c in candidate["equality"] + candidate["range"] if c not in table_columns]
+        if not table_columns:
+            item["status"] = "unknown_table"
+            continue
+        if unknown:
+            item["status"] = "unknown_columns"
+            item["flags"].append(f"columns not in {table}: {', '.join(unknown)}")
+            continue
+        if candidate["active_filter"] and VALID_TO_COLUMN not in table_columns:
+            item["active_filter"] = False
+
+        table_stats = stats[table]
+        # most selective equality column first, then the range column
+        item["equality"] = sorted(
+            candidate["equality"],
+            key=lambda c: equality_selectivity(table_stats["columns"].get(c), table_stats["reltuples"] or 0.0),
+        )
+        item["columns"] = item["equality"] + item["range"]
+        item["estimate"] = estimate(item, table_stats)
+        item["existing"] = [{"name": i["name"], "columns": i["columns"], "predicate": i["predicate"]}
+                            for i in indexes[table]]
+
+        covered = covering_index(item, indexes[table])
+        if covered:
+            item["status"] = "covered"
+            item["covered_by"] = covered["name"]
+            continue
+
+        item["status"] = "propose"
+        item["index_name"] = index_name(table, item["columns"], item["active_filter"])
+        est = item["estimate"]
+        if not est["analyzed"]:
+            item["flags"].append(f"{table} has no statistics: run ANALYZE for an estimate")
+        elif est["row_fraction"] > INDEX_ADVISOR_MAX_ROW_FRACTION:
+            item["status"] = "low_selectivity"
+            item["flags"].append(f"a probe matches ~{est['row_fraction']:.1%} of the rows: "
+                                 f"an index would not beat the sequential scan")
+    return advice
+
+
+def create_index_statement(item: Dict[str, Any]) -> str:
+    where = f" WHERE {VALID_TO_COLUMN} IS NULL" if item["active_filter"] else ""
+    return (f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {item['index_name']}\n"
+            f"    ON {item['table']} ({', '.join(item['columns'])}){where};")
+
+
+def render_script(advice: List[Dict[str, Any]]) -> str:
+    lines = [
+        f"-- Index advisor: generated {datetime.now().isoformat(timespec='seconds')} "
+        f"from setup.catalog_use_cases",
+        "-- Review before running. CREATE INDEX CONCURRENTLY cannot run inside a",
+        "-- transaction block: run this file with psql in autocommit mode. A failed",
+        "-- build leaves an INVALID index: DROP INDEX CONCURRENTLY it and retry.",
+        "",
+    ]
+    for item in advice:
+        if item["status"] in ("unknown_table", "unknown_columns"):
+            continue
+        cols = ", ".join(item["columns"])
+        lines.append(f"-- {item['table']} ({cols})"
+                     f"{f' WHERE {VALID_TO_COLUMN} IS NULL' if item['active_filter'] else ''}")
+        for uc in item["use_cases"]:
+            lines.append(f"--   use case {uc['doc_id']}: {uc['title']} [{uc['where_template']}]")
+        est = item["estimate"]
+        if est["analyzed"]:
+            lines.append(f"--   ~{est['rows_per_probe']} row(s) per probe of {est['reltuples']}; "
+                         f"{est['seq_scan_pages']} page(s) seq scan -> ~{est['index_scan_pages']} "
+                         f"with the index ({est['pages_saved_pct']}% fewer)")
+        for flag in item["flags"]:
+            lines.append(f"--   {flag}")
+
+        if item["status"] == "covered":
+            lines.append(f"--   already served by {item['covered_by']}")
+        elif item["status"] == "low_selectivity":
+            lines.append("--   not recommended:")
+            lines.extend(f"-- {line}" for line in create_index_statement(item).splitlines())
+        else:
+            lines.append(create_index_statement(item))
+        lines.append("")
+    return "\n".join(lines)
+
+
+def run_advisor(out_path: Optional[str] = None) -> Dict[str, Any]:
+    entries = load_use_case_predicates()
+    advice = advise(entries)
+
+    out_path = out_path or str(PROJECT_DIR / "data_files" / "index_advisor.sql")
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_script(advice))
+    os.replace(tmp_path, out_path)
+
+    for entry in entries:
+        if entry["unsupported"]:
+            print(f" index_advisor : use case {entry['doc_id']} - predicates not indexed: "
+                  f"{'; '.join(entry['unsupported'])}")
+    proposed = sum(1 for item in advice if item["status"] == "propose")
+    print(f" index_advisor : {len(entries)} use case(s), {len(advice)} candidate(s), "
+          f"{proposed} index(es) proposed -> {out_path}")
+    return {"script_path": out_path, "use_cases": len(entries), "advice": advice}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suggest indexes for the use-case key columns")
+    parser.add_argument("--out", default=None, help="script path (default: data_files/index_advisor.sql)")
+    parser.add_argument("--json", action="store_true", help="also print the full report as JSON")
+    args = parser.parse_args()
+
+    report = run_advisor(args.out)
+    db_utils.close_pool()
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False, default=str))
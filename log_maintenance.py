@@ -0,0 +1,376 @@
+import argparse
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+from psycopg import sql
+
+from utils import db_utils
+from utils.log_spool import replay_spool
+from utils.config import (
+    PROJECT_DIR, LOG_PARTITION_INTERVAL, LOG_PARTITIONS_AHEAD, LOG_RETENTION_PERIODS, LOG_PAYLOAD_KNOWN_TTL_S,
+)
+
+# ----------------------------------------------------------------------
+# Maintenance of the partitioned log tables (db_setup/init_log.sql)
+#
+#   create           partitions for the current period and the next ones
+#   retention        detach (or drop) partitions older than N periods
+#   vacuum-payloads  delete logs.log_payloads blobs no log row references
+#   migrate          move old single-heap log tables into partitioned ones
+#   replay-spool     load locally spooled log records (utils/log_spool.py)
+# ----------------------------------------------------------------------
+
+SCHEMA = "logs"
+
+# table -> partition key column
+LOG_TABLES = {
+    "db_pipeline_logs": "created_at",
+    "agent_llm_logs": "run_timestamp",
+}
+
+LOG_COLUMNS = {
+    "db_pipeline_logs": ["id", "request_id", "app_name", "pipeline_name", "stage", "log_data", "created_at"],
+    "agent_llm_logs": ["id", "session_id", "app_name", "agent_name", "log_data", "run_timestamp"],
+}
+
+INIT_LOG_SQL = PROJECT_DIR / "db_setup" / "init_log.sql"
+
+
+# --- Periods ----------------------------------------------------------
+
+def period_start(day: date, interval: str) -> date:
+    return day if interval == "day" else day.replace(day=1)
+
+
+def next_period(start: date, interval: str) -> date:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def previous_periods(start: date, count: int, interval: str) -> date:
+    for _ in range(count):
+        start = period_start(start - timedelta(days=1), interval)
+    return start
+
+
+def partition_name(table: str, start: date, interval: str) -> str:
+    suffix = start.strftime("%Y%m%d") if interval == "day" else start.strftime("%Y%m")
+    return f"{table}_p{suffix}"
+
+
+def parse_partition_name(table: str, name: str) -> Optional[Tuple[date, str]]:
+    """Return (period start, interval) for <table>_pYYYYMM[DD], None otherwise."""
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+    suffix = name[len(prefix):]
+    try:
+        if len(suffix) == 8:
+            return datetime.strptime(suffix, "%Y%m%d").date(), "day"
+        if len(suffix) == 6:
+            return datetime.strptime(suffix, "%Y%m").date(), "month"
+    except ValueError:
+        return None
+    return None
+
+
+# --- Partitions -------------------------------------------------------
+
+def list_partitions(conn, table: str) -> List[str]:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname
+              FROM pg_inherits i
+              JOIN pg_class c ON c.oid = i.inhrelid
+              JOIN pg_class p ON p.oid = i.inhparent
+              JOIN pg_namespace n ON n.oid = p.relnamespace
+             WHERE n.nspname = %s AND p.relname = %s
+             ORDER BY c.relname
+        """, (SCHEMA, table))
+        return [r[0] for r in cur.fetchall()]
+
+
+def overlapping_partitions(conn, table: str, start: date, end: date) -> List[str]:
+    """
+    Partitions of `table` whose bounds overlap [start, end), whatever their
+    name or interval (e.g. a monthly partition around a daily range).
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT relname
+              FROM (
+                SELECT c.relname,
+                       substring(b.expr FROM $$FROM [(]'([^']+)'[)]$$)::timestamp AS lo,
+                       substring(b.expr FROM $$TO [(]'([^']+)'[)]$$)::timestamp AS hi
+                  FROM pg_inherits i
+                  JOIN pg_class c ON c.oid = i.inhrelid
+                  JOIN pg_class p ON p.oid = i.inhparent
+                  JOIN pg_namespace n ON n.oid = p.relnamespace
+                 CROSS JOIN LATERAL (SELECT pg_get_expr(c.relpartbound, c.oid) AS expr) b
+                 WHERE n.nspname = %s AND p.relname = %s AND b.expr <> 'DEFAULT'
+              ) bounds
+             WHERE COALESCE(lo, '-infinity') < %s AND COALESCE(hi, 'infinity') > %s
+             ORDER BY relname
+        """, (SCHEMA, table, end, start))
+        return [r[0] for r in cur.fetchall()]
+
+
+def ensure_partition(conn, table: str, start: date, interval: str) -> bool:
+    """
+    Create the partition of `table` for the period starting at `start`,
+    unless existing partitions already cover part of that range.
+    Rows that already landed in the DEFAULT partition for that range are
+    moved into the new partition (otherwise ATTACH would fail).
+    Returns True when a partition was created.
+    """
+    name = partition_name(table, start, interval)
+    end = next_period(start, interval)
+    existing = overlapping_partitions(conn, table, start, end)
+    if existing:
+        if existing != [name]:
+            print(f" ensure_partition : [{start}, {end}) of {SCHEMA}.{table} already covered by {', '.join(existing)}")
+        return False
+
+    ts_col = LOG_TABLES[table]
+    parent = sql.Identifier(SCHEMA, table)
+    part = sql.Identifier(SCHEMA, name)
+    default = sql.Identifier(SCHEMA, f"{table}_default")
+
+    with conn.cursor() as cur:
+        cur.execute(
+            sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE {} >= %s AND {} < %s)").format(
+                default, sql.Identifier(ts_col), sql.Identifier(ts_col)),
+            (start, end),
+        )
+        has_default_rows = cur.fetchone()[0]
+
+        if not has_default_rows:
+            cur.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+                part, parent, sql.Literal(start), sql.Literal(end)))
+        else:
+            cur.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(part, parent))
+            cur.execute(
+                sql.SQL("WITH moved AS (DELETE FROM {} WHERE {} >= %s AND {} < %s RETURNING *) "
+                        "INSERT INTO {} SELECT * FROM moved").format(
+                    default, sql.Identifier(ts_col), sql.Identifier(ts_col), part),
+                (start, end),
+            )
+            cur.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(
+                parent, part, sql.Literal(start), sql.Literal(end)))
+    conn.commit()
+    print(f" ensure_partition : created {SCHEMA}.{name} [{start}, {end})")
+    return True
+
+
+def create_partitions(ahead: int = LOG_PARTITIONS_AHEAD, interval: str = LOG_PARTITION_INTERVAL) -> None:
+    with db_utils.connection() as conn:
+        for table in LOG_TABLES:
+            start = period_start(date.today(), interval)
+            for _ in range(ahead + 1):
+                ensure_partition(conn, table, start, interval)
+                start = next_period(start, interval)
+
+
+def apply_retention(keep: int = LOG_RETENTION_PERIODS, interval: str = LOG_PARTITION_INTERVAL,
+                    drop: bool = False) -> List[str]:
+    """
+    Detach partitions whose whole range is older than `keep` periods before
+    the current one; with drop=True they are dropped as well. Detached
+    partitions stay as plain tables (archive / dump them, then drop).
+    """
+    cutoff = previous_periods(period_start(date.today(), interval), keep, interval)
+    removed = []
+
+    with db_utils.connection() as conn:
+        for table in LOG_TABLES:
+            for name in list_partitions(conn, table):
+                parsed = parse_partition_name(table, name)
+                if parsed is None:
+                    continue
+                start, part_interval = parsed
+                if next_period(start, part_interval) > cutoff:
+                    continue
+
+                with conn.cursor() as cur:
+                    cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                        sql.Identifier(SCHEMA, table), sql.Identifier(SCHEMA, name)))
+                    if drop:
+                        cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(SCHEMA, name)))
+                conn.commit()
+                removed.append(name)
+                print(f" apply_retention : {'dropped' if drop else 'detached'} {SCHEMA}.{name}")
+
+    return removed
+
+
+def log_data_tables(conn) -> List[str]:
+    """
+    Tables of the log schema holding log rows: the partitioned tables, plus
+    partitions detached by apply_retention and *_legacy tables left by
+    migrate (attached partitions are read through their parent).
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname
+              FROM pg_class c
+              JOIN pg_namespace n ON n.oid = c.relnamespace
+              JOIN pg_attribute a ON a.attrelid = c.oid AND a.attname = 'log_data' AND NOT a.attisdropped
+             WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+             ORDER BY c.relname
+        """, (SCHEMA,))
+        return [r[0] for r in cur.fetchall()]
+
+
+def vacuum_payloads(min_age_hours: int = 24) -> int:
+    """
+    Mark and sweep: delete payload blobs no log row references, in the log
+    tables and in detached partitions / legacy tables (drop those first to
+    release their blobs). Blobs referenced within `min_age_hours` are kept:
+    their log rows may still be in flight or spooled (a spooled record
+    stores its blobs again when replayed).
+    """
+    if min_age_hours * 3600 <= LOG_PAYLOAD_KNOWN_TTL_S:
+        raise ValueError(f"min_age_hours must exceed LOG_PAYLOAD_KNOWN_TTL_S ({LOG_PAYLOAD_KNOWN_TTL_S:g} s)")
+
+    with db_utils.connection() as conn:
+        tables = log_data_tables(conn)
+        refs = sql.SQL(" UNION ALL ").join(
+            sql.SQL("""SELECT jsonb_path_query(log_data, 'strict $.**."$payload_ref"') AS r FROM {}""").format(
+                sql.Identifier(SCHEMA, table))
+            for table in tables
+        )
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("""
+                CREATE TEMP TABLE live_payloads ON COMMIT DROP AS
+                SELECT DISTINCT r #>> '{{}}' AS payload_hash
+                  FROM ({}) refs;
+            """).format(refs))
+            cur.execute("""
+                DELETE FROM logs.log_payloads p
+                 WHERE p.last_referenced_at < now() - make_interval(hours => %s)
+                   AND NOT EXISTS (SELECT 1 FROM live_payloads l WHERE l.payload_hash = p.payload_hash)
+            """, (min_age_hours,))
+            deleted = cur.rowcount
+        conn.commit()
+    print(f" vacuum_payloads : deleted {deleted} unreferenced payload(s), references read from {', '.join(tables)}")
+    return deleted
+
+
+# --- Migration of the old heap tables ---------------------------------
+
+def relkind(conn, table: str) -> Optional[str]:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+             WHERE n.nspname = %s AND c.relname = %s
+        """, (SCHEMA, table))
+        row = cur.fetchone()
+        return row[0] if row else None
+
+
+def migrate(interval: str = LOG_PARTITION_INTERVAL, drop_legacy: bool = False) -> None:
+    """
+    1. drop the *_full views (they would follow the rename, and their int
+       id column cannot be replaced by the BIGSERIAL one), then rename each
+       non-partitioned log table (and its pkey / sequence) to *_legacy
+    2. run init_log.sql: partitioned tables, indexes and views are created
+    3. create partitions covering the legacy data and copy it one period
+       per transaction (rows without timestamp go to the DEFAULT partition)
+    4. move the id sequence past the legacy ids
+    """
+    with db_utils.connection() as conn:
+        legacy = [t for t in LOG_TABLES if relkind(conn, t) == "r"]
+        if not legacy:
+            print(" migrate : log tables are already partitioned")
+            return
+
+        with conn.cursor() as cur:
+            for table in LOG_TABLES:
+                cur.execute(sql.SQL("DROP VIEW IF EXISTS {}").format(sql.Identifier(SCHEMA, f"{table}_full")))
+            for table in legacy:
+                cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                    sql.Identifier(SCHEMA, table), sql.Identifier(f"{table}_legacy")))
+                cur.execute(sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                    sql.Identifier(SCHEMA, f"{table}_legacy"),
+                    sql.Identifier(f"{table}_pkey"), sql.Identifier(f"{table}_legacy_pkey")))
+                cur.execute(sql.SQL("ALTER SEQUENCE IF EXISTS {} RENAME TO {}").format(
+                    sql.Identifier(SCHEMA, f"{table}_id_seq"), sql.Identifier(f"{table}_legacy_id_seq")))
+            cur.execute(INIT_LOG_SQL.read_text(encoding="utf-8"))
+        conn.commit()
+
+        for table in legacy:
+            ts_col = sql.Identifier(LOG_TABLES[table])
+            source = sql.Identifier(SCHEMA, f"{table}_legacy")
+            target = sql.Identifier(SCHEMA, table)
+            cols = sql.SQL(", ").join(sql.Identifier(c) for c in LOG_COLUMNS[table])
+
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("SELECT min({}), max({}) FROM {}").format(ts_col, ts_col, source))
+                first, last = cur.fetchone()
+
+            copied = 0
+            if first is not None:
+                start = period_start(first.date(), interval)
+                while start <= last.date():
+                    ensure_partition(conn, table, start, interval)
+                    end = next_period(start, interval)
+                    with conn.cursor() as cur:
+                        cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} WHERE {} >= %s AND {} < %s").format(
+                            target, cols, cols, source, ts_col, ts_col), (start, end))
+                        copied += cur.rowcount
+                    conn.commit()
+                    start = end
+
+            with conn.cursor() as cur:
+                select_cols = sql.SQL(", ").join(
+                    sql.SQL("COALESCE({}, 'epoch')").format(sql.Identifier(c)) if c == LOG_TABLES[table]
+                    else sql.Identifier(c)
+                    for c in LOG_COLUMNS[table]
+                )
+                cur.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} WHERE {} IS NULL").format(
+                    target, cols, select_cols, source, ts_col))
+                copied += cur.rowcount
+                cur.execute(sql.SQL(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST((SELECT max(id) FROM {}), 1))"
+                ).format(source), (f"{SCHEMA}.{table}",))
+                if drop_legacy:
+                    cur.execute(sql.SQL("DROP TABLE {}").format(source))
+            conn.commit()
+            print(f" migrate : copied {copied} row(s) into {SCHEMA}.{table}"
+                  f"{', legacy table dropped' if drop_legacy else ''}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partition maintenance for the log tables")
+    parser.add_argument("--interval", choices=["day", "month"], default=LOG_PARTITION_INTERVAL)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p_create = commands.add_parser("create", help="create current and upcoming partitions")
+    p_create.add_argument("--ahead", type=int, default=LOG_PARTITIONS_AHEAD)
+
+    p_ret = commands.add_parser("retention", help="detach or drop old partitions")
+    p_ret.add_argument("--keep", type=int, default=LOG_RETENTION_PERIODS,
+                       help="number of past periods to keep besides the current one")
+    p_ret.add_argument("--drop", action="store_true", help="drop instead of only detaching")
+
+    p_vac = commands.add_parser("vacuum-payloads", help="delete unreferenced payload blobs")
+    p_vac.add_argument("--min-age-hours", type=int, default=24,
+                       help="keep blobs referenced more recently than this")
+
+    p_mig = commands.add_parser("migrate", help="move heap log tables into partitioned tables")
+    p_mig.add_argument("--drop-legacy", action="store_true")
+
+    commands.add_parser("replay-spool", help="bulk-load the local log spool into the log tables")
+
+    args = parser.parse_args()
+    if args.command == "create":
+        create_partitions(ahead=args.ahead, interval=args.interval)
+    elif args.command == "retention":
+        apply_retention(keep=args.keep, interval=args.interval, drop=args.drop)
+    elif args.command == "vacuum-payloads":
+        vacuum_payloads(min_age_hours=args.min_age_hours)
+    elif args.command == "migrate":
+        migrate(interval=args.interval, drop_legacy=args.drop_legacy)
+    elif args.command == "replay-spool":
+        replay_spool()
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 import json
 from pathlib import Path
@@ -5,49 +6,83 @@ from pathlib import Path
 
 # 1) Your own modules
 import normalize_request
-from get_info_use_case import get_context_bundle  # from uploaded file :contentReference[oaicite:1]{index=1}
+from get_info_use_case import get_context_bundle_async, get_catalog_version_async  # from uploaded file :contentReference[oaicite:1]{index=1}
 import gen_dml_script_file
-from utils.helper_utils import clean_model_json
-from utils.config import APP_NAME,USER_ID, SESSION_ID
-from utils.logging_utils import log_pipeline_event, log_agent_events, extract_llm_interactions
-from sequential_adk_agent import build_adk_agents
-
-
-# 2) ADK imports
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.genai import types
+from dry_run_script import dry_run_script
+from request_segments import segment_request, merge_plans, SegmentMergeError
+from review_queue import (
+    raw_key, normalized_key, lookup_unmatched, record_unmatched, unmatched_outcome, route_to_review,
+)
+from get_sql_info_agent import SQL_DISCOVERY_SYSTEM_PROMPT
+from get_dml_info_agent import DML_PLANNER_SYSTEM_PROMPT, store_cached_plan
+from utils.json_extract import parse_model_json_async
+from utils.llm_scheduler import get_scheduler, is_retryable
+from utils.config import APP_NAME,USER_ID, SESSION_ID, DEFAULT_LLM_MODEL, EMBEDDING_MODEL, PROJECT_DIR
+from utils.logging_utils import log_pipeline_event, AgentEventStream, flush_log_tasks, DEBUG, WARNING, ERROR
+from utils.db_utils import close_async_pool
+from utils.checkpoint_utils import (
+    STAGES, hash_file, build_stage_fingerprints, load_checkpoint, save_checkpoint, stages_from,
+)
+from sequential_adk_agent import build_adk_agents, adk_permits, release_adk_permits
+
+# 2) ADK (Runner, sessions, genai types) is imported by run_adk_pipeline on
+#    first use: runs answered from checkpoints, the plan cache or the review
+#    queue, and --help, never load it
 
 pipeline_name = "main_pipeline"
 
 
 
-def step1_normalize(input_file: Path) -> dict:
+async def step1_normalize(input_file: Path) -> dict:
     log_pipeline_event(
         request_id="UNKNOWN", pipeline_name=pipeline_name, stage="step1_normalize:start",
         data={"input_file": str(input_file)}
     )
     
-    normalized = normalize_request.normalize_request_file(str(input_file))
+    # blocking SDK call: keep the event loop free for concurrent requests
+    normalized = await asyncio.to_thread(normalize_request.normalize_request_file, str(input_file))
     request_id = normalized.get("request_id", "UNKNOWN")
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name, stage="step1_normalize:normalized",
-        data={"normalized": normalized}
+        data=lambda: {"normalized": normalized}
     )
     return normalized
 
-def step2_get_context(request_id :str, normalized: dict) -> dict:
+async def step2_get_context(request_id :str, normalized: dict) -> dict:
     
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name, stage="step2_get_context:start",
-        data={"normalized": normalized}
+        data=lambda: {"normalized": normalized}, level=DEBUG
     )
     
     search_text = normalized["normalized"]
     subject = normalized["title"]
     body_text = normalized["content"]
 
-    context_bundle = get_context_bundle(
+    # several changes in one ticket: one context bundle per segment, fetched concurrently
+    segments = segment_request(normalized)
+    if segments:
+        bundles = await asyncio.gather(*(
+            get_context_bundle_async(
+                search_text=seg["search_text"],
+                request_id=seg["request_id"],
+                subject=subject,
+                body_text=seg["text"],
+            )
+            for seg in segments
+        ))
+        context_bundle = {"segments": [{**seg, "context_bundle": b} for seg, b in zip(segments, bundles)]}
+        log_pipeline_event(
+            request_id=request_id, pipeline_name=pipeline_name, stage="step2_get_context:segments",
+            data=lambda: {"segments": [
+                {"index": s["index"], "text": s["text"],
+                 "use_case_ids": [u.get("id") for u in s["context_bundle"].get("use_cases_sql", [])]}
+                for s in context_bundle["segments"]
+            ]}
+        )
+        return context_bundle
+
+    context_bundle = await get_context_bundle_async(
         search_text=search_text,
         request_id=request_id,
         subject=subject,
@@ -56,7 +91,15 @@ def step2_get_context(request_id :str, normalized: dict) -> dict:
 
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name, stage="step2_get_context:end",
-        data={"context_bundle": context_bundle}
+        data=lambda: {
+            "use_case_ids": [u.get("id") for u in context_bundle.get("use_cases_sql", [])],
+            "tables": [f"{t['schema_name']}.{t['table_name']}" for t in context_bundle.get("tables", [])],
+            "retrieval": context_bundle.get("retrieval"),
+        }
+    )
+    log_pipeline_event(
+        request_id=request_id, pipeline_name=pipeline_name, stage="step2_get_context:context_bundle",
+        data=lambda: {"context_bundle": context_bundle}, level=DEBUG
     )
     #logger.debug(f"context_bundle: {json.dumps(context_bundle, indent=2, ensure_ascii=False)}")
     return context_bundle
@@ -67,7 +110,7 @@ def build_context_for_agents( request_id :str, normalized: dict,  context_bundle
 
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name,stage="build_context_for_agents:start",
-        data={"context_bundle": context_bundle}
+        data=lambda: {"context_bundle": context_bundle}, level=DEBUG
     )
 
 
@@ -105,11 +148,24 @@ def build_context_for_agents( request_id :str, normalized: dict,  context_bundle
     return context_for_agents
 
 
-async def run_adk_pipeline(request_id:str, context_for_agents: dict) -> dict:
+async def run_adk_pipeline(request_id:str, context_for_agents: dict, sql_probe=None, on_stage_output=None) -> dict:
+    """
+    Run discovery + planning agents and return the plan.
+
+    sql_probe       : output restored from a checkpoint; the discovery agent
+                      is skipped and the planner runs on top of it.
+    on_stage_output : callback(stage, payload) called for "sql_probe" as soon
+                      as it is available, before the plan is parsed, so it
+                      survives a failing planner.
+    """
+    from google.adk.sessions import InMemorySessionService
+    from google.adk.runners import Runner
+    from google.genai import types
+
     #logger.info("Step 4: running ADK SequentialAgent pipeline")
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:start",
-        data={"context_for_agents": str(context_for_agents)}
+        data=lambda: {"context_for_agents": context_for_agents}, level=DEBUG
     )
     
     
@@ -117,136 +173,183 @@ async def run_adk_pipeline(request_id:str, context_for_agents: dict) -> dict:
        # 1) Build workflow agent
     pipeline_agent = build_adk_agents()
 
-    events_collected = []
-
 
 
-    # 2) Session + Runner
-    session_service = InMemorySessionService()
-    await session_service.create_session(
-        app_name=APP_NAME,
-        user_id=USER_ID,
-        session_id=SESSION_ID,
-    )
-
-    log_pipeline_event(
-        request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:await_session_created",
-        data={"context_for_agents": str(context_for_agents)}
-    )
-
-    runner = Runner(
-        agent=pipeline_agent,
-        app_name=APP_NAME,
-        session_service=session_service,
-    )
-
-    log_pipeline_event(
-        request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:runner_created",
-        data={"context_for_agents": str(context_for_agents)}
-    )
+    # 2) Session + Runner (one session per request and attempt, so concurrent runs do not share state)
+    session_id = f"{SESSION_ID}_{request_id}"
+    use_case_sql = context_for_agents.get("use_case_sql") or {}
+    # request_id / use_case_id / params are read by the planner's plan cache
+    initial_state = {
+        "request_id": request_id,
+        "use_case_id": use_case_sql.get("id"),
+        "params": context_for_agents.get("params", {}),
+    }
 
     # 3) First event from "user" with context JSON
     initial_message = json.dumps(context_for_agents, ensure_ascii=False)
 
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:initial_message",
-        data={"initial_message": str(initial_message)}
+        data=lambda: {"initial_message": initial_message}, level=DEBUG
     )
 
     user_content = types.Content(
         role="user",
         parts=[types.Part(text=initial_message)],
     )
- 
-    
-
-    async for event in runner.run_async(
-        user_id=USER_ID,
-        session_id=SESSION_ID,    
-        new_message=user_content,
-    ):
-        events_collected.append(event)
-
 
-
-    log_pipeline_event(
-        request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:async_for_event",
-        data={"context_for_agents": str(context_for_agents)}
-    )
-        
-    # convert events to dicts (if extract_llm_interactions exists)
-    events_payload = extract_llm_interactions(events_collected)
-
-   
-    log_agent_events(
-         session_id=SESSION_ID,
-         agent_name="dml_pipeline",
-         log_data=events_payload
-        )
-    
-    # 5) After pipeline finishes, read final state
-    session = await session_service.get_session(  app_name=APP_NAME,
-                                                  user_id=USER_ID,
-                                                  session_id=SESSION_ID,
-                                                )
-    state = session.state or {}
+    stream = AgentEventStream(session_id=session_id, agent_name="dml_pipeline")
+
+    # 4) Run. A model call failing with 429 / 5xx re-runs the workflow after
+    #    the scheduler's backoff (Retry-After when given); a finished sql_probe
+    #    goes into the new session, so only the remaining agents call the model.
+    scheduler = get_scheduler()
+    attempt = 0
+    try:
+        while True:
+            if sql_probe:
+                initial_state["sql_probe"] = sql_probe
+            session_service = InMemorySessionService()
+            await session_service.create_session(
+                app_name=APP_NAME,
+                user_id=USER_ID,
+                session_id=session_id,
+                state=initial_state,
+            )
+            runner = Runner(
+                agent=pipeline_agent,
+                app_name=APP_NAME,
+                session_service=session_service,
+            )
+
+            log_pipeline_event(
+                request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:runner_created",
+                data={"session_id": session_id, "attempt": attempt}, level=DEBUG
+            )
+
+            held_permits = []
+            permits_token = adk_permits.set(held_permits)
+            try:
+                async for event in runner.run_async(
+                    user_id=USER_ID,
+                    session_id=session_id,
+                    new_message=user_content,
+                ):
+                    delta = stream.add(event)
+
+                    # sql_probe is final as soon as the discovery agent finishes
+                    if "sql_probe" in delta and on_stage_output is not None:
+                        on_stage_output("sql_probe", delta["sql_probe"])
+
+                    # the plan is the last output we need: stop without draining the run
+                    if "plan" in delta:
+                        break
+                break
+            except Exception as error:
+                release_adk_permits(held_permits, error=error)
+                sql_probe = stream.get("sql_probe", sql_probe)
+                if is_retryable(error) and attempt < scheduler.max_retries:
+                    delay = scheduler.backoff(attempt, error)
+                    scheduler.limiter(DEFAULT_LLM_MODEL).stats["retries"] += 1
+                    log_pipeline_event(
+                        request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:retry",
+                        data={"error": str(error), "attempt": attempt, "delay_s": round(delay, 2),
+                              "sql_probe_kept": bool(sql_probe)}, level=WARNING
+                    )
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                log_pipeline_event(
+                    request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:error",
+                    data=lambda: {"error": str(error), **stream.summary()}, level=ERROR
+                )
+                raise
+            finally:
+                release_adk_permits(held_permits)
+                adk_permits.reset(permits_token)
+    finally:
+        stream.flush()
 
     log_pipeline_event(
         request_id=request_id,
         pipeline_name=pipeline_name,
-        stage="run_adk_pipeline:full_state_dump",
-        data={
-            "state_keys": str(list(state.keys())),
-            "state_repr": str(state),
-        }
+        stage="run_adk_pipeline:state_summary",
+        data=stream.summary
     )
 
-    # 🔍 NEW: inspect / log the first agent output
-    # replace "sql_probe" with the actual output_key of your first agent
-    sql_probe = state.get("sql_probe")
+    # a restored sql_probe lives in the initial state, not in the event deltas
+    sql_probe = stream.get("sql_probe", sql_probe)
     
     log_pipeline_event(
         request_id=request_id,
         pipeline_name=pipeline_name,
         stage="run_adk_pipeline:state_after_agents",
-        data={"sql_probe": str(sql_probe)}
+        data=lambda: {"sql_probe": sql_probe}, level=DEBUG
     )
 
-    plan = state.get("plan")
+    plan = stream.get("plan")
     if not plan:
         raise RuntimeError("No 'plan' found in session.state after ADK pipeline")
-    plan= clean_model_json(plan)
     
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:get_sesion",
-        data={"plan": str(plan)}
+        data=lambda: {"plan": plan}, level=DEBUG
     )
 
+    # plan is usually JSON text: extract, repair and validate it (one repair call at most)
+    plan = await parse_model_json_async(plan, "plan", request_id=request_id)
 
-
-
-    # plan may be JSON string; normalize to dict
-    if isinstance(plan, str):
-
-        plan = json.loads(plan)
-
-
+    if stream.get("plan_cache_hit"):
+        log_pipeline_event(
+            request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:plan_cache_hit",
+            data={"use_case_id": initial_state["use_case_id"]}
+        )
+    else:
+        store_cached_plan(initial_state["use_case_id"], initial_state["params"], sql_probe, plan)
 
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name, stage="run_adk_pipeline:end",
-        data={"plan": str(plan)}
+        data=lambda: {"plan": plan}
     )
     
     
     return plan
 
-def step6_write_sql(request_id:str, plan: dict, input_file: Path) -> Path:
+async def plan_request(request_id: str, normalized: dict, context_bundle: dict,
+                       restore, checkpoint, coalescer=None) -> dict:
+    """
+    Steps 3-4 for one request, or one segment of a multi-item request
+    (normalized then only needs "content" and "params").
+    """
+    # 3) build context for ADK agents (cheap, never checkpointed)
+    context_for_agents = build_context_for_agents(request_id, normalized, context_bundle)
+
+    # 4) run ADK sequential pipeline (a restored sql_probe skips the discovery agent)
+    plan = restore("plan")
+    if plan is None:
+        sql_probe = restore("sql_probe")
+
+        def run_agents():
+            return run_adk_pipeline(request_id, context_for_agents,
+                                    sql_probe=sql_probe, on_stage_output=checkpoint)
+
+        if coalescer is not None and sql_probe is None:
+            plan = await coalescer.run(context_for_agents, request_id, run_agents)
+        else:
+            plan = await run_agents()
+        checkpoint("plan", plan)
+    return plan
+
+
+async def step6_write_sql(request_id:str, plan: dict, input_file: Path) -> Path:
     log_pipeline_event(
         request_id=request_id, pipeline_name=pipeline_name, stage="step6_write_sql:start",
-        data={"plan": str(plan)}
+        data=lambda: {"plan": plan}, level=DEBUG
     )
     output_dir = input_file.parent
-    script_path = gen_dml_script_file.write_sql_script(plan, output_dir)
+    # column types of the target tables (cached); rejects unknown tables / columns
+    columns = await gen_dml_script_file.load_plan_columns_async(plan)
+    script_path = gen_dml_script_file.write_sql_script(plan, output_dir, columns=columns)
 
 
 
@@ -257,33 +360,204 @@ def step6_write_sql(request_id:str, plan: dict, input_file: Path) -> Path:
     return script_path
 
 
-def run_pipeline_for_file(input_file: str) -> Path:
-    
-    base_dir = Path(__file__).resolve().parent
-    input_path = base_dir / "Data_files" / input_file
+async def build_fingerprints(input_path: Path, catalog_version: str = None) -> dict:
+    """Per-stage fingerprints from the input file, catalog, prompts and models."""
+    prompts = {
+        "normalizer": f"{normalize_request.DESCRIPTION}\n\n{normalize_request.INSTRUCTIONS}",
+        "sql_discovery": SQL_DISCOVERY_SYSTEM_PROMPT,
+        "dml_planner": DML_PLANNER_SYSTEM_PROMPT,
+    }
+    models = {"llm": DEFAULT_LLM_MODEL, "embedding": EMBEDDING_MODEL}
+    if catalog_version is None:
+        catalog_version = await get_catalog_version_async()
+    return build_stage_fingerprints(hash_file(input_path), catalog_version, prompts, models)
+
+
+async def run_with_db(coro):
+    """Run a pipeline coroutine, then drain pending log inserts and close the pool."""
+    try:
+        return await coro
+    finally:
+        await flush_log_tasks()
+        await close_async_pool()
+
+
+def send_to_review(request: dict, outcome: dict, source: str, keys: list, catalog_version: str,
+                   normalized: dict = None):
+    """Remember the request as unmatched (all known keys) and queue it for human review."""
+    record_unmatched(keys, outcome, catalog_version)
+    error = route_to_review(request, outcome, source,
+                            normalized=normalized.get("normalized") if normalized else None)
+    log_pipeline_event(
+        request_id=error.review["request_id"], pipeline_name=pipeline_name, stage=f"review_queue:{source}",
+        data={"best_score": outcome.get("best_score"), "suggestions": outcome.get("nearest", [])}
+    )
+    return error
+
+
+def request_checkpoint_key(input_file: str) -> str:
+    """Checkpoint key of a request: its request_id, known from the raw file before normalization."""
+    return str(normalize_request.load_request_json(input_file).get("request_id", "UNKNOWN"))
+
+
+def run_pipeline_for_file(input_file: str, resume: bool = False, from_stage: str = None,
+                          dry_run: bool = False, dry_run_dsn: str = None) -> Path:
+    return asyncio.run(run_with_db(run_pipeline_async(
+        input_file, resume=resume, from_stage=from_stage, dry_run=dry_run, dry_run_dsn=dry_run_dsn,
+    )))
+
+
+async def run_pipeline_async(input_file: str, resume: bool = False, from_stage: str = None,
+                             coalescer=None, dry_run: bool = False, dry_run_dsn: str = None) -> Path:
+    """
+    resume     : reuse valid checkpoints of completed stages.
+    from_stage : recompute this stage and every later one (implies resume
+                 for the stages before it).
+    coalescer  : batch_pipeline.RequestCoalescer; identical requests of a
+                 batch share one discovery + planning run.
+    dry_run    : execute the script against dry_run_dsn (default: pipeline
+                 database) in a rolled-back transaction and write the
+                 report next to it.
+    """
+    input_path = PROJECT_DIR / "data_files" / input_file
+
+    checkpoint_key = request_checkpoint_key(input_file)
+    forced = stages_from(from_stage)
+    use_checkpoints = resume or from_stage is not None
+    catalog_version = await get_catalog_version_async()
+    fingerprints = await build_fingerprints(input_path, catalog_version)
+
+    # known unmatched request (same text, same catalog): no model call at all;
+    # an explicit --from-stage always recomputes
+    request = normalize_request.normalize_input_shape(normalize_request.load_request_json(input_file))
+    unmatched_keys = [raw_key(request, catalog_version)]
+    known = lookup_unmatched(unmatched_keys[0]) if from_stage is None else None
+    if known is not None:
+        raise send_to_review(request, known, "negative_cache", unmatched_keys, catalog_version)
+
+    def stage_store(key):
+        """restore / checkpoint functions for one checkpoint key (request or segment)."""
+        def restore(stage):
+            if not use_checkpoints or stage in forced:
+                return None
+            found = load_checkpoint(key, stage, fingerprints[stage])
+            if found is None:
+                return None
+            log_pipeline_event(
+                request_id=key, pipeline_name=pipeline_name, stage=f"checkpoint:{stage}:restored",
+                data={"fingerprint": fingerprints[stage]}
+            )
+            return found["payload"]
+
+        def checkpoint(stage, payload):
+            save_checkpoint(key, stage, payload, fingerprints[stage])
+
+        return restore, checkpoint
+
+    restore, checkpoint = stage_store(checkpoint_key)
 
     # 1) normalize
-    normalized = step1_normalize(input_path)
+    normalized = restore("normalized")
+    if normalized is None:
+        normalized = await step1_normalize(input_path)
+        checkpoint("normalized", normalized)
 
     request_id = str(normalized["request_id"])
 
-    # 2) get context bundle from Postgres
-    context_bundle = step2_get_context(request_id ,normalized)
-
-    # 3) build context for ADK agents
-    context_for_agents = build_context_for_agents(request_id , normalized, context_bundle)
+    # same normalized text as a known unmatched request: skip the embedding
+    unmatched_keys.append(normalized_key(normalized["normalized"], catalog_version))
+    known = lookup_unmatched(unmatched_keys[1]) if from_stage is None else None
+    if known is not None:
+        raise send_to_review(request, known, "negative_cache", unmatched_keys, catalog_version, normalized)
 
-    # 4) run ADK sequential pipeline
-    plan = asyncio.run(run_adk_pipeline(request_id , context_for_agents))
+    # 2) get context bundle from Postgres
+    context_bundle = restore("context_bundle")
+    if context_bundle is None:
+        context_bundle = await step2_get_context(request_id ,normalized)
+        checkpoint("context_bundle", context_bundle)
+
+    # no use case above the similarity threshold: nothing to automate
+    outcome = unmatched_outcome(context_bundle)
+    if outcome is not None:
+        raise send_to_review(request, outcome, "no_match", unmatched_keys, catalog_version, normalized)
+
+    # 3-4) context for the agents + discovery / planning
+    segments = context_bundle.get("segments")
+    if not segments:
+        plan = await plan_request(request_id, normalized, context_bundle, restore, checkpoint, coalescer)
+    else:
+        # one sub-pipeline per segment, run concurrently, each with its own
+        # checkpoints; the plans are merged so the ticket gets one script
+        plan = restore("plan")
+        if plan is None:
+            plans = await asyncio.gather(*(
+                plan_request(seg["request_id"], {"content": seg["text"], "params": seg["params"]},
+                             seg["context_bundle"], *stage_store(f"{checkpoint_key}-s{seg['index']}"),
+                             coalescer=coalescer)
+                for seg in segments
+            ))
+            for seg in segments:
+                seg["use_case_sql"] = (seg["context_bundle"].get("use_cases_sql") or [None])[0]
+            try:
+                plan = merge_plans(request_id, normalized["title"], segments, plans)
+                log_pipeline_event(
+                    request_id=request_id, pipeline_name=pipeline_name, stage="plan_request:segments_merged",
+                    data={"segments": plan["segments"], "renumbered": plan.get("renumbered", [])}
+                )
+            except SegmentMergeError as error:
+                # renumbered ids that other actions may refer to: one planner
+                # run for the whole request picks consistent ids
+                log_pipeline_event(
+                    request_id=request_id, pipeline_name=pipeline_name, stage="plan_request:segments_unmerged",
+                    data={"error": str(error)}, level=WARNING
+                )
+                whole_bundle = await get_context_bundle_async(
+                    search_text=normalized["normalized"], request_id=request_id,
+                    subject=normalized["title"], body_text=normalized["content"],
+                )
+                outcome = unmatched_outcome(whole_bundle)
+                if outcome is not None:
+                    raise send_to_review(request, outcome, "no_match", unmatched_keys, catalog_version, normalized)
+                plan = await plan_request(request_id, normalized, whole_bundle,
+                                          *stage_store(f"{checkpoint_key}-whole"), coalescer=coalescer)
+            checkpoint("plan", plan)
 
     # 5) write SQL script
-    script_path = step6_write_sql(request_id ,plan, input_path)
+    script_path = restore("script")
+    if script_path is None or not Path(script_path["path"]).exists():
+        script_path = await step6_write_sql(request_id ,plan, input_path)
+        checkpoint("script", script_path)
+
+    # 6) optional dry run (blocking driver: keep it off the event loop)
+    if dry_run:
+        report = await asyncio.to_thread(dry_run_script, plan, script_path, None, dry_run_dsn)
+        log_pipeline_event(
+            request_id=request_id, pipeline_name=pipeline_name, stage="dry_run:end",
+            data={"report_path": report["report_path"], "wall_ms": report["script"]["wall_ms"],
+                  "flags": report["flags"]}
+        )
     print(f"Done. Generated SQL script: {script_path}")
     return script_path
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="TEXT-TO-DML pipeline for one request file")
+    parser.add_argument("input_file", nargs="?", default="input_req_123458.json",
+                        help="request JSON file inside data_files/")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip stages that have a valid checkpoint")
+    parser.add_argument("--from-stage", choices=STAGES, default=None,
+                        help="force recomputation from this stage on")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="run the script in a rolled-back transaction and write a report next to it")
+    parser.add_argument("--dry-run-dsn", default=None,
+                        help="target database for --dry-run (default: pipeline database)")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
     
-  
-    script_path = run_pipeline_for_file("input_req_123458.json")
-   # print(f"Done. Generated SQL script: {script_path}")
\ No newline at end of file
+    args = parse_args()
+    script_path = run_pipeline_for_file(args.input_file, resume=args.resume, from_stage=args.from_stage,
+                                        dry_run=args.dry_run, dry_run_dsn=args.dry_run_dsn)
+   # print(f"Done. Generated SQL script: {script_path}")
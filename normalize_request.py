@@ -1,18 +1,10 @@
-import os
 import json
 import re
-from pathlib import Path
-from dotenv import load_dotenv
 
-import google.generativeai as genai
-
-from utils.config import  DEFAULT_LLM_MODEL
-
-load_dotenv()
-
-
-# We now use GOOGLE_API_KEY instead of OPENAI_API_KEY
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+from utils.config import  DEFAULT_LLM_MODEL, PROJECT_DIR
+from utils.genai_client import get_generative_model
+from utils.llm_scheduler import get_scheduler, estimate_tokens, usage_tokens
+from utils.json_extract import parse_model_json
 
 
 # --------- LLM AGENT CONFIG --------- #
@@ -135,10 +127,9 @@ def build_params_dict(normalized_text: str, params_list: list) -> dict:
 
 def load_request_json(file_name: str) -> dict:
     """
-    Read JSON from Data_files/<file_name> and return it as a dict.
+    Read JSON from data_files/<file_name> and return it as a dict.
     """
-    base_dir = Path(__file__).resolve().parent
-    file_path = base_dir / "Data_files" / file_name
+    file_path = PROJECT_DIR / "data_files" / file_name
 
     with open(file_path, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -166,21 +157,15 @@ def normalize_input_shape(raw: dict) -> dict:
     }
 
 
-def build_model() -> genai.GenerativeModel:
+def build_model():
     """
-    Configure the Gemini client and build the model with system instructions.
+    The Gemini model with the normalizer's system instructions (created on
+    the first call, then reused: see utils/genai_client.py).
     """
-    api_key = GOOGLE_API_KEY
-    genai.configure(api_key=api_key)
-
-    model = genai.GenerativeModel(
-        model_name=DEFAULT_LLM_MODEL,
-        system_instruction=f"{DESCRIPTION}\n\n{INSTRUCTIONS}",
-    )
-    return model
+    return get_generative_model(DEFAULT_LLM_MODEL, f"{DESCRIPTION}\n\n{INSTRUCTIONS}")
 
 
-def call_normalizer(model: genai.GenerativeModel, request_obj: dict) -> dict:
+def call_normalizer(model, request_obj: dict) -> dict:
     """
     Send the request object to the LLM and parse its JSON response.
     The agent is expected to return a JSON object as plain text.
@@ -188,11 +173,17 @@ def call_normalizer(model: genai.GenerativeModel, request_obj: dict) -> dict:
     # We send the JSON string as the content
     prompt = json.dumps(request_obj, ensure_ascii=False)
 
-    response = model.generate_content(prompt)
+    response = get_scheduler().call(
+        DEFAULT_LLM_MODEL,
+        model.generate_content,
+        prompt,
+        est_tokens=estimate_tokens(INSTRUCTIONS) + 2 * estimate_tokens(prompt),
+        usage_fn=usage_tokens,
+    )
     raw_text = (response.text or "").strip()
 
-    # Expecting valid JSON as per the instructions
-    normalized_result = json.loads(raw_text)
+    # JSON is expected, but prose / fences / small syntax faults are tolerated
+    normalized_result = parse_model_json(raw_text, "normalize", request_id=request_obj.get("request_id"))
     return normalized_result
 
 
@@ -236,12 +227,14 @@ def normalize_request_file(file_name: str) -> dict:
     #    - all fields from request_for_llm
     #    - plus normalized (our combined field)
     #    - plus params as a dict
+    #    - plus the raw params list (request_segments: a placeholder name used twice)
     final_output = {
         "request_id": request_for_llm["request_id"],
         "title": request_for_llm["title"],
         "content": request_for_llm["content"],
         "normalized": final_normalized,
         "params": params_dict,
+        "params_list": params_list,
     }
     
     return final_output
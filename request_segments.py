@@ -0,0 +1,171 @@
+import re
+from typing import Any, Dict, List, Optional
+
+from utils.config import MAX_REQUEST_SEGMENTS
+
+# ----------------------------------------------------------------------
+# Multi-item requests ("add COD_SIND X and update fee 136")
+#
+# segment_request splits the normalized request text where a new action
+# verb starts after a separator (";", ".", new line, "and", "then", ...).
+# Every segment keeps the params of the placeholders it contains; a piece
+# without any placeholder is glued to its neighbour. Each segment then gets
+# its own context bundle, discovery and planning (main_pipeline), and
+# merge_plans puts the plans back into one plan, so one script / one
+# transaction serves the whole ticket.
+# ----------------------------------------------------------------------
+
+ACTION_VERBS = (
+    "add", "create", "insert", "register", "introduce", "update", "change", "modify", "set",
+    "expire", "close", "replace",
+    # RO
+    "adauga", "adaugati", "creeaza", "creati", "introdu", "introduceti", "actualizeaza",
+    "actualizati", "modifica", "modificati", "schimba", "inchide", "expira",
+)
+
+SEGMENT_SPLIT_RE = re.compile(
+    r"\s*(?:[;\n]|\.\s|,?\s+(?:and|also|then|plus|si|și|apoi)\s)\s*"
+    r"(?=(?:please\s+|va\s+rog\s+)?(?:" + "|".join(ACTION_VERBS) + r")\b)",
+    re.IGNORECASE,
+)
+PLACEHOLDER_RE = re.compile(r"<(v_[^>]+)>")
+
+
+def request_body(normalized: dict) -> str:
+    """The request text of normalize_request's "normalized" field (without the title)."""
+    text = normalized.get("normalized", "") or ""
+    _, found, body = text.partition("request_text:")
+    return (body if found else text).strip()
+
+
+def segment_request(normalized: dict, max_segments: int = MAX_REQUEST_SEGMENTS) -> List[Dict[str, Any]]:
+    """
+    -> [{"index", "request_id", "text", "search_text", "params"}], or [] when
+    the request holds a single item (or more than max_segments pieces,
+    which is more likely a list of values than a list of changes).
+    """
+    body = request_body(normalized)
+    pieces = [p.strip(" ;,.") for p in SEGMENT_SPLIT_RE.split(body) if p and p.strip(" ;,.")]
+
+    merged: List[str] = []
+    for piece in pieces:
+        if merged and not PLACEHOLDER_RE.search(piece):
+            merged[-1] = f"{merged[-1]} {piece}"
+        elif merged and not PLACEHOLDER_RE.search(merged[-1]):
+            merged[-1] = f"{merged[-1]} {piece}"
+        else:
+            merged.append(piece)
+    if len(merged) < 2 or len(merged) > max_segments:
+        return []
+
+    params = normalized.get("params") or {}
+    # values in order of appearance: right even when two items use the same
+    # placeholder name (the params dict keeps only the last value)
+    params_list = normalized.get("params_list")
+    if params_list is not None and len(params_list) != len(PLACEHOLDER_RE.findall(body)):
+        params_list = None
+
+    request_id = str(normalized.get("request_id", "UNKNOWN"))
+    segments, position = [], 0
+    for i, text in enumerate(merged, start=1):
+        seg_params = {}
+        for name in PLACEHOLDER_RE.findall(text):
+            seg_params[name] = params_list[position] if params_list is not None else params.get(name)
+            position += 1
+        segments.append({
+            "index": i,
+            "request_id": f"{request_id}-s{i}",
+            "text": text,
+            "search_text": f"request_text:{text}",
+            "params": seg_params,
+        })
+    return segments
+
+
+# ----------------------------------------------------------------------
+# Merge
+# ----------------------------------------------------------------------
+
+class SegmentMergeError(ValueError):
+    """Segment plans that cannot be merged safely; the request is planned as a whole."""
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _renumber_references(seg_actions: List[dict], position: int, old: int, new: int) -> List[Dict[str, Any]]:
+    """
+    Point the segment's later references to the renumbered row at its new
+    id: keys / fields on the row's own primary key column. Any other value
+    equal to the old id (an FK column, a self reference, an action before
+    the insert) cannot be told apart from an unrelated value and raises
+    SegmentMergeError.
+    """
+    inserted = seg_actions[position]
+    table, pk = inserted.get("target_table"), inserted.get("pk_key")
+    rewritten = []
+    for index, act in enumerate(seg_actions):
+        if index == position:
+            continue
+        for part in ("keys", "fields"):
+            values = act.get(part) or {}
+            for column in [c for c, value in values.items() if _as_int(value) == old]:
+                if index < position or act.get("target_table") != table or column != pk:
+                    raise SegmentMergeError(
+                        f"{table}.{pk} {old} of segment {inserted.get('segment')} is taken by an earlier segment, "
+                        f"and {act.get('target_table')}.{column} = {old} may refer to it")
+                act[part] = {**values, column: new}
+                rewritten.append({"action": index, "in": part, "column": column})
+    return rewritten
+
+
+def merge_plans(request_id: str, subject: Optional[str], segments: List[Dict[str, Any]],
+                plans: List[dict]) -> dict:
+    """
+    One plan from the segment plans, actions in segment order. Each segment
+    probed max(pk)+1 on its own, so two segments inserting into the same
+    table pick the same id: later inserts get the next free id, and the
+    later actions of their segment that use the old id on that table's
+    primary key follow (see _renumber_references; "renumbered" lists the
+    rewrites). Raises SegmentMergeError when that is not safe.
+    """
+    actions, summary, renumbered = [], [], []
+    used_ids: Dict[str, set] = {}
+
+    for segment, plan in zip(segments, plans):
+        seg_actions = [{**act, "segment": segment["index"]} for act in plan.get("actions", [])]
+        for position, act in enumerate(seg_actions):
+            pk = act.get("pk_key")
+            fields = act.get("fields") or {}
+            pk_value = _as_int(fields.get(pk)) if pk else None
+            if act.get("action") in ("insert", "expire_and_insert") and pk_value is not None:
+                table_ids = used_ids.setdefault(act.get("target_table"), set())
+                if pk_value in table_ids:
+                    new_value = max(table_ids) + 1
+                    rewritten = _renumber_references(seg_actions, position, pk_value, new_value)
+                    renumbered.append({"segment": segment["index"], "table": act.get("target_table"),
+                                       "pk_key": pk, "from": pk_value, "to": new_value,
+                                       "references": rewritten})
+                    act["fields"] = {**fields, pk: new_value}
+                    pk_value = new_value
+                table_ids.add(pk_value)
+            actions.append(act)
+
+        use_case = segment.get("use_case_sql") or {}
+        summary.append({
+            "index": segment["index"],
+            "text": segment["text"],
+            "use_case_id": use_case.get("id"),
+            "score": use_case.get("score"),
+            "actions": len(plan.get("actions", [])),
+            "shared_plan_of": plan.get("shared_plan_of"),
+        })
+
+    merged = {"request_id": request_id, "subject": subject, "actions": actions, "segments": summary}
+    if renumbered:
+        merged["renumbered"] = renumbered
+    return merged
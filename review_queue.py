@@ -0,0 +1,128 @@
+import json
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.cache_utils import TTLCache
+from utils.checkpoint_utils import hash_json
+from utils.config import (
+    NEGATIVE_CACHE_MAX_ENTRIES, NEGATIVE_CACHE_TTL_S, NEGATIVE_CACHE_FILE, REVIEW_QUEUE_FILE,
+    RETRIEVAL_MODE, RETRIEVAL_MIN_SCORE, LEXICAL_MIN_SCORE, HYBRID_LEXICAL_WEIGHT,
+)
+
+# ----------------------------------------------------------------------
+# Requests no use case matches (no score >= threshold in the context query)
+#
+# The first time, normalization and embedding are paid for before we find
+# out. The outcome is then cached under two keys, both tied to the catalog
+# version (a changed catalog means a new key, so old entries simply age
+# out), and to the retrieval settings (a lower threshold may find a match):
+#   raw        title + content as submitted (checked before the normalizer)
+#   normalized normalizer output (checked before the embedding)
+# A resubmission hitting either key goes straight to the human review queue
+# (REVIEW_QUEUE_FILE, one JSON line per request, with the nearest use cases
+# as suggestions) without any model call.
+# ----------------------------------------------------------------------
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_queue_lock = threading.Lock()
+_negative_cache: Optional[TTLCache] = None
+RETRIEVAL_SETTINGS = [RETRIEVAL_MODE, RETRIEVAL_MIN_SCORE, LEXICAL_MIN_SCORE, HYBRID_LEXICAL_WEIGHT]
+
+
+class UnmatchedRequest(RuntimeError):
+    """No catalog use case matches the request; it was queued for human review."""
+
+    def __init__(self, message: str, review: Dict[str, Any]):
+        super().__init__(message)
+        self.review = review
+
+
+def get_negative_cache() -> TTLCache:
+    global _negative_cache
+    if _negative_cache is None:
+        _negative_cache = TTLCache(NEGATIVE_CACHE_MAX_ENTRIES, NEGATIVE_CACHE_TTL_S, NEGATIVE_CACHE_FILE or None)
+    return _negative_cache
+
+
+def _canonical(text: Any) -> str:
+    return _WHITESPACE_RE.sub(" ", str(text or "")).strip().lower()
+
+
+def raw_key(request: dict, catalog_version: str) -> str:
+    return hash_json(["raw", catalog_version, RETRIEVAL_SETTINGS, _canonical(request.get("title")), _canonical(request.get("content"))])
+
+
+def normalized_key(normalized_text: str, catalog_version: str) -> str:
+    return hash_json(["normalized", catalog_version, RETRIEVAL_SETTINGS, _canonical(normalized_text)])
+
+
+def lookup_unmatched(key: str) -> Optional[dict]:
+    """Cached no-match outcome for this key, or None."""
+    return get_negative_cache().get(key)
+
+
+def unmatched_outcome(context_bundle: dict) -> Optional[dict]:
+    """
+    -> {"best_score", "nearest", "segments"} when the bundle (or one of its
+    segments) has no matching use case, else None.
+    """
+    segments = context_bundle.get("segments")
+    bundles = [s["context_bundle"] for s in segments] if segments else [context_bundle]
+    missing = [i for i, b in enumerate(bundles, start=1) if not b.get("use_cases_sql")]
+    if not missing:
+        return None
+
+    nearest = sorted((n for i in missing for n in bundles[i - 1].get("nearest", [])),
+                     key=lambda n: n.get("score") or 0, reverse=True)
+    return {
+        "best_score": nearest[0].get("score") if nearest else None,
+        "nearest": nearest,
+        "segments": missing if segments else None,
+    }
+
+
+def record_unmatched(keys: List[str], outcome: dict, catalog_version: str) -> None:
+    cache = get_negative_cache()
+    entry = {**outcome, "catalog_version": catalog_version,
+             "recorded_at": datetime.now().isoformat(timespec="seconds")}
+    for key in keys:
+        cache.set(key, entry)
+
+
+def enqueue_review(request: dict, outcome: dict, source: str, normalized: Optional[str] = None,
+                   queue_file: str = REVIEW_QUEUE_FILE) -> Dict[str, Any]:
+    """
+    Append one request to the review queue.
+    source : "no_match" (just found out) or "negative_cache" (known unmatched)
+    """
+    review = {
+        "queued_at": datetime.now().isoformat(timespec="seconds"),
+        "request_id": str(request.get("request_id", "UNKNOWN")),
+        "source": source,
+        "title": request.get("title"),
+        "content": request.get("content"),
+        "normalized": normalized,
+        "best_score": outcome.get("best_score"),
+        "unmatched_segments": outcome.get("segments"),
+        "suggestions": outcome.get("nearest", []),
+    }
+    path = Path(queue_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(review, ensure_ascii=False, default=str) + "\n"
+    with _queue_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+    return review
+
+
+def route_to_review(request: dict, outcome: dict, source: str, normalized: Optional[str] = None) -> UnmatchedRequest:
+    """Queue the request and return the exception that ends its pipeline run."""
+    review = enqueue_review(request, outcome, source, normalized=normalized)
+    best = outcome.get("best_score")
+    return UnmatchedRequest(
+        f"Request {review['request_id']}: no matching use case "
+        f"(best score {best if best is not None else 'n/a'}), queued for review in {REVIEW_QUEUE_FILE}",
+        review,
+    )
@@ -0,0 +1,328 @@
+import argparse
+import hashlib
+import heapq
+import json
+import os
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import psycopg
+
+import gen_dml_script_file
+from utils import db_utils
+from utils.checkpoint_utils import checkpoint_path
+
+# ----------------------------------------------------------------------
+# One execution bundle for the plans of a batch run.
+#
+#   bundle_<ts>.sql            BEGIN; then per request, in dependency order:
+#                                SAVEPOINT req_<n>; DO $$ ... $$; RELEASE SAVEPOINT req_<n>;
+#                              COMMIT;
+#   bundle_<ts>.manifest.json  per request: request_id, actions, tables,
+#                              depends_on, sha256 and byte offset / length of
+#                              its DO block in the bundle
+#
+# Plans are read twice through `load_plan` (once to order them, once to
+# render them), so only one rendered request is in memory at a time. Both
+# files are written under a temp name and renamed when complete.
+#
+# A request depends on an earlier one when it updates / expires a row the
+# other inserts, or touches the same row (same table and keys); otherwise
+# the batch order is kept. A plan rejected at render time is left out
+# together with the requests depending on it (manifest "skipped").
+#
+#   psql -v ON_ERROR_STOP=1 -f bundle.sql        all or nothing
+#   python script_bundle.py apply <manifest>     --skip-failed rolls back a
+#                                                failing request (and the
+#                                                ones depending on it) only
+# ----------------------------------------------------------------------
+
+PlanLoader = Callable[[Any], Optional[dict]]
+
+
+def _norm(value: Any) -> str:
+    return str(value).strip()
+
+
+def plan_summary(plan: dict) -> Dict[str, Any]:
+    """Tables, action counts and the rows a plan inserts or addresses by key."""
+    actions = plan.get("actions", [])
+    inserts, keyed = [], []
+    for act in actions:
+        table = act.get("target_table")
+        if act.get("action") in ("insert", "expire_and_insert"):
+            inserts.append((table, {k: _norm(v) for k, v in (act.get("fields") or {}).items()}))
+        if act.get("keys"):
+            keys = sorted((k, _norm(v)) for k, v in act["keys"].items())
+            keyed.append((table, tuple(k for k, _ in keys), tuple(v for _, v in keys)))
+    return {
+        "request_id": str(plan.get("request_id", "unknown")),
+        "actions": len(actions),
+        "action_counts": dict(Counter(a.get("action") for a in actions)),
+        "tables": sorted({a.get("target_table") for a in actions if a.get("target_table")}),
+        "inserts": inserts,
+        "keyed": keyed,
+    }
+
+
+def dependency_order(summaries: List[Dict[str, Any]]) -> List[int]:
+    """
+    Positions of `summaries` in execution order; sets summary["depends_on"].
+    Stable: without dependencies the input order is kept. A cycle (two
+    requests inserting the row the other one updates) is broken in input
+    order, with a warning.
+    """
+    key_columns: Dict[str, set] = {}
+    for summary in summaries:
+        for table, cols, _ in summary["keyed"]:
+            key_columns.setdefault(table, set()).add(cols)
+
+    # row -> requests inserting it
+    inserted_by: Dict[tuple, List[int]] = {}
+    for i, summary in enumerate(summaries):
+        for table, fields in summary["inserts"]:
+            for cols in key_columns.get(table, ()):
+                if all(c in fields for c in cols):
+                    inserted_by.setdefault((table, cols, tuple(fields[c] for c in cols)), []).append(i)
+
+    edges: Dict[int, set] = {i: set() for i in range(len(summaries))}
+    last_touch: Dict[tuple, int] = {}
+    for i, summary in enumerate(summaries):
+        for row in summary["keyed"]:
+            for j in inserted_by.get(row, ()):
+                if j != i:
+                    edges[j].add(i)
+            j = last_touch.get(row)
+            if j is not None and j != i:
+                edges[j].add(i)
+            last_touch[row] = i
+
+    indegree = {i: 0 for i in edges}
+    for i, targets in edges.items():
+        for t in targets:
+            indegree[t] += 1
+        summaries[i]["depends_on"] = []
+    for i, targets in edges.items():
+        for t in targets:
+            summaries[t]["depends_on"].append(summaries[i]["request_id"])
+
+    ready = [i for i, d in indegree.items() if d == 0]
+    heapq.heapify(ready)
+    order, done = [], set()
+    while len(order) < len(summaries):
+        if not ready:
+            i = min(i for i in indegree if i not in done)
+            print(f" dependency_order : dependency cycle at request {summaries[i]['request_id']}, "
+                  f"keeping batch order")
+        else:
+            i = heapq.heappop(ready)
+            if i in done:
+                continue
+        done.add(i)
+        order.append(i)
+        for t in edges[i]:
+            indegree[t] -= 1
+            if indegree[t] == 0 and t not in done:
+                heapq.heappush(ready, t)
+    return order
+
+
+class _HashingWriter:
+    """Binary file writer keeping the byte offset and a running sha256."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        self.f.write(data)
+        self.sha256.update(data)
+        self.offset += len(data)
+        return data
+
+
+def write_bundle(plan_refs: Iterable[Any], load_plan: PlanLoader, path: str,
+                 mode: Optional[str] = None, name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    plan_refs : references of the approved plans, in batch order
+    load_plan : ref -> plan (None when the plan cannot be loaded)
+    path      : bundle file; the manifest goes next to it (.manifest.json)
+    """
+    refs, summaries, skipped = [], [], []
+    for ref in plan_refs:
+        plan = load_plan(ref)
+        if not plan or not plan.get("actions"):
+            skipped.append({"ref": str(ref), "reason": "no plan" if not plan else "no actions"})
+            continue
+        refs.append(ref)
+        summaries.append(plan_summary(plan))
+
+    order = dependency_order(summaries)
+    path = Path(path)
+    manifest_path = path.with_suffix(".manifest.json")
+    created_at = datetime.now().isoformat(timespec="seconds")
+    entries, rejected = [], set()
+
+    tmp_path = path.with_suffix(".sql.tmp")
+    with open(tmp_path, "wb") as f:
+        out = _HashingWriter(f)
+        out.write(f"-- Script bundle {name or path.stem}: {len(order)} request(s), generated {created_at}\n"
+                  f"-- Manifest: {manifest_path.name}\n"
+                  f"-- psql -v ON_ERROR_STOP=1 -f {path.name}  (a failure rolls back the whole bundle)\n"
+                  f"BEGIN;\n")
+        for position, i in enumerate(order, start=1):
+            summary = summaries[i]
+            # dependencies come first in `order`, so rejection propagates transitively
+            blocked = [r for r in summary["depends_on"] if r in rejected]
+            if blocked:
+                reason = f"depends on rejected request(s) {', '.join(blocked)}"
+            else:
+                try:
+                    sql = gen_dml_script_file.render_sql_text(load_plan(refs[i]), mode=mode, header=False)
+                    reason = None
+                except ValueError as error:
+                    reason = str(error)
+            if reason is not None:
+                print(f" write_bundle : request {summary['request_id']} rejected: {reason}")
+                rejected.add(summary["request_id"])
+                skipped.append({"ref": str(refs[i]), "request_id": summary["request_id"], "reason": reason})
+                continue
+
+            out.write(f"\n-- [{position}/{len(order)}] request {summary['request_id']}\n"
+                      f"SAVEPOINT req_{position};\n")
+            offset = out.offset
+            data = out.write(sql)
+            out.write(f"RELEASE SAVEPOINT req_{position};\n")
+
+            entries.append({
+                "position": position,
+                "savepoint": f"req_{position}",
+                "request_id": summary["request_id"],
+                "actions": summary["actions"],
+                "action_counts": summary["action_counts"],
+                "tables": summary["tables"],
+                "depends_on": summary["depends_on"],
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "offset": offset,
+                "length": len(data),
+            })
+        out.write("\nCOMMIT;\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    manifest = {
+        "bundle": path.name,
+        "created_at": created_at,
+        "requests": entries,
+        "skipped": skipped,
+        "tables": sorted({t for e in entries for t in e["tables"]}),
+        "actions": sum(e["actions"] for e in entries),
+        "sha256": out.sha256.hexdigest(),
+        "bytes": out.offset,
+    }
+    tmp_manifest = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp_manifest, manifest_path)
+
+    print(f" write_bundle : {len(entries)} request(s), {manifest['actions']} action(s), "
+          f"{len(skipped)} skipped -> {path}")
+    return {"path": str(path), "manifest_path": str(manifest_path), **manifest}
+
+
+def load_plan_checkpoint(checkpoint_key: str) -> Optional[dict]:
+    """Plan of a request from its checkpoint file (the fingerprint is not checked)."""
+    path = checkpoint_path(checkpoint_key, "plan")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("payload")
+    except (OSError, ValueError) as error:
+        print(f" load_plan_checkpoint : no plan for {checkpoint_key}: {error}")
+        return None
+
+
+# ----------------------------------------------------------------------
+# Apply
+# ----------------------------------------------------------------------
+
+def apply_bundle(manifest_path: str, conninfo: Optional[str] = None, skip_failed: bool = False) -> Dict[str, Any]:
+    """
+    Executes the bundle request by request in one transaction. A failing
+    request stops the run and rolls everything back; with skip_failed it is
+    rolled back to its savepoint, the requests depending on it are skipped
+    and the rest is committed.
+    """
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    bundle_path = manifest_path.parent / manifest["bundle"]
+
+    results, failed = [], set()
+    with open(bundle_path, "rb") as bundle, psycopg.connect(conninfo or db_utils.get_conninfo()) as conn:
+        with conn.cursor() as cur:
+            for entry in manifest["requests"]:
+                result = {"request_id": entry["request_id"], "position": entry["position"]}
+                results.append(result)
+                blocked = [r for r in entry["depends_on"] if r in failed]
+                if blocked:
+                    failed.add(entry["request_id"])
+                    result["status"] = "skipped"
+                    result["error"] = f"depends on failed request(s) {', '.join(blocked)}"
+                    continue
+
+                bundle.seek(entry["offset"])
+                data = bundle.read(entry["length"])
+                if hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                    raise ValueError(f"bundle {bundle_path} was modified (request {entry['request_id']})")
+
+                cur.execute(f"SAVEPOINT {entry['savepoint']}")
+                try:
+                    cur.execute(data.decode("utf-8"))
+                    cur.execute(f"RELEASE SAVEPOINT {entry['savepoint']}")
+                    result["status"] = "applied"
+                except psycopg.Error as error:
+                    cur.execute(f"ROLLBACK TO SAVEPOINT {entry['savepoint']}")
+                    failed.add(entry["request_id"])
+                    result["status"] = "failed"
+                    result["error"] = str(error)
+                    print(f" apply_bundle : request {entry['request_id']} failed: {error}")
+                    if not skip_failed:
+                        break
+
+        committed = skip_failed or not failed
+        if committed:
+            conn.commit()
+        else:
+            conn.rollback()
+
+    print(f" apply_bundle : {sum(r['status'] == 'applied' for r in results)} applied, "
+          f"{len(failed)} failed or skipped, {'committed' if committed else 'rolled back'}")
+    return {"committed": committed, "results": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or apply a script bundle")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p_build = commands.add_parser("build", help="bundle the checkpointed plans of some requests")
+    p_build.add_argument("out", help="bundle .sql path")
+    p_build.add_argument("request_ids", nargs="+", help="checkpoint keys (request ids), in batch order")
+    p_build.add_argument("--mode", default=None, help="per_action, batched or auto")
+
+    p_apply = commands.add_parser("apply", help="execute a bundle, one savepoint per request")
+    p_apply.add_argument("manifest")
+    p_apply.add_argument("--dsn", default=None, help="target database conninfo (default: pipeline database)")
+    p_apply.add_argument("--skip-failed", action="store_true",
+                         help="roll back failing requests only and commit the others")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        write_bundle(args.request_ids, load_plan_checkpoint, args.out, mode=args.mode)
+    else:
+        apply_bundle(args.manifest, conninfo=args.dsn, skip_failed=args.skip_failed)
+    db_utils.close_pool()
@@ -1,20 +1,99 @@
 # main_pipeline.py
 
-from google.adk.agents.sequential_agent import SequentialAgent
+import json
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional
+
 from get_sql_info_agent import build_sql_info_agent
-from get_dml_info_agent import build_dml_planner_agent
+from get_dml_info_agent import build_dml_planner_agent, plan_cache_before_agent
 from utils.config import  DEFAULT_LLM_MODEL
+from utils.llm_scheduler import get_scheduler, estimate_tokens, usage_tokens
+
+if TYPE_CHECKING:  # ADK is imported by build_adk_agents / the callbacks, on first use
+    from google.adk.agents.callback_context import CallbackContext
+    from google.adk.agents.sequential_agent import SequentialAgent
+    from google.adk.models import LlmRequest, LlmResponse
+    from google.genai import types
+
+# Scheduler permits held by the current ADK run. Normally released by
+# after_model_callback; release_adk_permits() settles the ones left behind
+# by a model call that raised.
+adk_permits: ContextVar[Optional[List[dict]]] = ContextVar("adk_permits", default=None)
+
+
+def skip_if_output_in_state(output_key: str):
+    """
+    before_agent_callback factory: when session.state already holds the
+    agent's output (e.g. restored from a checkpoint), return it as the agent
+    response so the LLM call is skipped entirely.
+    """
+    def _callback(callback_context: "CallbackContext") -> Optional["types.Content"]:
+        value = callback_context.state.get(output_key)
+        if not value:
+            return None
+        from google.genai import types
+
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        return types.Content(role="model", parts=[types.Part(text=text)])
+
+    return _callback
+
+
+async def rate_limit_before_model(callback_context: "CallbackContext",
+                                  llm_request: "LlmRequest") -> Optional["LlmResponse"]:
+    """Wait for an LLM scheduler permit before ADK calls the model."""
+    system_instruction = getattr(llm_request.config, "system_instruction", None) if llm_request.config else None
+    est_tokens = estimate_tokens(llm_request.contents) + estimate_tokens(system_instruction)
+
+    permit = await get_scheduler().acquire_async(llm_request.model or DEFAULT_LLM_MODEL, est_tokens)
+    held = adk_permits.get()
+    if held is not None:
+        held.append(permit)
+    else:
+        # no run-level tracking: nothing could release it later
+        get_scheduler().release(permit)
+    return None
+
+
+def rate_limit_after_model(callback_context: "CallbackContext",
+                           llm_response: "LlmResponse") -> Optional["LlmResponse"]:
+    """Return the permit and settle the token bucket with the real usage."""
+    held = adk_permits.get()
+    if held:
+        get_scheduler().release(held.pop(0), used_tokens=usage_tokens(llm_response))
+    return None
+
+
+def release_adk_permits(held: List[dict], error: Optional[BaseException] = None) -> None:
+    while held:
+        get_scheduler().release(held.pop(0), error=error)
+
+
+@lru_cache(maxsize=1)
+def build_adk_agents() -> "SequentialAgent":
+    """
+    The discovery + planning workflow, built once per process: the agents
+    hold no per-request state (that lives in the session), so every
+    Runner / session reuses the same tree.
+    """
+    from google.adk.agents.sequential_agent import SequentialAgent
 
-def build_adk_agents() -> SequentialAgent:
     sql_agent = build_sql_info_agent(
         model_name=DEFAULT_LLM_MODEL,
         output_key="sql_probe",
+        before_agent_callback=skip_if_output_in_state("sql_probe"),
+        before_model_callback=rate_limit_before_model,
+        after_model_callback=rate_limit_after_model,
     )
 
-    
+
     dml_agent = build_dml_planner_agent(
         model_name=DEFAULT_LLM_MODEL,
         output_key="plan",
+        before_agent_callback=plan_cache_before_agent,
+        before_model_callback=rate_limit_before_model,
+        after_model_callback=rate_limit_after_model,
     )
 
     return SequentialAgent(
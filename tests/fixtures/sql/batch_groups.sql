@@ -0,0 +1,108 @@
+DO $$
+
+-- Generated as a PostgreSQL PL/pgSQL DO-block
+DECLARE
+  v_request_id text := 'G-2';
+  v_started_at timestamptz := now();
+  v_rows int;
+  v_keys int;
+  v_err_text text;
+  v_err_state text;
+BEGIN
+  RAISE NOTICE 'Request % started at %', v_request_id, v_started_at;
+
+  /* 3 action(s): new tariff */
+  INSERT INTO public.fee_tariff (id, code, amount, date_in, date_out) VALUES
+    (900, 'N0', 1.00, CURRENT_DATE, NULL),
+    (901, 'N1', 1.00, CURRENT_DATE, NULL),
+    (902, 'N2', 1.00, CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  IF v_rows <> 3 THEN
+    RAISE EXCEPTION 'Expected % inserted row(s) in %, got %', 3, 'public.fee_tariff', v_rows;
+  END IF;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.fee_tariff';
+
+  /* 2 action(s): new amount; corrected amount */
+  UPDATE public.fee_tariff AS tgt
+     SET amount = v.s_amount
+    FROM (VALUES
+      (11::integer, 6.50::numeric(12,2)),
+      (10, 7.50)
+    ) AS v(k_id, s_amount)
+   WHERE tgt.id = v.k_id;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in % for 2 key(s)', v_rows, 'public.fee_tariff';
+
+  -- TODO unsupported action: delete on public.fee_tariff
+
+  /* 2 action(s): new version */
+  -- 1) expire current row(s)
+  WITH expired AS (
+    UPDATE public.domain_values AS tgt
+       SET date_out = CURRENT_DATE
+      FROM (VALUES
+        (4::integer, 'A'::character varying(50)),
+        (4, 'B')
+      ) AS v(k_dmn_id, k_value)
+     WHERE tgt.dmn_id = v.k_dmn_id AND tgt.value = v.k_value
+       AND tgt.date_out IS NULL
+    RETURNING v.k_dmn_id, v.k_value
+  )
+  SELECT count(*), count(DISTINCT ROW(k_dmn_id, k_value)) INTO v_rows, v_keys FROM expired;
+  RAISE NOTICE 'Expired % row(s) in % for % key(s)', v_rows, 'public.domain_values', v_keys;
+
+  IF v_keys < 2 THEN
+    RAISE EXCEPTION 'No active row to expire in % for % of % key(s)', 'public.domain_values', 2 - v_keys, 2
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- 2) insert new versions
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out) VALUES
+    (601, 4, 'A', 'a2', CURRENT_DATE, NULL),
+    (602, 4, 'B', 'b2', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  IF v_rows <> 2 THEN
+    RAISE EXCEPTION 'Expected % inserted row(s) in %, got %', 2, 'public.domain_values', v_rows;
+  END IF;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  /* 1 action(s): again */
+  -- 1) expire current row(s)
+  WITH expired AS (
+    UPDATE public.domain_values AS tgt
+       SET date_out = CURRENT_DATE
+      FROM (VALUES
+        (4::integer, 'A'::character varying(50))
+      ) AS v(k_dmn_id, k_value)
+     WHERE tgt.dmn_id = v.k_dmn_id AND tgt.value = v.k_value
+       AND tgt.date_out IS NULL
+    RETURNING v.k_dmn_id, v.k_value
+  )
+  SELECT count(*), count(DISTINCT ROW(k_dmn_id, k_value)) INTO v_rows, v_keys FROM expired;
+  RAISE NOTICE 'Expired % row(s) in % for % key(s)', v_rows, 'public.domain_values', v_keys;
+
+  IF v_keys < 1 THEN
+    RAISE EXCEPTION 'No active row to expire in % for % of % key(s)', 'public.domain_values', 1 - v_keys, 1
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- 2) insert new versions
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out) VALUES
+    (603, 4, 'A', 'a3', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  IF v_rows <> 1 THEN
+    RAISE EXCEPTION 'Expected % inserted row(s) in %, got %', 1, 'public.domain_values', v_rows;
+  END IF;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  RAISE NOTICE 'Request % completed successfully', v_request_id;
+
+EXCEPTION
+  WHEN OTHERS THEN
+    GET STACKED DIAGNOSTICS
+      v_err_text  = MESSAGE_TEXT,
+      v_err_state = RETURNED_SQLSTATE;
+    RAISE NOTICE 'Request % failed: % (SQLSTATE=%)', v_request_id, v_err_text, v_err_state;
+    RAISE;
+END;
+$$ LANGUAGE plpgsql;
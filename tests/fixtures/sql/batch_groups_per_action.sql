@@ -0,0 +1,116 @@
+DO $$
+
+-- Generated as a PostgreSQL PL/pgSQL DO-block
+DECLARE
+  v_request_id text := 'G-2';
+  v_started_at timestamptz := now();
+  v_rows int;
+  v_keys int;
+  v_err_text text;
+  v_err_state text;
+BEGIN
+  RAISE NOTICE 'Request % started at %', v_request_id, v_started_at;
+
+  /* new tariff */
+  INSERT INTO public.fee_tariff (id, code, amount, date_in, date_out)
+  VALUES (900, 'N0', 1.00, CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.fee_tariff';
+
+  /* new tariff */
+  INSERT INTO public.fee_tariff (id, code, amount, date_in, date_out)
+  VALUES (901, 'N1', 1.00, CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.fee_tariff';
+
+  /* new tariff */
+  INSERT INTO public.fee_tariff (id, code, amount, date_in, date_out)
+  VALUES (902, 'N2', 1.00, CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.fee_tariff';
+
+  /* new amount */
+  UPDATE public.fee_tariff SET amount=5.50 WHERE id=10;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in %', v_rows, 'public.fee_tariff';
+
+  /* new amount */
+  UPDATE public.fee_tariff SET amount=6.50 WHERE id=11;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in %', v_rows, 'public.fee_tariff';
+
+  /* corrected amount */
+  UPDATE public.fee_tariff SET amount=7.50 WHERE id=10;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in %', v_rows, 'public.fee_tariff';
+
+  -- TODO unsupported action: delete on public.fee_tariff
+
+  /* new version */
+  -- 1) expire current row(s)
+  UPDATE public.domain_values
+     SET date_out = CURRENT_DATE
+   WHERE dmn_id=4 AND value='A'
+     AND date_out IS NULL;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Expired % row(s) in % for keys [dmn_id=4 AND value=''A'']', v_rows, 'public.domain_values';
+
+  IF v_rows = 0 THEN
+    RAISE EXCEPTION 'No active row to expire in % for keys [%]', 'public.domain_values', 'dmn_id=4 AND value=''A'''
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- 2) insert new version
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out) VALUES (601, 4, 'A', 'a2', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  /* new version */
+  -- 1) expire current row(s)
+  UPDATE public.domain_values
+     SET date_out = CURRENT_DATE
+   WHERE dmn_id=4 AND value='B'
+     AND date_out IS NULL;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Expired % row(s) in % for keys [dmn_id=4 AND value=''B'']', v_rows, 'public.domain_values';
+
+  IF v_rows = 0 THEN
+    RAISE EXCEPTION 'No active row to expire in % for keys [%]', 'public.domain_values', 'dmn_id=4 AND value=''B'''
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- 2) insert new version
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out) VALUES (602, 4, 'B', 'b2', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  /* again */
+  -- 1) expire current row(s)
+  UPDATE public.domain_values
+     SET date_out = CURRENT_DATE
+   WHERE dmn_id=4 AND value='A'
+     AND date_out IS NULL;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Expired % row(s) in % for keys [dmn_id=4 AND value=''A'']', v_rows, 'public.domain_values';
+
+  IF v_rows = 0 THEN
+    RAISE EXCEPTION 'No active row to expire in % for keys [%]', 'public.domain_values', 'dmn_id=4 AND value=''A'''
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- 2) insert new version
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out) VALUES (603, 4, 'A', 'a3', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  RAISE NOTICE 'Request % completed successfully', v_request_id;
+
+EXCEPTION
+  WHEN OTHERS THEN
+    GET STACKED DIAGNOSTICS
+      v_err_text  = MESSAGE_TEXT,
+      v_err_state = RETURNED_SQLSTATE;
+    RAISE NOTICE 'Request % failed: % (SQLSTATE=%)', v_request_id, v_err_text, v_err_state;
+    RAISE;
+END;
+$$ LANGUAGE plpgsql;
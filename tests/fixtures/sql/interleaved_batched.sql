@@ -0,0 +1,93 @@
+DO $$
+
+-- Generated as a PostgreSQL PL/pgSQL DO-block
+DECLARE
+  v_request_id text := 'G-4';
+  v_started_at timestamptz := now();
+  v_rows int;
+  v_keys int;
+  v_err_text text;
+  v_err_state text;
+BEGIN
+  RAISE NOTICE 'Request % started at %', v_request_id, v_started_at;
+
+  /* 1 action(s): old amount */
+  UPDATE public.fee_tariff AS tgt
+     SET amount = v.s_amount
+    FROM (VALUES
+      (5::integer, 1.00::numeric(12,2))
+    ) AS v(k_id, s_amount)
+   WHERE tgt.id = v.k_id;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in % for 1 key(s)', v_rows, 'public.fee_tariff';
+
+  /* 1 action(s): new tariff */
+  INSERT INTO public.fee_tariff (id, code, amount, date_in, date_out) VALUES
+    (5, 'N5', 1.50, CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  IF v_rows <> 1 THEN
+    RAISE EXCEPTION 'Expected % inserted row(s) in %, got %', 1, 'public.fee_tariff', v_rows;
+  END IF;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.fee_tariff';
+
+  /* 2 action(s): new amount; old amount */
+  UPDATE public.fee_tariff AS tgt
+     SET amount = v.s_amount
+    FROM (VALUES
+      (5::integer, 2.00::numeric(12,2)),
+      (6, 3.00)
+    ) AS v(k_id, s_amount)
+   WHERE tgt.id = v.k_id;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in % for 2 key(s)', v_rows, 'public.fee_tariff';
+
+  /* 1 action(s): new version */
+  -- 1) expire current row(s)
+  WITH expired AS (
+    UPDATE public.fee_tariff AS tgt
+       SET date_out = CURRENT_DATE
+      FROM (VALUES
+        (6::integer)
+      ) AS v(k_id)
+     WHERE tgt.id = v.k_id
+       AND tgt.date_out IS NULL
+    RETURNING v.k_id
+  )
+  SELECT count(*), count(DISTINCT ROW(k_id)) INTO v_rows, v_keys FROM expired;
+  RAISE NOTICE 'Expired % row(s) in % for % key(s)', v_rows, 'public.fee_tariff', v_keys;
+
+  IF v_keys < 1 THEN
+    RAISE EXCEPTION 'No active row to expire in % for % of % key(s)', 'public.fee_tariff', 1 - v_keys, 1
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- 2) insert new versions
+  INSERT INTO public.fee_tariff (id, code, amount, date_in, date_out) VALUES
+    (6, 'N6', 3.50, CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  IF v_rows <> 1 THEN
+    RAISE EXCEPTION 'Expected % inserted row(s) in %, got %', 1, 'public.fee_tariff', v_rows;
+  END IF;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.fee_tariff';
+
+  /* 1 action(s): new amount */
+  UPDATE public.fee_tariff AS tgt
+     SET amount = v.s_amount
+    FROM (VALUES
+      (6::integer, 4.00::numeric(12,2))
+    ) AS v(k_id, s_amount)
+   WHERE tgt.id = v.k_id;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in % for 1 key(s)', v_rows, 'public.fee_tariff';
+
+  RAISE NOTICE 'Request % completed successfully', v_request_id;
+
+EXCEPTION
+  WHEN OTHERS THEN
+    GET STACKED DIAGNOSTICS
+      v_err_text  = MESSAGE_TEXT,
+      v_err_state = RETURNED_SQLSTATE;
+    RAISE NOTICE 'Request % failed: % (SQLSTATE=%)', v_request_id, v_err_text, v_err_state;
+    RAISE;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,79 @@
+DO $$
+
+-- Generated as a PostgreSQL PL/pgSQL DO-block
+DECLARE
+  v_request_id text := 'G-1';
+  v_started_at timestamptz := now();
+  v_rows int;
+  v_keys int;
+  v_err_text text;
+  v_err_state text;
+BEGIN
+  RAISE NOTICE 'Request % started at %', v_request_id, v_started_at;
+
+  /* 1 action(s): new CODE_SIND */
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out) VALUES
+    (501, 4, 'B', 'O''Brien union', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  IF v_rows <> 1 THEN
+    RAISE EXCEPTION 'Expected % inserted row(s) in %, got %', 1, 'public.domain_values', v_rows;
+  END IF;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  /* 1 action(s): it''s the new amount */
+  UPDATE public.fee_tariff AS tgt
+     SET amount = v.s_amount, active = v.s_active
+    FROM (VALUES
+      (136::integer, 20.00::numeric(12,2), TRUE)
+    ) AS v(k_id, s_amount, s_active)
+   WHERE tgt.id = v.k_id;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in % for 1 key(s)', v_rows, 'public.fee_tariff';
+
+  /* 1 action(s): new meaning */
+  -- 1) expire current row(s)
+  WITH expired AS (
+    UPDATE public.domain_values AS tgt
+       SET date_out = CURRENT_DATE
+      FROM (VALUES
+        (4::integer, 'A'::character varying(50))
+      ) AS v(k_dmn_id, k_value)
+     WHERE tgt.dmn_id = v.k_dmn_id AND tgt.value = v.k_value
+       AND tgt.date_out IS NULL
+    RETURNING v.k_dmn_id, v.k_value
+  )
+  SELECT count(*), count(DISTINCT ROW(k_dmn_id, k_value)) INTO v_rows, v_keys FROM expired;
+  RAISE NOTICE 'Expired % row(s) in % for % key(s)', v_rows, 'public.domain_values', v_keys;
+
+  IF v_keys < 1 THEN
+    RAISE EXCEPTION 'No active row to expire in % for % of % key(s)', 'public.domain_values', 1 - v_keys, 1
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- 2) insert new versions
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out) VALUES
+    (502, 4, 'A', 'renamed', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  IF v_rows <> 1 THEN
+    RAISE EXCEPTION 'Expected % inserted row(s) in %, got %', 1, 'public.domain_values', v_rows;
+  END IF;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  /* no keys */
+  UPDATE public.fee_tariff SET code=NULL WHERE 1=0;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in %', v_rows, 'public.fee_tariff';
+
+  -- TODO unsupported action: delete on public.fee_tariff
+
+  RAISE NOTICE 'Request % completed successfully', v_request_id;
+
+EXCEPTION
+  WHEN OTHERS THEN
+    GET STACKED DIAGNOSTICS
+      v_err_text  = MESSAGE_TEXT,
+      v_err_state = RETURNED_SQLSTATE;
+    RAISE NOTICE 'Request % failed: % (SQLSTATE=%)', v_request_id, v_err_text, v_err_state;
+    RAISE;
+END;
+$$ LANGUAGE plpgsql;
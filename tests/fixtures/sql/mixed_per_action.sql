@@ -0,0 +1,68 @@
+DO $$
+/* ****************************************************************************************************
+ * Request: G-1
+ * Scope  : Golden: one action of each kind
+ * User   : automation_agent
+ * Start  : <started_at>
+ * Plan   : shared with request G-0
+ **************************************************************************************************** */
+
+-- Generated as a PostgreSQL PL/pgSQL DO-block
+DECLARE
+  v_request_id text := 'G-1';
+  v_started_at timestamptz := now();
+  v_rows int;
+  v_keys int;
+  v_err_text text;
+  v_err_state text;
+BEGIN
+  RAISE NOTICE 'Request % started at %', v_request_id, v_started_at;
+
+  /* new CODE_SIND */
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out)
+  VALUES (501, 4, 'B', 'O''Brien union', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  /* it''s the new amount */
+  UPDATE public.fee_tariff SET amount=20.00, active=TRUE WHERE id=136;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in %', v_rows, 'public.fee_tariff';
+
+  /* new meaning */
+  -- 1) expire current row(s)
+  UPDATE public.domain_values
+     SET date_out = CURRENT_DATE
+   WHERE dmn_id=4 AND value='A'
+     AND date_out IS NULL;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Expired % row(s) in % for keys [dmn_id=4 AND value=''A'']', v_rows, 'public.domain_values';
+
+  IF v_rows = 0 THEN
+    RAISE EXCEPTION 'No active row to expire in % for keys [%]', 'public.domain_values', 'dmn_id=4 AND value=''A'''
+      USING ERRCODE = 'no_data_found';
+  END IF;
+
+  -- 2) insert new version
+  INSERT INTO public.domain_values (id, dmn_id, value, meaning, date_in, date_out) VALUES (502, 4, 'A', 'renamed', CURRENT_DATE, NULL);
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Inserted % row(s) into %', v_rows, 'public.domain_values';
+
+  /* no keys */
+  UPDATE public.fee_tariff SET code=NULL WHERE 1=0;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RAISE NOTICE 'Updated % row(s) in %', v_rows, 'public.fee_tariff';
+
+  -- TODO unsupported action: delete on public.fee_tariff
+
+  RAISE NOTICE 'Request % completed successfully', v_request_id;
+
+EXCEPTION
+  WHEN OTHERS THEN
+    GET STACKED DIAGNOSTICS
+      v_err_text  = MESSAGE_TEXT,
+      v_err_state = RETURNED_SQLSTATE;
+    RAISE NOTICE 'Request % failed: % (SQLSTATE=%)', v_request_id, v_err_text, v_err_state;
+    RAISE;
+END;
+$$ LANGUAGE plpgsql;
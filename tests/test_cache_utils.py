@@ -0,0 +1,120 @@
+"""
+TTLCache (utils/cache_utils): LRU and TTL behaviour, batched write-back
+of file-backed caches and merging of the changes of two processes
+sharing one file (two instances on the same path stand in for them).
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.cache_utils import TTLCache  # noqa: E402
+
+
+def read(path: Path) -> dict:
+    return {key: entry["value"] for key, entry in json.loads(path.read_text(encoding="utf-8")).items()}
+
+
+def test_lru_eviction_and_ttl():
+    cache = TTLCache(max_entries=2, ttl_s=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # "b" is now the least recently used
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats["evictions"] == 1
+
+    cache.set("short", "x", ttl_s=-1)
+    assert cache.get("short") is None
+    assert len(cache) == 1 and cache.get("c") == 3
+
+
+def test_in_memory_cache_keeps_no_pending_changes():
+    cache = TTLCache(max_entries=10, ttl_s=60)
+    for i in range(100):
+        cache.set(str(i), i)
+        cache.invalidate(str(i))
+    assert cache._dirty == {}
+
+
+def test_changes_are_written_in_batches(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = TTLCache(max_entries=100, ttl_s=60, path=str(path), flush_every=3)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert not path.exists()
+    cache.set("c", 3)
+    assert read(path) == {"a": 1, "b": 2, "c": 3}
+
+    cache.set("d", 4)
+    cache.invalidate("a")
+    cache.flush()
+    assert read(path) == {"b": 2, "c": 3, "d": 4}
+    assert cache.stats["flushes"] == 2
+
+    # reads, and expired entries dropped by a read, write nothing
+    cache.set("e", 5, ttl_s=-1)
+    cache.flush()
+    flushes = cache.stats["flushes"]
+    assert cache.get("b") == 2 and cache.get("e") is None
+    cache.flush()
+    assert cache.stats["flushes"] == flushes
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = TTLCache(max_entries=100, ttl_s=60, path=str(path))
+    cache.set("plan", {"actions": []})
+    cache.set("old", 1, ttl_s=-1)
+    cache.flush()
+
+    restarted = TTLCache(max_entries=100, ttl_s=60, path=str(path))
+    assert restarted.get("plan") == {"actions": []}
+    assert restarted.get("old") is None
+
+
+def test_two_processes_keep_each_others_entries(tmp_path):
+    path = tmp_path / "cache.json"
+    first = TTLCache(max_entries=100, ttl_s=60, path=str(path))
+    second = TTLCache(max_entries=100, ttl_s=60, path=str(path))
+    first.set("shared", "first")
+    first.set("a", 1)
+    second.set("b", 2)
+    second.set("shared", "second")
+
+    first.flush()
+    second.flush()
+    assert read(path) == {"a": 1, "b": 2, "shared": "second"}
+    # after its flush a process also serves the entries of the other one
+    assert second.get("a") == 1
+
+    first.invalidate("b")
+    first.flush()
+    assert read(path) == {"a": 1, "shared": "second"}
+
+
+def test_file_keeps_the_most_recent_entries(tmp_path):
+    path = tmp_path / "cache.json"
+    first = TTLCache(max_entries=3, ttl_s=60, path=str(path))
+    second = TTLCache(max_entries=3, ttl_s=60, path=str(path))
+    for key in ("a", "b", "c"):
+        first.set(key, key)
+    first.flush()
+    time.sleep(0.01)
+    second.set("d", "d")
+    second.flush()
+    assert list(read(path)) == ["b", "c", "d"]
+    assert len(second) == 3
+
+
+def test_clear_empties_the_file(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = TTLCache(max_entries=100, ttl_s=60, path=str(path))
+    cache.set("a", 1)
+    cache.flush()
+    cache.set("b", 2)
+    cache.clear()
+    assert read(path) == {}
+    assert len(cache) == 0
@@ -0,0 +1,238 @@
+"""
+Golden tests of the DML renderer: render_sql output for fixed plans is
+compared with the scripts frozen in tests/fixtures/sql/ (the "Start" line,
+a timestamp, is masked). After an intended change of the generated SQL,
+regenerate them and review the diff:
+
+    python tests/test_gen_dml_script_file.py --regenerate
+"""
+import asyncio
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import gen_dml_script_file  # noqa: E402
+from gen_dml_script_file import render_sql, render_sql_text, typed_literal  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "sql"
+START_LINE = re.compile(r"\* Start  : \S+")
+
+TARIFF = "public.fee_tariff"
+DOMAIN_VALUES = "public.domain_values"
+
+
+def _columns(*specs):
+    return {name: {"type": col_type, "category": category, "not_null": False, "has_default": False}
+            for name, col_type, category in specs}
+
+
+# metadata as utils/table_metadata returns it
+COLUMNS = {
+    TARIFF: _columns(("id", "integer", "N"), ("code", "character varying(20)", "S"),
+                     ("amount", "numeric(12,2)", "N"), ("active", "boolean", "B"),
+                     ("date_in", "date", "D"), ("date_out", "date", "D")),
+    DOMAIN_VALUES: _columns(("id", "integer", "N"), ("dmn_id", "integer", "N"),
+                            ("value", "character varying(50)", "S"), ("meaning", "text", "S"),
+                            ("date_in", "date", "D"), ("date_out", "date", "D")),
+}
+
+# one action of each kind, quotes in reasons / values, version columns in fields
+MIXED_PLAN = {
+    "request_id": "G-1",
+    "title": "Golden: one action of each kind",
+    "shared_plan_of": "G-0",
+    "actions": [
+        {"target_table": DOMAIN_VALUES, "action": "insert", "reason": "new CODE_SIND",
+         "fields": {"id": 501, "dmn_id": 4, "value": "B", "meaning": "O'Brien union", "date_in": "2020-01-01"}},
+        {"target_table": TARIFF, "action": "update", "reason": "it's the new amount",
+         "keys": {"id": "136"}, "fields": {"amount": "20.00", "active": "yes"}},
+        {"target_table": DOMAIN_VALUES, "action": "expire_and_insert", "reason": "new meaning",
+         "keys": {"dmn_id": 4, "value": "A"},
+         "fields": {"id": 502, "dmn_id": 4, "value": "A", "meaning": "renamed", "date_out": "2030-01-01"}},
+        {"target_table": TARIFF, "action": "update", "reason": "no keys",
+         "fields": {"code": None}},
+        {"target_table": TARIFF, "action": "delete", "reason": "unsupported", "keys": {"id": 1}},
+    ],
+}
+
+# groups: bulk inserts, an update with a repeated key (the later wins), an
+# expire group split on a repeated key, singles in between
+BATCH_PLAN = {
+    "request_id": "G-2",
+    "title": "Golden: batched groups",
+    "actions": [
+        {"target_table": TARIFF, "action": "insert", "reason": "new tariff",
+         "fields": {"id": 900 + i, "code": f"N{i}", "amount": "1.00"}}
+        for i in range(3)
+    ] + [
+        {"target_table": TARIFF, "action": "update", "reason": "new amount",
+         "keys": {"id": 10}, "fields": {"amount": "5.50"}},
+        {"target_table": TARIFF, "action": "update", "reason": "new amount",
+         "keys": {"id": 11}, "fields": {"amount": "6.50"}},
+        {"target_table": TARIFF, "action": "update", "reason": "corrected amount",
+         "keys": {"id": 10}, "fields": {"amount": "7.50"}},
+        {"target_table": TARIFF, "action": "delete", "reason": "unsupported", "keys": {"id": 1}},
+        {"target_table": DOMAIN_VALUES, "action": "expire_and_insert", "reason": "new version",
+         "keys": {"dmn_id": 4, "value": "A"}, "fields": {"id": 601, "dmn_id": 4, "value": "A", "meaning": "a2"}},
+        {"target_table": DOMAIN_VALUES, "action": "expire_and_insert", "reason": "new version",
+         "keys": {"dmn_id": 4, "value": "B"}, "fields": {"id": 602, "dmn_id": 4, "value": "B", "meaning": "b2"}},
+        {"target_table": DOMAIN_VALUES, "action": "expire_and_insert", "reason": "again",
+         "keys": {"dmn_id": 4, "value": "A"}, "fields": {"id": 603, "dmn_id": 4, "value": "A", "meaning": "a3"}},
+    ],
+}
+
+# the same keys updated around an insert / a new version: each update
+# must run after the action before it, not in the group opened earlier
+INTERLEAVED_PLAN = {
+    "request_id": "G-4",
+    "title": "Golden: updates around an insert and a new version",
+    "actions": [
+        {"target_table": TARIFF, "action": "update", "reason": "old amount",
+         "keys": {"id": 5}, "fields": {"amount": "1.00"}},
+        {"target_table": TARIFF, "action": "insert", "reason": "new tariff",
+         "fields": {"id": 5, "code": "N5", "amount": "1.50"}},
+        {"target_table": TARIFF, "action": "update", "reason": "new amount",
+         "keys": {"id": 5}, "fields": {"amount": "2.00"}},
+        {"target_table": TARIFF, "action": "update", "reason": "old amount",
+         "keys": {"id": 6}, "fields": {"amount": "3.00"}},
+        {"target_table": TARIFF, "action": "expire_and_insert", "reason": "new version",
+         "keys": {"id": 6}, "fields": {"id": 6, "code": "N6", "amount": "3.50"}},
+        {"target_table": TARIFF, "action": "update", "reason": "new amount",
+         "keys": {"id": 6}, "fields": {"amount": "4.00"}},
+    ],
+}
+
+# fixture name -> (plan, mode, header, DML_BATCH_MAX_ROWS)
+CASES = {
+    "interleaved_batched": (INTERLEAVED_PLAN, "batched", False, 1000),
+    "mixed_per_action": (MIXED_PLAN, "per_action", True, 1000),
+    "mixed_batched": (MIXED_PLAN, "batched", False, 1000),
+    "batch_groups": (BATCH_PLAN, "batched", False, 1000),
+    "batch_groups_chunked": (BATCH_PLAN, "batched", True, 2),
+    "batch_groups_per_action": (BATCH_PLAN, "per_action", False, 1000),
+}
+
+
+def render_case(name: str, monkeypatch=None) -> str:
+    plan, mode, header, max_rows = CASES[name]
+    if monkeypatch is not None:
+        monkeypatch.setattr(gen_dml_script_file, "DML_BATCH_MAX_ROWS", max_rows)
+    else:
+        gen_dml_script_file.DML_BATCH_MAX_ROWS = max_rows
+    return START_LINE.sub("* Start  : <started_at>", render_sql_text(plan, mode=mode, columns=COLUMNS, header=header))
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_render_matches_golden(name, monkeypatch):
+    expected = (FIXTURES / f"{name}.sql").read_text(encoding="utf-8")
+    assert render_case(name, monkeypatch) == expected
+
+
+def test_streamed_render_equals_text(tmp_path):
+    out = tmp_path / "script.sql"
+    with open(out, "w", encoding="utf-8", newline="\n") as f:
+        render_sql(BATCH_PLAN, f.write, mode="batched", columns=COLUMNS, header=False)
+    assert out.read_text(encoding="utf-8") == render_sql_text(BATCH_PLAN, mode="batched", columns=COLUMNS,
+                                                             header=False)
+
+
+def test_groups_keep_the_plan_order_per_table():
+    groups = gen_dml_script_file.group_actions(INTERLEAVED_PLAN["actions"])
+    assert [(g["action"], [a["keys"].get("id", a["fields"].get("id")) for a in g["actions"]]) for g in groups] == [
+        ("update", [5]), ("insert", [5]), ("update", [5, 6]), ("expire_and_insert", [6]), ("update", [6]),
+    ]
+
+
+def test_invalid_plan_is_rejected_before_writing():
+    plan = {"request_id": "G-3", "actions": [
+        {"target_table": TARIFF, "action": "update", "keys": {"id": "abc"}, "fields": {"nope": 1}},
+    ]}
+    written = []
+    with pytest.raises(ValueError, match="unknown column public.fee_tariff.nope"):
+        render_sql(plan, written.append, columns=COLUMNS)
+    assert written == []
+
+
+
+INTEGER = {"type": "integer", "category": "N"}
+NUMERIC = {"type": "numeric(12,2)", "category": "N"}
+
+
+@pytest.mark.parametrize("value, literal", [
+    ("136", "136"), (136, "136"), ("136.0", "136"), ("1e3", "1000"), (" 42 ", "42"), ("-7.00", "-7"),
+])
+def test_integer_columns_get_integer_literals(value, literal):
+    assert typed_literal(value, INTEGER) == literal
+    assert typed_literal(value, INTEGER, cast=True) == f"{literal}::integer"
+
+
+@pytest.mark.parametrize("value", ["136.5", "abc", "NaN", "Infinity"])
+def test_invalid_integers_are_rejected(value):
+    with pytest.raises(ValueError):
+        typed_literal(value, INTEGER)
+
+
+def test_numeric_columns_keep_the_literal():
+    assert typed_literal("20.00", NUMERIC) == "20.00"
+    assert typed_literal("1e3", NUMERIC, cast=True) == "1e3::numeric(12,2)"
+
+
+def test_integral_decimal_key_renders_as_integer_comparison():
+    plan = {"request_id": "G-4", "actions": [
+        {"target_table": TARIFF, "action": "update", "keys": {"id": "136.0"}, "fields": {"amount": "1.00"}},
+    ]}
+    assert "WHERE id=136;" in render_sql_text(plan, mode="per_action", columns=COLUMNS, header=False)
+
+
+def _fake_metadata(monkeypatch, answers):
+    """load_table_metadata(_async) answering `answers` in order; -> list of the loads."""
+    loads = []
+
+    def load(tables):
+        loads.append(list(tables))
+        return answers[sum(load != "invalidate" for load in loads) - 1]
+
+    async def load_async(tables):
+        return load(tables)
+
+    monkeypatch.setattr(gen_dml_script_file, "load_table_metadata", load)
+    monkeypatch.setattr(gen_dml_script_file, "load_table_metadata_async", load_async)
+    monkeypatch.setattr(gen_dml_script_file, "invalidate_table_metadata", lambda tables: loads.append("invalidate"))
+    return loads
+
+
+def _load_columns(variant, plan):
+    if variant == "sync":
+        return gen_dml_script_file.load_plan_columns(plan)
+    return asyncio.run(gen_dml_script_file.load_plan_columns_async(plan))
+
+
+@pytest.mark.parametrize("variant", ["sync", "async"])
+def test_plan_columns_from_cache(variant, monkeypatch):
+    loads = _fake_metadata(monkeypatch, [COLUMNS])
+    assert _load_columns(variant, MIXED_PLAN) == COLUMNS
+    assert loads == [[DOMAIN_VALUES, TARIFF]]
+
+
+@pytest.mark.parametrize("variant", ["sync", "async"])
+def test_stale_plan_columns_are_reloaded_once(variant, monkeypatch):
+    stale = {TARIFF: {k: v for k, v in COLUMNS[TARIFF].items() if k != "active"}, DOMAIN_VALUES: COLUMNS[DOMAIN_VALUES]}
+    loads = _fake_metadata(monkeypatch, [stale, COLUMNS])
+    assert _load_columns(variant, MIXED_PLAN) == COLUMNS
+    assert loads == [[DOMAIN_VALUES, TARIFF], "invalidate", [DOMAIN_VALUES, TARIFF]]
+
+    loads = _fake_metadata(monkeypatch, [stale, stale])
+    with pytest.raises(ValueError, match="unknown column public.fee_tariff.active"):
+        _load_columns(variant, MIXED_PLAN)
+    assert len(loads) == 3
+
+
+if __name__ == "__main__" and "--regenerate" in sys.argv:
+    FIXTURES.mkdir(parents=True, exist_ok=True)
+    for case in sorted(CASES):
+        (FIXTURES / f"{case}.sql").write_text(render_case(case), encoding="utf-8", newline="\n")
+        print(f" regenerated {FIXTURES / case}.sql")
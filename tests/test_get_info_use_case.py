@@ -0,0 +1,101 @@
+"""
+Context bundle retrieval (get_info_use_case): the sync and async entry
+points run the same steps; the database and the embedding model are
+replaced by fakes that record the queries.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import get_info_use_case  # noqa: E402
+from get_info_use_case import LEXICAL_QUERY, get_context_bundle, get_context_bundle_async  # noqa: E402
+from utils import db_utils  # noqa: E402
+
+BUNDLE = {"use_cases_sql": [{"id": 7}], "tables": []}
+EMPTY = {"use_cases_sql": [], "tables": []}
+
+
+class FakeIO:
+    """Answers the lexical query with `lexical_rows` and the context queries with `bundles`, in order."""
+
+    def __init__(self, monkeypatch, lexical_rows=(), bundles=(BUNDLE,)):
+        self.lexical_rows = list(lexical_rows)
+        self.bundles = list(bundles)
+        self.calls = []
+        for name in ("fetch_all", "fetch_one"):
+            monkeypatch.setattr(db_utils, name, self._async(getattr(self, name)))
+            monkeypatch.setattr(db_utils, f"{name}_sync", getattr(self, name))
+
+    @staticmethod
+    def _async(fn):
+        async def wrapper(*args):
+            return fn(*args)
+        return wrapper
+
+    def fetch_all(self, sql, params):
+        self.calls.append(("fetch_all", "lexical" if sql == LEXICAL_QUERY else sql))
+        return self.lexical_rows
+
+    def fetch_one(self, sql, params):
+        self.calls.append(("fetch_one", "partition" if "locale IN" in sql else "global"))
+        return (self.bundles.pop(0),)
+
+    def embed(self, text):
+        self.calls.append(("embed", text))
+        return [0.0] * 4
+
+
+def run_both(monkeypatch, make_io, **kwargs):
+    """-> [(bundle, io calls)] of the sync and the async entry point."""
+    results = []
+    for fn in (get_context_bundle, get_context_bundle_async):
+        io = make_io(monkeypatch)
+        bundle = fn("new fee tariff", "r-1", "subject", "body", embed=io.embed, **kwargs)
+        if asyncio.iscoroutine(bundle):
+            bundle = asyncio.run(bundle)
+        for timing in ("ms", "embed_ms"):
+            bundle["retrieval"].pop(timing)
+        results.append((bundle, io.calls))
+    return results
+
+
+def test_vector_search(monkeypatch):
+    (sync, sync_calls), (async_, async_calls) = run_both(
+        monkeypatch, FakeIO, mode="vector", routing=False)
+    assert sync == async_
+    assert sync_calls == async_calls == [("embed", "new fee tariff"), ("fetch_one", "global")]
+    assert sync["use_cases_sql"] == [{"id": 7}]
+    assert sync["retrieval"]["embedding_call"] and not sync["retrieval"]["routed"]
+
+
+def test_lexical_fast_path_skips_the_embedding(monkeypatch):
+    monkeypatch.setattr(get_info_use_case, "LEXICAL_FAST_PATH", True)
+    rows = [(7, "uc", 0.99), (8, "other", 0.1)]
+    (sync, sync_calls), (async_, async_calls) = run_both(
+        monkeypatch, lambda mp: FakeIO(mp, lexical_rows=rows), mode="hybrid", routing=False)
+    assert sync == async_
+    assert sync_calls == async_calls == [("fetch_all", "lexical"), ("fetch_one", "global")]
+    assert sync["retrieval"]["used_mode"] == "lexical" and sync["retrieval"]["fast_path"]
+
+
+def test_empty_locale_partition_falls_back_to_global_search(monkeypatch):
+    (sync, sync_calls), (async_, async_calls) = run_both(
+        monkeypatch, lambda mp: FakeIO(mp, bundles=[EMPTY, BUNDLE]), mode="vector", routing=True, locale="RO")
+    assert sync == async_
+    assert sync_calls == async_calls == [
+        ("embed", "new fee tariff"), ("fetch_one", "partition"), ("fetch_one", "global"),
+    ]
+    assert sync["retrieval"]["fallback"] and not sync["retrieval"]["routed"]
+
+
+def test_unknown_mode_fails_before_any_call(monkeypatch):
+    io = FakeIO(monkeypatch)
+    with pytest.raises(ValueError):
+        get_context_bundle("x", "r-1", "", "", mode="semantic", embed=io.embed)
+    with pytest.raises(ValueError):
+        asyncio.run(get_context_bundle_async("x", "r-1", "", "", mode="semantic", embed=io.embed))
+    assert io.calls == []
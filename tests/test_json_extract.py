@@ -0,0 +1,56 @@
+"""
+Local repair of almost-JSON model output (utils/json_extract.repair_json):
+one case per repair listed in the module header, and the full parse path
+on a plan that only the repair step can read.
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.json_extract import ModelJsonError, parse_model_json, repair_json  # noqa: E402
+
+
+@pytest.mark.parametrize("text, expected", [
+    # smart quotes
+    ('{“reason”: “new tariff”}', {"reason": "new tariff"}),
+    ("{‘reason’: ‘new tariff’}", {"reason": "new tariff"}),
+    # \' escapes, in single- and double-quoted strings
+    ("{'reason': 'it\\'s ok'}", {"reason": "it's ok"}),
+    ('{"reason": "it\\\'s ok"}', {"reason": "it's ok"}),
+    # other escapes are kept
+    ('{"reason": "say \\"hi\\"", "path": "a\\\\b"}', {"reason": 'say "hi"', "path": "a\\b"}),
+    # single-quoted strings / keys, double quotes inside them
+    ("{'table': 'public.fee_tariff', 'note': 'the \"A\" code'}",
+     {"table": "public.fee_tariff", "note": 'the "A" code'}),
+    # bare keys
+    ('{request_id: "r-1", keys: {id: 136}}', {"request_id": "r-1", "keys": {"id": 136}}),
+    # trailing commas
+    ('{"actions": [1, 2, ], "keys": {"id": 1, }, }', {"actions": [1, 2], "keys": {"id": 1}}),
+    # raw newlines in strings
+    ('{"reason": "line one\r\nline two"}', {"reason": "line one\nline two"}),
+    # True / False / None
+    ('{"active": True, "deleted": False, "date_out": None}', {"active": True, "deleted": False, "date_out": None}),
+])
+def test_repair(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_valid_json_is_unchanged():
+    text = '{"request_id": "r-1", "actions": [{"keys": {"id": 136}, "reason": "it\'s \\"new\\""}]}'
+    assert json.loads(repair_json(text)) == json.loads(text)
+
+
+def test_plan_with_escaped_quote_is_repaired():
+    raw = ("Here is the plan:\n"
+           "{'request_id': 'r', 'actions': [{'target_table': 't', 'action': 'update', 'reason': 'it\\'s ok'}]}")
+    plan = parse_model_json(raw, "plan", repair=None)
+    assert plan["actions"][0]["reason"] == "it's ok"
+
+
+def test_unusable_output_raises():
+    with pytest.raises(ModelJsonError):
+        parse_model_json("no object here", "plan", repair=None)
@@ -0,0 +1,236 @@
+"""
+LLM scheduler (utils/llm_scheduler): status detection, token buckets,
+priority admission (blocking and async) and the retry / Retry-After
+backoff of LLMScheduler.call, with fake model functions instead of a
+server (benchmarks/sim_llm_quota.py runs the same against a fake HTTP
+endpoint).
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import llm_scheduler  # noqa: E402
+from utils.llm_scheduler import (  # noqa: E402
+    LLMScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE, TokenBucket, counting_calls, is_retryable, priority,
+    status_of,
+)
+
+MODEL = "fake-model"
+
+
+class FakeApiError(Exception):
+    def __init__(self, message="", code=None, retry_after=None):
+        super().__init__(message)
+        if code is not None:
+            self.code = code
+        self.headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+
+
+def make_scheduler(concurrency=1, rpm=6000, **kwargs) -> LLMScheduler:
+    return LLMScheduler({MODEL: {"rpm": rpm, "tpm": 10_000_000, "concurrency": concurrency}},
+                        backoff_base_s=0.01, backoff_max_s=0.05, **kwargs)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+# --- status detection -------------------------------------------------
+
+@pytest.mark.parametrize("error, status", [
+    (FakeApiError("quota", code=429), 429),
+    (FakeApiError("unavailable", code=HTTPStatus.SERVICE_UNAVAILABLE), 503),
+    (FakeApiError("Quota exceeded: RESOURCE_EXHAUSTED"), 429),
+    (FakeApiError("upstream answered HTTP 503"), 503),
+    (FakeApiError("error code: 500, retry later"), 500),
+    (FakeApiError("request 4291 failed"), None),
+    (FakeApiError("expected 429 rows, found 12"), None),
+    (FakeApiError("use case 429 not found"), None),
+])
+def test_status_of(error, status):
+    assert status_of(error) == status
+
+
+def test_only_rate_limits_and_server_errors_are_retried():
+    assert is_retryable(FakeApiError(code=429))
+    assert is_retryable(FakeApiError(code=502))
+    assert not is_retryable(FakeApiError(code=400))
+    assert not is_retryable(ValueError("bad plan for tariff 429"))
+
+
+# --- limits -----------------------------------------------------------
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)  # one unit per second
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    assert 0.9 < bucket.wait_time(1) <= 1.0
+    # more than the capacity only waits for a full bucket
+    assert bucket.wait_time(1000) <= 60
+
+
+def test_concurrency_limit_blocks_until_release():
+    scheduler = make_scheduler(concurrency=1)
+    first = scheduler.acquire(MODEL)
+    admitted = threading.Event()
+
+    def second():
+        scheduler.release(scheduler.acquire(MODEL))
+        admitted.set()
+
+    threading.Thread(target=second, daemon=True).start()
+    assert not admitted.wait(0.2)
+    scheduler.release(first)
+    assert admitted.wait(5)
+
+
+def test_interactive_calls_are_admitted_before_batch_calls():
+    scheduler = make_scheduler(concurrency=1)
+    limiter = scheduler.limiter(MODEL)
+    held = scheduler.acquire(MODEL)
+    order = []
+
+    def call(name, prio):
+        permit = scheduler.acquire(MODEL, prio=prio)
+        order.append(name)
+        scheduler.release(permit)
+
+    threads = []
+    for name, prio in (("batch-1", PRIORITY_BATCH), ("batch-2", PRIORITY_BATCH), ("interactive", PRIORITY_INTERACTIVE)):
+        threads.append(threading.Thread(target=call, args=(name, prio), daemon=True))
+        threads[-1].start()
+        wait_for(lambda: len(limiter.waiters) == len(threads))
+
+    scheduler.release(held)
+    for thread in threads:
+        thread.join(5)
+    assert order == ["interactive", "batch-1", "batch-2"]
+
+
+def test_priority_and_counters_come_from_the_context():
+    scheduler = make_scheduler(concurrency=2)
+    with counting_calls() as outer, priority(PRIORITY_BATCH), counting_calls() as inner:
+        scheduler.release(scheduler.acquire(MODEL))
+    scheduler.release(scheduler.acquire(MODEL))
+    assert outer["calls"] == inner["calls"] == 1
+    assert scheduler.stats()[MODEL]["calls"] == 2
+
+
+# --- async admission --------------------------------------------------
+
+def test_async_waiters_follow_priority_without_worker_threads():
+    scheduler = make_scheduler(concurrency=1)
+    limiter = scheduler.limiter(MODEL)
+
+    async def scenario():
+        # a small default executor: waiters holding its threads would starve to_thread calls
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        held = scheduler.acquire(MODEL)
+        order = []
+
+        async def call(name, prio):
+            permit = await scheduler.acquire_async(MODEL, prio=prio)
+            order.append(name)
+            scheduler.release(permit)
+
+        tasks = [asyncio.create_task(call(f"batch-{i}", PRIORITY_BATCH)) for i in range(20)]
+        await asyncio.sleep(0.05)
+        tasks.append(asyncio.create_task(call("interactive", PRIORITY_INTERACTIVE)))
+        await asyncio.sleep(0.05)
+        assert len(limiter.waiters) == 21
+
+        # the executor is still free while 21 calls wait
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: "db"), timeout=1) == "db"
+
+        # released from another thread, as a blocking caller would
+        await asyncio.to_thread(scheduler.release, held)
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=5)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order[0] == "interactive"
+    assert order[1:] == [f"batch-{i}" for i in range(20)]
+    assert limiter.waiters == [] and limiter.async_waiters == set()
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    scheduler = make_scheduler(concurrency=1)
+    limiter = scheduler.limiter(MODEL)
+
+    async def scenario():
+        held = scheduler.acquire(MODEL)
+        waiter = asyncio.create_task(scheduler.acquire_async(MODEL))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release(held)
+
+    asyncio.run(scenario())
+    assert limiter.waiters == [] and limiter.in_flight == 0
+
+
+# --- retry / backoff --------------------------------------------------
+
+def test_retry_after_is_honoured(monkeypatch):
+    scheduler = make_scheduler(concurrency=4)
+    sleeps = []
+    monkeypatch.setattr(llm_scheduler.time, "sleep", sleeps.append)
+    answers = [FakeApiError("quota", code=429, retry_after=1.5), "ok"]
+
+    def model_call():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    assert scheduler.call(MODEL, model_call) == "ok"
+    assert sleeps == [1.5]
+    stats = scheduler.stats()[MODEL]
+    assert (stats["calls"], stats["retries"], stats["throttled"]) == (2, 1, 1)
+    # multiplicative decrease on 429, then additive increase on the success
+    assert stats["concurrency_limit"] == 2.5
+
+
+def test_backoff_without_retry_after_is_capped_jitter():
+    scheduler = make_scheduler()
+    delays = [scheduler.backoff(attempt, FakeApiError(code=503)) for attempt in range(10) for _ in range(20)]
+    assert all(0 <= d <= scheduler.backoff_max_s for d in delays)
+
+
+def test_server_errors_are_retried_up_to_max_retries(monkeypatch):
+    scheduler = make_scheduler(max_retries=2)
+    monkeypatch.setattr(llm_scheduler.time, "sleep", lambda s: None)
+    calls = []
+
+    def model_call():
+        calls.append(1)
+        raise FakeApiError("unavailable", code=503)
+
+    with pytest.raises(FakeApiError):
+        scheduler.call(MODEL, model_call)
+    assert len(calls) == 3
+    assert scheduler.stats()[MODEL]["errors"] == 3
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    scheduler = make_scheduler()
+    monkeypatch.setattr(llm_scheduler.time, "sleep", lambda s: pytest.fail("should not back off"))
+
+    def model_call():
+        raise FakeApiError("bad request", code=400)
+
+    with pytest.raises(FakeApiError):
+        scheduler.call(MODEL, model_call)
+    assert scheduler.limiter(MODEL).in_flight == 0
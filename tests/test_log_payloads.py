@@ -0,0 +1,43 @@
+"""
+Content-addressed log payloads (utils/logging_utils): a record keeps every
+blob it references, and a process re-sends a blob it stored itself only
+once LOG_PAYLOAD_KNOWN_TTL_S has passed (vacuum-payloads ages blobs by
+their last insert).
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import logging_utils  # noqa: E402
+from utils.logging_utils import PAYLOAD_REF_KEY, externalize_payloads  # noqa: E402
+
+LARGE = "x" * logging_utils.LOG_PAYLOAD_MIN_BYTES
+
+
+def test_records_keep_every_referenced_blob(monkeypatch):
+    monkeypatch.setattr(logging_utils, "_known_payloads", {})
+    blobs = {}
+    row = externalize_payloads({"ctx": LARGE, "small": 1}, blobs)
+    payload_hash = row["ctx"][PAYLOAD_REF_KEY]
+    logging_utils._remember_payloads(blobs, logging_utils.time.monotonic())
+
+    # already stored by this process: still part of the next record (spool)
+    again = {}
+    externalize_payloads({"ctx": LARGE}, again)
+    assert list(again) == [payload_hash] and row["small"] == 1
+
+
+def test_known_blobs_are_sent_again_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logging_utils, "_known_payloads", {})
+    monkeypatch.setattr(logging_utils, "LOG_PAYLOAD_KNOWN_TTL_S", 60)
+    monkeypatch.setattr(logging_utils.time, "monotonic", lambda: now[0])
+    blobs = {"a": '"a"', "b": '"b"'}
+
+    assert logging_utils._blobs_to_send(blobs) == blobs
+    logging_utils._remember_payloads({"a": '"a"'}, now[0])
+    assert logging_utils._blobs_to_send(blobs) == {"b": '"b"'}
+
+    now[0] += 60
+    assert logging_utils._blobs_to_send(blobs) == blobs
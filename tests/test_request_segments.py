@@ -0,0 +1,65 @@
+"""
+Merging of segment plans (request_segments.merge_plans): primary keys
+picked by two segments are renumbered, together with the later actions of
+the segment that use them; ambiguous references refuse the merge.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from request_segments import SegmentMergeError, merge_plans  # noqa: E402
+
+TARIFF = "public.fee_tariff"
+RATES = "public.fee_rates"
+
+
+def segments(count):
+    return [{"index": i, "text": f"item {i}"} for i in range(1, count + 1)]
+
+
+def insert(table, fields):
+    return {"target_table": table, "action": "insert", "pk_key": "id", "keys": {}, "fields": fields}
+
+
+def update(table, keys, fields):
+    return {"target_table": table, "action": "update", "pk_key": "id", "keys": keys, "fields": fields}
+
+
+def test_renumbered_insert_takes_its_later_updates_along():
+    first = {"actions": [insert(TARIFF, {"id": 900, "code": "A"})]}
+    second = {"actions": [
+        insert(TARIFF, {"id": 900, "code": "B"}),
+        update(TARIFF, {"id": "900"}, {"amount": "2.00"}),
+        update(TARIFF, {"id": 12}, {"amount": "3.00"}),
+    ]}
+    plan = merge_plans("R-1", "two tariffs", segments(2), [first, second])
+
+    actions = plan["actions"]
+    assert [a["fields"].get("id") for a in actions[:2]] == [900, 901]
+    assert actions[2]["keys"] == {"id": 901} and actions[3]["keys"] == {"id": 12}
+    assert plan["renumbered"] == [{
+        "segment": 2, "table": TARIFF, "pk_key": "id", "from": 900, "to": 901,
+        "references": [{"action": 1, "in": "keys", "column": "id"}],
+    }]
+    # the segment plans themselves are left as they were
+    assert second["actions"][1]["keys"] == {"id": "900"}
+
+
+def test_possible_foreign_key_refuses_the_merge():
+    first = {"actions": [insert(TARIFF, {"id": 900, "code": "A"})]}
+    second = {"actions": [
+        insert(TARIFF, {"id": 900, "code": "B"}),
+        insert(RATES, {"id": 5, "tariff_id": 900, "rate": "1.5"}),
+    ]}
+    with pytest.raises(SegmentMergeError, match="public.fee_rates.tariff_id = 900"):
+        merge_plans("R-2", None, segments(2), [first, second])
+
+
+def test_distinct_ids_are_kept():
+    plans = [{"actions": [insert(TARIFF, {"id": 900})]}, {"actions": [insert(TARIFF, {"id": 901})]}]
+    plan = merge_plans("R-3", None, segments(2), plans)
+    assert "renumbered" not in plan
+    assert [a["segment"] for a in plan["actions"]] == [1, 2]
@@ -0,0 +1,67 @@
+"""
+Script bundles (script_bundle.write_bundle): dependency order, and plans
+rejected at render time left out together with the requests depending
+on them. Column metadata comes from the golden tests' fixed catalog.
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import gen_dml_script_file  # noqa: E402
+from script_bundle import write_bundle  # noqa: E402
+from test_gen_dml_script_file import COLUMNS, TARIFF  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fixed_catalog(monkeypatch):
+    def load(tables):
+        return {t: COLUMNS[t] for t in tables if t in COLUMNS}
+
+    monkeypatch.setattr(gen_dml_script_file, "load_table_metadata", load)
+    monkeypatch.setattr(gen_dml_script_file, "invalidate_table_metadata", lambda tables: None)
+
+
+def plan(request_id, action, keys=None, fields=None):
+    return {"request_id": request_id, "actions": [
+        {"target_table": TARIFF, "action": action, "keys": keys or {}, "fields": fields or {}, "reason": request_id},
+    ]}
+
+
+def build(tmp_path, plans):
+    by_id = {p["request_id"]: p for p in plans}
+    info = write_bundle(list(by_id), by_id.get, str(tmp_path / "bundle.sql"))
+    manifest = json.loads(Path(info["manifest_path"]).read_text(encoding="utf-8"))
+    return manifest, Path(info["path"]).read_text(encoding="utf-8")
+
+
+def test_dependent_request_follows_the_insert(tmp_path):
+    manifest, sql = build(tmp_path, [
+        plan("R-2", "update", keys={"id": 900}, fields={"amount": "2.00"}),
+        plan("R-1", "insert", fields={"id": 900, "code": "N", "amount": "1.00"}),
+    ])
+    assert [e["request_id"] for e in manifest["requests"]] == ["R-1", "R-2"]
+    assert manifest["requests"][1]["depends_on"] == ["R-1"]
+    assert manifest["skipped"] == []
+    assert sql.index("request R-1") < sql.index("request R-2")
+
+
+def test_dependents_of_a_rejected_plan_are_left_out(tmp_path):
+    manifest, sql = build(tmp_path, [
+        # rejected: no such column
+        plan("R-1", "insert", fields={"id": 900, "code": "N", "colour": "red"}),
+        plan("R-2", "update", keys={"id": 900}, fields={"amount": "2.00"}),
+        plan("R-3", "update", keys={"id": 900}, fields={"amount": "3.00"}),
+        plan("R-4", "update", keys={"id": 1}, fields={"amount": "4.00"}),
+    ])
+    assert [e["request_id"] for e in manifest["requests"]] == ["R-4"]
+    skipped = {s["request_id"]: s["reason"] for s in manifest["skipped"]}
+    assert "unknown column public.fee_tariff.colour" in skipped["R-1"]
+    assert skipped["R-2"] == "depends on rejected request(s) R-1"
+    # R-3 depends on R-2 (same row), which was left out in turn
+    assert "R-2" in skipped["R-3"]
+    assert "request R-2" not in sql and "request R-3" not in sql
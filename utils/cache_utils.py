@@ -0,0 +1,147 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.config import CACHE_FLUSH_EVERY
+
+
+class TTLCache:
+    """
+    Small LRU cache with a per-entry time-to-live.
+
+    - get() drops expired entries and marks hits as most recently used
+    - set() evicts the least recently used entry above max_entries
+    - with `path`, entries are loaded at start and written back (atomic
+      rename) every `flush_every` changes and at exit, so CLI runs share
+      the cache; values must then be JSON-serializable. A flush re-reads
+      the file and applies only this process's changes to it, so
+      processes sharing the file keep each other's entries
+    """
+
+    def __init__(self, max_entries: int, ttl_s: float, path: Optional[str] = None,
+                 flush_every: int = CACHE_FLUSH_EVERY):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.path = Path(path) if path else None
+        self.flush_every = max(1, flush_every)
+        self._data: "OrderedDict[str, dict]" = OrderedDict()
+        # changes not written yet: key -> entry, None for a removed key
+        self._dirty: Dict[str, Optional[dict]] = {}
+        self._cleared = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "flushes": 0}
+        if self.path is not None:
+            with self._lock:
+                self._merge_into_memory(self._read_file())
+            atexit.register(self.flush)
+
+    def _read_file(self) -> Dict[str, dict]:
+        """Unexpired entries of the cache file, oldest first."""
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as error:
+            print(f" TTLCache : ignoring unreadable cache file {self.path}: {error}")
+            return {}
+        now = time.time()
+        return {key: entry for key, entry in entries.items() if entry.get("expires_at", 0) > now}
+
+    def _merge_into_memory(self, entries: Dict[str, dict]) -> None:
+        """Entries of the file this process does not hold, as the least recently used ones."""
+        for key, entry in reversed(list(entries.items())):
+            if key not in self._data and key not in self._dirty:
+                self._data[key] = entry
+                self._data.move_to_end(key, last=False)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _changed(self, key: str, entry: Optional[dict]) -> bool:
+        """Record a change; True when enough are pending for a flush."""
+        if self.path is None:
+            return False
+        self._dirty[key] = entry
+        return len(self._dirty) >= self.flush_every
+
+    def flush(self) -> None:
+        """Write the pending changes to the file (no-op without path or changes)."""
+        if self.path is None:
+            return
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty and not self._cleared:
+                    return
+                dirty, cleared = self._dirty, self._cleared
+                self._dirty, self._cleared = {}, False
+
+            entries = {} if cleared else self._read_file()
+            for key, entry in dirty.items():
+                entries.pop(key, None)
+                if entry is not None:
+                    entries[key] = entry
+            entries = dict(list(entries.items())[-self.max_entries:])
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f"{self.path.suffix}.{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.path)
+
+            with self._lock:
+                self._merge_into_memory(entries)
+                self.stats["flushes"] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry["expires_at"] <= time.time():
+                # not written back: expired entries are dropped when the file is read
+                del self._data[key]
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry["value"]
+
+    def set(self, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        with self._lock:
+            entry = {
+                "value": value,
+                "expires_at": time.time() + (self.ttl_s if ttl_s is None else ttl_s),
+            }
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+            due = self._changed(key, entry)
+        if due:
+            self.flush()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            # recorded even when not held here: another process may have written it
+            due = self._changed(key, None)
+        if due:
+            self.flush()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._dirty.clear()
+            self._cleared = True
+        self.flush()
+
+    def __len__(self) -> int:
+        return len(self._data)
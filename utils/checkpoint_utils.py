@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.config import CHECKPOINT_DIR
+
+# Order matters: forcing a stage also forces every stage after it.
+STAGES = ["normalized", "context_bundle", "sql_probe", "plan", "script"]
+
+
+# ----------------------------------------------------------------------
+# Hashing helpers
+# ----------------------------------------------------------------------
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+
+def hash_json(obj: Any) -> str:
+    """Stable hash of a JSON-like structure (key order independent)."""
+    return hash_text(json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str))
+
+
+def hash_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def stages_from(stage: Optional[str]) -> List[str]:
+    """Return `stage` and every stage after it (empty list for None)."""
+    if stage is None:
+        return []
+    if stage not in STAGES:
+        raise ValueError(f"Unknown stage '{stage}', expected one of {STAGES}")
+    return STAGES[STAGES.index(stage):]
+
+
+# ----------------------------------------------------------------------
+# Checkpoint files: <CHECKPOINT_DIR>/<request_id>/<stage>.json
+# ----------------------------------------------------------------------
+
+def checkpoint_path(request_id: str, stage: str, base_dir: str = CHECKPOINT_DIR) -> Path:
+    return Path(base_dir) / str(request_id) / f"{stage}.json"
+
+
+def save_checkpoint(request_id: str, stage: str, payload: Any, fingerprint: str,
+                    base_dir: str = CHECKPOINT_DIR) -> Path:
+    """
+    Persist one stage output. The file is written to a temp name and renamed,
+    so a crash never leaves a half-written checkpoint behind.
+    """
+    path = checkpoint_path(request_id, stage, base_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    record = {
+        "request_id": str(request_id),
+        "stage": stage,
+        "fingerprint": fingerprint,
+        "saved_at": datetime.now(timezone.utc).isoformat(),
+        "payload": payload,
+    }
+
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_checkpoint(request_id: str, stage: str, fingerprint: str,
+                    base_dir: str = CHECKPOINT_DIR) -> Optional[Dict[str, Any]]:
+    """
+    Return {"payload": ...} for a valid checkpoint, or None when it is missing
+    or stale (written for another input / catalog / prompt version).
+    """
+    path = checkpoint_path(request_id, stage, base_dir)
+    if not path.exists():
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError) as error:
+        print(f" load_checkpoint : unreadable checkpoint {path}: {error}")
+        return None
+
+    if record.get("fingerprint") != fingerprint:
+        print(f" load_checkpoint : stale checkpoint for stage '{stage}' (request {request_id}), recomputing")
+        return None
+
+    return {"payload": record.get("payload")}
+
+
+def build_stage_fingerprints(input_hash: str, catalog_version: str, prompts: Dict[str, str],
+                             models: Dict[str, str]) -> Dict[str, str]:
+    """
+    One fingerprint per stage. Each fingerprint chains the previous one, so a
+    change in the input, the catalog or an upstream prompt also invalidates
+    every downstream checkpoint.
+
+    prompts: {"normalizer": ..., "sql_discovery": ..., "dml_planner": ...}
+    models : {"llm": ..., "embedding": ...}
+    """
+    fingerprints = {}
+    previous = input_hash
+
+    stage_inputs = {
+        "normalized":     [prompts.get("normalizer", ""), models.get("llm", "")],
+        "context_bundle": [catalog_version, models.get("embedding", "")],
+        "sql_probe":      [prompts.get("sql_discovery", ""), models.get("llm", "")],
+        "plan":           [prompts.get("dml_planner", ""), models.get("llm", "")],
+        "script":         [],
+    }
+
+    for stage in STAGES:
+        previous = hash_json([stage, previous, [hash_text(x) for x in stage_inputs[stage]]])
+        fingerprints[stage] = previous
+
+    return fingerprints
@@ -2,6 +2,7 @@
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timezone
+from pathlib import Path
 
 
 
@@ -13,6 +14,8 @@ def get_local_timestamp_string() -> str:
     # format as yyyymmddhhmmss
     return local_dt.strftime("%Y%m%d%H%M%S")
 
+# The only place .env is read: every module (pipeline, agents, catalog loaders,
+# benchmarks) takes its settings from the constants below
 load_dotenv()
 
 #APP_NAME = "db_setup_automation_project"
@@ -27,12 +30,150 @@ PG_CONN = {
     "password": os.getenv("PGPASSWORD","db_password"),
 }
 
+# Shared connection pools (utils/db_utils.py)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
 
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
 DEFAULT_LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash-lite")
 
+# LLM scheduler (utils/llm_scheduler.py): defaults apply to models without an entry
+# in LLM_MODEL_LIMITS, format "model=rpm/tpm[/concurrency];model2=..."
+LLM_DEFAULT_RPM = float(os.getenv("LLM_DEFAULT_RPM", "15"))
+LLM_DEFAULT_TPM = float(os.getenv("LLM_DEFAULT_TPM", "250000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MODEL_LIMITS = os.getenv("LLM_MODEL_LIMITS", "text-embedding-004=1500/1000000/8")
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE_S = float(os.getenv("LLM_BACKOFF_BASE_S", "1.0"))
+LLM_BACKOFF_MAX_S = float(os.getenv("LLM_BACKOFF_MAX_S", "60.0"))
+
+# Model outputs that stay unusable after local JSON repair (utils/json_extract.py)
+# get this many targeted repair calls (0 = none)
+LLM_JSON_REPAIR_CALLS = int(os.getenv("LLM_JSON_REPAIR_CALLS", "1"))
+
 USER_ID = "pipeline_user"
 SESSION_ID = "pipeline_session_{}".format(get_local_timestamp_string())
 
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# Requests of a batch_pipeline run processed at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Stage outputs of main_pipeline (normalized, context_bundle, sql_probe, plan, script)
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", str(PROJECT_DIR / "data_files" / "checkpoints"))
+
+# File-backed caches (utils/cache_utils.TTLCache): changes are written back every
+# CACHE_FLUSH_EVERY changes and at exit, merged with the entries of other processes
+CACHE_FLUSH_EVERY = int(os.getenv("CACHE_FLUSH_EVERY", "50"))
+
+# Planner memoization (get_dml_info_agent.py); empty PLAN_CACHE_FILE = in-process only
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "1000"))
+PLAN_CACHE_TTL_S = float(os.getenv("PLAN_CACHE_TTL_S", "86400"))
+PLAN_CACHE_FILE = os.getenv("PLAN_CACHE_FILE", str(PROJECT_DIR / "data_files" / "cache" / "plan_cache.json"))
+
+# Streaming of ADK events to logs.agent_llm_logs (utils/logging_utils.AgentEventStream)
+AGENT_LOG_FLUSH_EVERY = int(os.getenv("AGENT_LOG_FLUSH_EVERY", "20"))
+AGENT_EVENT_WINDOW = int(os.getenv("AGENT_EVENT_WINDOW", "50"))
+
+# Log values at least this large are stored once in logs.log_payloads
+LOG_PAYLOAD_MIN_BYTES = int(os.getenv("LOG_PAYLOAD_MIN_BYTES", "1024"))
+
+# A process re-sends (and so re-stamps) a payload blob it already stored once
+# this many seconds have passed; must stay below the minimum age of
+# `log_maintenance.py vacuum-payloads` (24 hours by default)
+LOG_PAYLOAD_KNOWN_TTL_S = float(os.getenv("LOG_PAYLOAD_KNOWN_TTL_S", "3600"))
+
+# Log table partitioning (log_maintenance.py): "month" or "day" partitions,
+# how many future partitions to keep ready, how many past ones to retain
+LOG_PARTITION_INTERVAL = os.getenv("LOG_PARTITION_INTERVAL", "month")
+LOG_PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", "2"))
+LOG_RETENTION_PERIODS = int(os.getenv("LOG_RETENTION_PERIODS", "6"))
+
+# Local log spool (utils/log_spool.py): used while the log database is slow
+# or down, replayed with `python log_maintenance.py replay-spool`
+LOG_SPOOL_DIR = os.getenv("LOG_SPOOL_DIR", str(PROJECT_DIR / "data_files" / "log_spool"))
+LOG_SPOOL_FSYNC_EVERY = int(os.getenv("LOG_SPOOL_FSYNC_EVERY", "20"))
+LOG_SPOOL_FSYNC_INTERVAL_S = float(os.getenv("LOG_SPOOL_FSYNC_INTERVAL_S", "1.0"))
+LOG_SPOOL_MAX_FILE_BYTES = int(os.getenv("LOG_SPOOL_MAX_FILE_BYTES", str(10 * 1024 * 1024)))
+LOG_SPOOL_MAX_TOTAL_BYTES = int(os.getenv("LOG_SPOOL_MAX_TOTAL_BYTES", str(200 * 1024 * 1024)))
+
+# Log inserts wait at most this long for a connection; after a failure the
+# database is skipped (records go to the spool) for LOG_DB_RETRY_S seconds,
+# doubling on repeated failures up to LOG_DB_RETRY_MAX_S
+LOG_DB_TIMEOUT_S = float(os.getenv("LOG_DB_TIMEOUT_S", "2.0"))
+LOG_DB_RETRY_S = float(os.getenv("LOG_DB_RETRY_S", "5.0"))
+LOG_DB_RETRY_MAX_S = float(os.getenv("LOG_DB_RETRY_MAX_S", "300.0"))
+
+# Pipeline log levels and sampling (utils/logging_utils.log_pipeline_event)
+#   LOG_LEVEL        : global minimum level (DEBUG, INFO, WARNING, ERROR)
+#   LOG_STAGE_LEVELS : per-stage overrides, "pattern=LEVEL;..." with shell-style
+#                      patterns, e.g. "run_adk_pipeline:*=DEBUG;agent_events:*=WARNING"
+#   LOG_SAMPLE_RATES : share of requests logged per stage, "pattern=rate;..."
+#                      e.g. "step1_normalize:*=0.1" (WARNING and above always kept)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_STAGE_LEVELS = os.getenv("LOG_STAGE_LEVELS", "")
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# DML script rendering (gen_dml_script_file.render_sql)
+#   DML_RENDER_MODE       : "per_action", "batched" or "auto"
+#   DML_BATCH_MIN_ACTIONS : "auto" switches to batched from this many actions
+#   DML_BATCH_MAX_ROWS    : rows per multi-row statement
+DML_RENDER_MODE = os.getenv("DML_RENDER_MODE", "auto")
+DML_BATCH_MIN_ACTIONS = int(os.getenv("DML_BATCH_MIN_ACTIONS", "20"))
+DML_BATCH_MAX_ROWS = int(os.getenv("DML_BATCH_MAX_ROWS", "1000"))
+
+# Column metadata of DML target tables (utils/table_metadata.py), cached per table
+TABLE_METADATA_TTL_S = float(os.getenv("TABLE_METADATA_TTL_S", "600"))
+TABLE_METADATA_MAX_TABLES = int(os.getenv("TABLE_METADATA_MAX_TABLES", "500"))
+
+# Dry runs of generated scripts (dry_run_script.py): always rolled back
+DRY_RUN_LOCK_TIMEOUT_MS = int(os.getenv("DRY_RUN_LOCK_TIMEOUT_MS", "5000"))
+DRY_RUN_STATEMENT_TIMEOUT_MS = int(os.getenv("DRY_RUN_STATEMENT_TIMEOUT_MS", "600000"))
+DRY_RUN_MAX_EXPLAINS = int(os.getenv("DRY_RUN_MAX_EXPLAINS", "50"))
+DRY_RUN_SLOW_MS = float(os.getenv("DRY_RUN_SLOW_MS", "1000"))
+DRY_RUN_LOCK_POLL_S = float(os.getenv("DRY_RUN_LOCK_POLL_S", "0.05"))
+
+# Index advisor (index_advisor.py): no index is proposed when a probe is
+# estimated to match more than this fraction of the table
+INDEX_ADVISOR_MAX_ROW_FRACTION = float(os.getenv("INDEX_ADVISOR_MAX_ROW_FRACTION", "0.1"))
+
+# Context retrieval (get_info_use_case.py): use cases returned per request / segment
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "3"))
+# Multi-item requests (request_segments.py): more pieces than this are not split
+MAX_REQUEST_SEGMENTS = int(os.getenv("MAX_REQUEST_SEGMENTS", "8"))
+
+# Requests without a matching use case (review_queue.py): negative cache and the
+# human review queue they are routed to; empty NEGATIVE_CACHE_FILE = in-process only
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "5000"))
+NEGATIVE_CACHE_TTL_S = float(os.getenv("NEGATIVE_CACHE_TTL_S", "604800"))
+NEGATIVE_CACHE_FILE = os.getenv("NEGATIVE_CACHE_FILE", str(PROJECT_DIR / "data_files" / "cache" / "negative_cache.json"))
+REVIEW_QUEUE_FILE = os.getenv("REVIEW_QUEUE_FILE", str(PROJECT_DIR / "data_files" / "review_queue.jsonl"))
+
+# Use case retrieval (get_info_use_case.py): vector, lexical or hybrid scoring.
+# hybrid score = (1 - HYBRID_LEXICAL_WEIGHT) * vector + HYBRID_LEXICAL_WEIGHT * lexical;
+# with LEXICAL_FAST_PATH an unambiguous lexical match (score and margin over the
+# runner-up) is answered without the embedding call
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.5"))
+LEXICAL_MIN_SCORE = float(os.getenv("LEXICAL_MIN_SCORE", "0.3"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.3"))
+LEXICAL_FAST_PATH = os.getenv("LEXICAL_FAST_PATH", "1") == "1"
+LEXICAL_FAST_PATH_MIN_SCORE = float(os.getenv("LEXICAL_FAST_PATH_MIN_SCORE", "0.6"))
+LEXICAL_FAST_PATH_MARGIN = float(os.getenv("LEXICAL_FAST_PATH_MARGIN", "0.25"))
+# 0 = exact: every use case is scored; n > 0 = only the n nearest through the
+# embedding index (ivfflat / hnsw) plus the lexical matches
+RETRIEVAL_ANN_CANDIDATES = int(os.getenv("RETRIEVAL_ANN_CANDIDATES", "0"))
+# ANN candidates searched on the first RETRIEVAL_ANN_DIM dimensions as halfvec
+# (0 = full embedding); needs the matching index, see embedding_index.py
+RETRIEVAL_ANN_DIM = int(os.getenv("RETRIEVAL_ANN_DIM", "0"))
+# Locale routing (get_info_use_case.route_locale): a request detected as RO / EN
+# with at least LOCALE_MIN_CONFIDENCE is searched among the use cases of its
+# locale (+ 'mixed'); global search when that partition has no match
+LOCALE_ROUTING = os.getenv("LOCALE_ROUTING", "1") == "1"
+LOCALE_MIN_CONFIDENCE = float(os.getenv("LOCALE_MIN_CONFIDENCE", "0.75"))
+# Context bundles read from setup.catalog_bundles (rebuilt by triggers on any
+# catalog change, see init_setup.sql) instead of built on every request
+MATERIALIZED_BUNDLES = os.getenv("MATERIALIZED_BUNDLES", "1") == "1"
@@ -0,0 +1,173 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, List, Optional, Sequence, Tuple
+
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from utils.config import PG_CONN, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+
+# ----------------------------------------------------------------------
+# Shared Postgres access layer.
+#
+# Async API (pipeline, ADK tools, logging inside the event loop):
+#     fetch_one / fetch_all / execute
+# Sync API (catalog loaders, CLI tools, code running outside a loop):
+#     fetch_one_sync / fetch_all_sync / execute_sync
+#
+# Both sides use a connection pool, so a request never pays for a new
+# connection per query. An async pool belongs to the event loop that opened
+# it; a new loop (e.g. a second asyncio.run) gets a fresh pool.
+# ----------------------------------------------------------------------
+
+_async_pool: Optional[AsyncConnectionPool] = None
+_async_pool_loop = None
+_async_pool_lock: Optional[asyncio.Lock] = None
+
+_sync_pool: Optional[ConnectionPool] = None
+
+
+def get_conninfo() -> str:
+    return make_conninfo(**PG_CONN)
+
+
+# --- Async pool -------------------------------------------------------
+
+async def get_async_pool() -> AsyncConnectionPool:
+    global _async_pool, _async_pool_loop, _async_pool_lock
+
+    loop = asyncio.get_running_loop()
+    if _async_pool is not None and _async_pool_loop is loop:
+        return _async_pool
+
+    if _async_pool_lock is None or _async_pool_loop is not loop:
+        _async_pool_lock = asyncio.Lock()
+        _async_pool_loop = loop
+        _async_pool = None
+
+    async with _async_pool_lock:
+        if _async_pool is None:
+            pool = AsyncConnectionPool(
+                get_conninfo(),
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                open=False,
+            )
+            await pool.open()
+            _async_pool = pool
+    return _async_pool
+
+
+async def close_async_pool() -> None:
+    global _async_pool, _async_pool_loop, _async_pool_lock
+    if _async_pool is not None:
+        await _async_pool.close()
+    _async_pool = None
+    _async_pool_loop = None
+    _async_pool_lock = None
+
+
+@asynccontextmanager
+async def async_connection(timeout: Optional[float] = None):
+    """`timeout`: max seconds to wait for a pooled connection (pool default if None)."""
+    pool = await get_async_pool()
+    async with pool.connection(timeout=timeout) as conn:
+        yield conn
+
+
+async def fetch_one(sql: str, params: Optional[Sequence[Any]] = None) -> Optional[tuple]:
+    async with async_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchone()
+
+
+async def fetch_all(sql: str, params: Optional[Sequence[Any]] = None,
+                    as_dict: bool = False) -> List[Any]:
+    async with async_connection() as conn:
+        async with conn.cursor(row_factory=dict_row if as_dict else None) as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+
+async def execute(sql: str, params: Optional[Sequence[Any]] = None) -> int:
+    """Run a write statement in its own transaction and return the rowcount."""
+    async with async_connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return cur.rowcount
+
+
+async def execute_batch(statements: List[Tuple[str, Optional[Sequence[Any]]]],
+                        timeout: Optional[float] = None) -> None:
+    """Run several statements in one transaction on one pooled connection."""
+    async with async_connection(timeout) as conn:
+        async with conn.cursor() as cur:
+            for sql, params in statements:
+                await cur.execute(sql, params)
+
+
+# --- Sync pool (kept for catalog loaders and scripts) -----------------
+
+def get_pool() -> ConnectionPool:
+    global _sync_pool
+    if _sync_pool is None:
+        _sync_pool = ConnectionPool(
+            get_conninfo(),
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            open=True,
+        )
+    return _sync_pool
+
+
+def close_pool() -> None:
+    global _sync_pool
+    if _sync_pool is not None:
+        _sync_pool.close()
+    _sync_pool = None
+
+
+@contextmanager
+def connection(timeout: Optional[float] = None):
+    with get_pool().connection(timeout=timeout) as conn:
+        yield conn
+
+
+def fetch_one_sync(sql: str, params: Optional[Sequence[Any]] = None) -> Optional[tuple]:
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchone()
+
+
+def fetch_all_sync(sql: str, params: Optional[Sequence[Any]] = None,
+                   as_dict: bool = False) -> List[Any]:
+    with connection() as conn:
+        with conn.cursor(row_factory=dict_row if as_dict else None) as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+
+
+def execute_sync(sql: str, params: Optional[Sequence[Any]] = None) -> int:
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.rowcount
+
+
+def execute_batch_sync(statements: List[Tuple[str, Optional[Sequence[Any]]]],
+                       timeout: Optional[float] = None) -> None:
+    with connection(timeout) as conn:
+        with conn.cursor() as cur:
+            for sql, params in statements:
+                cur.execute(sql, params)
+
+
+def in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
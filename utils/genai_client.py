@@ -0,0 +1,29 @@
+from functools import lru_cache
+
+from utils.config import GOOGLE_API_KEY
+
+# ----------------------------------------------------------------------
+# Gemini SDK (google.generativeai), imported and configured on first use,
+# once per process.
+#
+# Importing the SDK is one of the most expensive steps of a CLI start; short
+# invocations (--help, a request answered from a checkpoint or the review
+# cache) never need it. Model clients are cached as well: the normalizer and
+# the JSON repair call reuse one GenerativeModel per (model, instruction).
+# ----------------------------------------------------------------------
+
+
+@lru_cache(maxsize=1)
+def get_genai():
+    import google.generativeai as genai
+
+    genai.configure(api_key=GOOGLE_API_KEY)
+    return genai
+
+
+@lru_cache(maxsize=8)
+def get_generative_model(model_name: str, system_instruction: str = None):
+    genai = get_genai()
+    if system_instruction is None:
+        return genai.GenerativeModel(model_name=model_name)
+    return genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
@@ -1,9 +1,11 @@
 
 
-def clean_model_json(raw: str) -> str:
+def clean_model_json(raw: str, fix_escapes: bool = True) -> str:
     """
     Take the raw model output and return a clean JSON string:
-   
+    code fences removed and (fix_escapes) \' turned into '. The
+    replacement assumes double-quoted strings; json_extract.repair_json
+    handles \' per quote and gets the text without it.
     """
     text = raw.strip()
 
@@ -29,9 +31,39 @@ def clean_model_json(raw: str) -> str:
         text = text[3:-3].strip()
 
     # Fix invalid \' escapes (not valid in JSON, we want plain single quote)
-    text = text.replace("\\'", "'")
+    if fix_escapes:
+        text = text.replace("\\'", "'")
 
     return text
 
 
+# ----------------------------------------------------------------------
+# Step generators
+#
+# Logic that has a sync and an async entry point is written once, as a
+# generator that yields each I/O request it needs and receives the result:
+#     rows = yield ("fetch_all", sql, params)
+# and returns its result. The entry points only run the I/O:
+#     run_steps(steps, io) / await run_steps_async(steps, io_async)
+# ----------------------------------------------------------------------
 
+def run_steps(steps, io):
+    """Drive a step generator; io(request) answers each request. -> its return value."""
+    result = None
+    while True:
+        try:
+            request = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result = io(request)
+
+
+async def run_steps_async(steps, io):
+    """Same as run_steps with an async io."""
+    result = None
+    while True:
+        try:
+            request = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result = await io(request)
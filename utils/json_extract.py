@@ -0,0 +1,333 @@
+import asyncio
+import json
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.config import DEFAULT_LLM_MODEL, LLM_JSON_REPAIR_CALLS
+from utils.genai_client import get_generative_model
+from utils.helper_utils import clean_model_json
+from utils.llm_scheduler import get_scheduler, estimate_tokens, usage_tokens
+from utils.logging_utils import log_pipeline_event, WARNING
+
+# ----------------------------------------------------------------------
+# Tolerant parsing of the JSON objects returned by the models
+# (normalizer output, sql_probe, plan).
+#
+# Steps, cheapest first; the first result that matches the schema wins:
+#   direct     json.loads of the text without code fences
+#   extracted  first balanced {...} in the text (prose around it ignored)
+#   repaired   same, after local repair: smart quotes, \' escapes,
+#              single-quoted strings / keys, bare keys, trailing commas,
+#              raw newlines in strings, True / False / None
+#   repair_call one targeted model call (LLM_JSON_REPAIR_CALLS) with the
+#              text, the errors found and the expected shape; its answer
+#              goes through the local steps again, never through another call
+#
+# Each method is counted (json_extract_stats): "reruns_avoided" counts the
+# outputs that a plain json.loads would have rejected, i.e. a failed
+# request and a full re-run.
+# ----------------------------------------------------------------------
+
+pipeline_name = "json_extract"
+
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "″": '"',
+                              "‘": "'", "’": "'", "‚": "'", "′": "'"})
+LITERALS = {"True": "true", "False": "false", "None": "null", "true": "true", "false": "false", "null": "null"}
+PLAN_ACTIONS = ("insert", "update", "expire_and_insert")
+
+_stats = {"direct": 0, "extracted": 0, "repaired": 0, "repair_calls": 0, "repair_call_ok": 0, "failed": 0}
+
+
+class ModelJsonError(ValueError):
+    """Model output that could not be turned into a valid object."""
+
+    def __init__(self, message: str, text: str, errors: List[str]):
+        super().__init__(message)
+        self.text = text
+        self.errors = errors
+
+
+# --- Extraction -------------------------------------------------------
+
+class JsonObjectScanner:
+    """
+    Finds balanced top-level {...} objects in text fed chunk by chunk
+    (e.g. streamed model output). Strings in double or single quotes are
+    skipped, so braces inside them do not count.
+    """
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.depth = 0
+        self.quote: Optional[str] = None
+        self.escaped = False
+
+    def feed(self, chunk: str) -> Iterator[str]:
+        for ch in chunk:
+            if self.depth == 0:
+                if ch == "{":
+                    self.depth = 1
+                    self.buffer = [ch]
+                continue
+
+            self.buffer.append(ch)
+            if self.quote:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == self.quote:
+                    self.quote = None
+            elif ch in "\"'":
+                self.quote = ch
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    yield "".join(self.buffer)
+                    self.buffer = []
+
+
+def iter_json_objects(text: str) -> Iterator[str]:
+    """Candidate objects of `text`, in order of appearance."""
+    yield from JsonObjectScanner().feed(text)
+
+
+def repair_json(text: str) -> str:
+    """Fix the usual model mistakes in an almost-JSON object."""
+    text = text.translate(SMART_QUOTES)
+    out: List[str] = []
+    i, n = 0, len(text)
+
+    def next_char(k: int) -> str:
+        while k < n and text[k].isspace():
+            k += 1
+        return text[k] if k < n else ""
+
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            j, body = i + 1, []
+            while j < n and text[j] != ch:
+                if text[j] == "\\" and j + 1 < n:
+                    # \' is not a JSON escape: the quote is kept as is
+                    body.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                if text[j] == '"':  # inside a single-quoted string
+                    body.append('\\"')
+                elif text[j] == "\n":
+                    body.append("\\n")
+                elif text[j] != "\r":
+                    body.append(text[j])
+                j += 1
+            out.append('"' + "".join(body) + '"')
+            i = j + 1
+        elif ch == "," and next_char(i + 1) in ("}", "]"):
+            i += 1
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            if next_char(j) == ":":
+                out.append(f'"{word}"')
+            else:
+                out.append(LITERALS.get(word, word))
+            i = j
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+# --- Schemas ----------------------------------------------------------
+
+NoneType = type(None)
+
+# field -> (accepted types, required)
+SCHEMAS: Dict[str, Dict[str, Tuple[tuple, bool]]] = {
+    "normalize": {
+        "request_id": ((str, int), True),
+        "normalized": ((str,), True),
+        "params": ((list,), True),
+    },
+    "sql_probe": {
+        "request_id": ((str, int, NoneType), False),
+        "table": ((str, NoneType), False),
+        "selects": ((dict,), False),
+        "result": ((dict,), True),
+        "errors": ((list,), False),
+    },
+    "plan": {
+        "request_id": ((str, int, NoneType), False),
+        "subject": ((str, NoneType), False),
+        "actions": ((list,), True),
+    },
+}
+
+PROBE_RESULT = {
+    "table_name": ((str, NoneType), False),
+    "v_count_rows": ((int, float, str, NoneType), False),
+    "rows": ((list,), False),
+    "max_pk_plus_1": ((int, float, str, NoneType), False),
+}
+
+PLAN_ACTION = {
+    "target_table": ((str,), True),
+    "action": ((str,), True),
+    "keys": ((dict, NoneType), False),
+    "fields": ((dict, NoneType), False),
+    "reason": ((str, NoneType), False),
+}
+
+# shown to the model in a repair call
+SHAPES = {
+    "normalize": '{"request_id": "...", "normalized": "...", "params": [...]}',
+    "sql_probe": '{"request_id": "...", "table": "...", "selects": {"<name>": "<sql>"}, '
+                 '"result": {"table_name": "...", "v_count_rows": 0, "rows": [], "max_pk_plus_1": null}, '
+                 '"errors": []}',
+    "plan": '{"request_id": "...", "subject": "...", "actions": [{"target_table": "schema.table", '
+            '"action": "insert|update|expire_and_insert", "keys": {}, "fields": {}, "reason": "..."}]}',
+}
+
+
+def _check_fields(obj: Any, spec: Dict[str, Tuple[tuple, bool]], path: str, errors: List[str]) -> None:
+    if not isinstance(obj, dict):
+        errors.append(f"{path or 'output'} must be an object")
+        return
+    for field, (types_, required) in spec.items():
+        if field not in obj:
+            if required:
+                errors.append(f"{path}{field} is missing")
+        elif not isinstance(obj[field], types_):
+            errors.append(f"{path}{field} has type {type(obj[field]).__name__}")
+
+
+def validate_output(obj: Any, schema: str) -> List[str]:
+    """Schema errors of a parsed model output (empty list when valid)."""
+    errors: List[str] = []
+    _check_fields(obj, SCHEMAS[schema], "", errors)
+    if errors:
+        return errors
+    if schema == "sql_probe":
+        _check_fields(obj["result"], PROBE_RESULT, "result.", errors)
+    elif schema == "plan":
+        for i, act in enumerate(obj["actions"]):
+            _check_fields(act, PLAN_ACTION, f"actions[{i}].", errors)
+            if isinstance(act, dict) and isinstance(act.get("action"), str) \
+                    and act["action"].lower() not in PLAN_ACTIONS:
+                errors.append(f"actions[{i}].action '{act['action']}' is not one of {', '.join(PLAN_ACTIONS)}")
+    return errors
+
+
+# --- Parsing ----------------------------------------------------------
+
+def parse_locally(raw: Any, schema: str) -> Tuple[Optional[Any], str, List[str]]:
+    """
+    -> (object or None, method, errors). No model call.
+    An already parsed dict is only validated.
+    """
+    if isinstance(raw, dict):
+        errors = validate_output(raw, schema)
+        return (raw if not errors else None), "direct", errors
+
+    errors: List[str] = []
+    try:
+        obj = json.loads(clean_model_json(str(raw or "")))
+        errors = validate_output(obj, schema)
+        if not errors:
+            return obj, "direct", []
+    except ValueError as error:
+        errors = [f"not valid JSON: {error}"]
+
+    # \' escapes left in: in a single-quoted string they are the string's own quotes
+    text = clean_model_json(str(raw or ""), fix_escapes=False)
+    for method, transform in (("extracted", None), ("repaired", repair_json)):
+        for candidate in iter_json_objects(text if transform is None else text.translate(SMART_QUOTES)):
+            try:
+                obj = json.loads(transform(candidate) if transform else candidate)
+            except ValueError:
+                continue
+            found = validate_output(obj, schema)
+            if not found:
+                return obj, method, []
+            errors = found
+    return None, "failed", errors
+
+
+REPAIR_PROMPT = """The text below should be ONE JSON object ({schema} output) but it cannot be used:
+{errors}
+
+Expected shape:
+{shape}
+
+Return ONLY the corrected JSON object. Keep every value from the text, do not add data,
+no explanations, no code fences.
+
+TEXT:
+{text}
+"""
+
+
+def llm_repair(text: str, schema: str, errors: List[str]) -> str:
+    """One targeted repair call: the broken output, what is wrong and the expected shape."""
+    prompt = REPAIR_PROMPT.format(schema=schema, errors="\n".join(f"- {e}" for e in errors[:10]),
+                                  shape=SHAPES[schema], text=text)
+    model = get_generative_model(DEFAULT_LLM_MODEL)
+    response = get_scheduler().call(
+        DEFAULT_LLM_MODEL, model.generate_content, prompt,
+        est_tokens=2 * estimate_tokens(prompt), usage_fn=usage_tokens,
+    )
+    return (response.text or "").strip()
+
+
+def _finish(raw: Any, schema: str, obj: Any, method: str, errors: List[str], request_id: Any) -> Any:
+    if obj is None:
+        _stats["failed"] += 1
+        log_pipeline_event(
+            request_id=str(request_id), pipeline_name=pipeline_name, stage=f"model_json:{schema}:failed",
+            data=lambda: {"errors": errors, "text": str(raw)}, level=WARNING
+        )
+        raise ModelJsonError(f"Unusable {schema} output: {'; '.join(errors[:3])}", str(raw), errors)
+
+    _stats[method] += 1
+    if method != "direct":
+        log_pipeline_event(
+            request_id=str(request_id), pipeline_name=pipeline_name, stage=f"model_json:{schema}:{method}",
+            data=lambda: {"errors_before": errors, "stats": json_extract_stats()}
+        )
+    return obj
+
+
+def parse_model_json(raw: Any, schema: str, request_id: Any = "UNKNOWN",
+                     repair: Optional[Callable[[str, str, List[str]], str]] = llm_repair) -> Any:
+    """
+    Parse and validate a model output against SCHEMAS[schema]. Falls back to
+    one repair call (repair=None disables it). Raises ModelJsonError.
+    """
+    obj, method, errors = parse_locally(raw, schema)
+    if obj is None and repair is not None and LLM_JSON_REPAIR_CALLS > 0:
+        _stats["repair_calls"] += 1
+        first_errors = errors
+        obj, _, errors = parse_locally(repair(str(raw), schema, errors), schema)
+        if obj is not None:
+            method, errors = "repair_call_ok", first_errors
+    return _finish(raw, schema, obj, method, errors, request_id)
+
+
+async def parse_model_json_async(raw: Any, schema: str, request_id: Any = "UNKNOWN",
+                                 repair: Optional[Callable[[str, str, List[str]], str]] = llm_repair) -> Any:
+    """Same as parse_model_json; only the repair call leaves the event loop."""
+    obj, method, errors = parse_locally(raw, schema)
+    if obj is None and repair is not None and LLM_JSON_REPAIR_CALLS > 0:
+        _stats["repair_calls"] += 1
+        first_errors = errors
+        obj, _, errors = parse_locally(await asyncio.to_thread(repair, str(raw), schema, errors), schema)
+        if obj is not None:
+            method, errors = "repair_call_ok", first_errors
+    return _finish(raw, schema, obj, method, errors, request_id)
+
+
+def json_extract_stats() -> Dict[str, int]:
+    return {**_stats, "reruns_avoided": _stats["extracted"] + _stats["repaired"] + _stats["repair_call_ok"]}
@@ -0,0 +1,352 @@
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from utils.config import (
+    LLM_DEFAULT_RPM, LLM_DEFAULT_TPM, LLM_MAX_CONCURRENCY, LLM_MODEL_LIMITS,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE_S, LLM_BACKOFF_MAX_S,
+)
+
+# ----------------------------------------------------------------------
+# Central scheduler for every model call (normalizer, embeddings, ADK agents)
+#
+# Per model:
+#   - token buckets for requests/minute and tokens/minute
+#   - priority admission: interactive requests go before batch ones
+#   - adaptive concurrency (AIMD): halve the limit on 429, grow it slowly
+#     on success
+#   - retry with full-jitter exponential backoff on 429 / 5xx (ADK runs
+#     are retried by main_pipeline.run_adk_pipeline with the same backoff)
+#
+# The scheduler is thread-safe and blocking. acquire_async waits on an
+# asyncio event, without holding a worker thread; call_async runs the
+# (blocking) model call in one.
+# ----------------------------------------------------------------------
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# status in the error text when the exception carries no code attribute
+# ("HTTP 503", "status: 500", "error code 429"); a bare number (an id, a
+# row count) is not a status
+STATUS_TEXT = re.compile(r"\b(?:HTTP|status|code)\b\W{0,3}(\d{3})\b", re.IGNORECASE)
+
+# Priority of the calls made by the current request (inherited by tasks/threads)
+llm_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+# Active call counters; every admitted call increments each of them
+llm_call_counters: ContextVar[tuple] = ContextVar("llm_call_counters", default=())
+
+
+@contextmanager
+def priority(value: int):
+    token = llm_priority.set(value)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+
+@contextmanager
+def counting_calls():
+    """Count the model calls made inside the block (nested blocks all count)."""
+    counter = {"calls": 0}
+    token = llm_call_counters.set(llm_call_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        llm_call_counters.reset(token)
+
+
+def estimate_tokens(text: Any) -> int:
+    """Rough token count (~4 chars per token), enough for admission control."""
+    return max(1, len(str(text or "")) // 4)
+
+
+def usage_tokens(result: Any) -> Optional[int]:
+    """Total tokens reported by a Gemini response (None if not reported)."""
+    usage = getattr(result, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None) if usage is not None else None
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    for attr in ("code", "status_code", "status"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+        if hasattr(value, "value") and isinstance(value.value, int):  # HTTPStatus-like
+            return value.value
+    text = str(error)
+    if re.search(r"\bRESOURCE_EXHAUSTED\b", text):
+        return 429
+    match = STATUS_TEXT.search(text)
+    return int(match.group(1)) if match else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    return status_of(error) in RETRYABLE_STATUS
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    headers = getattr(error, "headers", None) or getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Refills `rate_per_min` units per minute up to `capacity`. Not locked: owned by a ModelLimiter."""
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_min
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, amount: float) -> None:
+        """Consume units; the level may go negative to account for underestimates."""
+        self._refill()
+        self.level -= amount
+
+
+class ModelLimiter:
+
+    def __init__(self, model: str, rpm: float, tpm: float, max_concurrency: int):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self.waiters = []
+        self.async_waiters = set()  # (loop, asyncio.Event) of acquire_async callers
+        self.seq = itertools.count()
+        self.stats = {"calls": 0, "retries": 0, "throttled": 0, "errors": 0, "wait_s": 0.0}
+
+    def _try_admit(self, entry: tuple, est_tokens: int, started: float):
+        """-> (permit, 0) or (None, seconds to wait at most). Called with self.cond held."""
+        if self.waiters[0] != entry or self.in_flight >= int(self.limit):
+            return None, 0.5
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(est_tokens))
+        if wait > 0:
+            return None, min(wait, 0.5)
+        self.requests.take(1)
+        self.tokens.take(est_tokens)
+        self.in_flight += 1
+        self.stats["calls"] += 1
+        self.stats["wait_s"] += time.monotonic() - started
+        return {"model": self.model, "est_tokens": est_tokens, "released": False}, 0
+
+    def _leave(self, entry: tuple) -> None:
+        self.waiters.remove(entry)
+        heapq.heapify(self.waiters)
+        self._notify()
+
+    def _notify(self) -> None:
+        """Wake every waiter, blocking or async. Called with self.cond held."""
+        self.cond.notify_all()
+        for loop, event in self.async_waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def acquire(self, est_tokens: int, prio: int) -> Dict[str, Any]:
+        entry = (prio, next(self.seq))
+        started = time.monotonic()
+        with self.cond:
+            heapq.heappush(self.waiters, entry)
+            try:
+                while True:
+                    permit, wait = self._try_admit(entry, est_tokens, started)
+                    if permit is not None:
+                        return permit
+                    self.cond.wait(timeout=wait)
+            finally:
+                self._leave(entry)
+
+    async def acquire_async(self, est_tokens: int, prio: int) -> Dict[str, Any]:
+        """Same admission as acquire; waits on an asyncio event instead of a thread."""
+        entry = (prio, next(self.seq))
+        started = time.monotonic()
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.cond:
+            heapq.heappush(self.waiters, entry)
+            self.async_waiters.add(waiter)
+        try:
+            while True:
+                with self.cond:
+                    # cleared before the check: a release after it sets the event again
+                    waiter[1].clear()
+                    permit, wait = self._try_admit(entry, est_tokens, started)
+                if permit is not None:
+                    return permit
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self.cond:
+                self.async_waiters.discard(waiter)
+                self._leave(entry)
+
+    def release(self, permit: Dict[str, Any], used_tokens: Optional[int] = None,
+                error: Optional[BaseException] = None) -> None:
+        with self.cond:
+            if permit.get("released"):
+                return
+            permit["released"] = True
+            self.in_flight -= 1
+
+            if used_tokens is not None and used_tokens > permit["est_tokens"]:
+                self.tokens.take(used_tokens - permit["est_tokens"])
+
+            if error is not None and status_of(error) == 429:
+                # multiplicative decrease
+                self.stats["throttled"] += 1
+                self.limit = max(1.0, self.limit / 2)
+            elif error is not None:
+                self.stats["errors"] += 1
+            else:
+                # additive increase: +1 per `limit` successful calls
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+
+            self._notify()
+
+
+class LLMScheduler:
+
+    def __init__(self, model_limits: Optional[Dict[str, Dict[str, float]]] = None,
+                 default_rpm: float = LLM_DEFAULT_RPM, default_tpm: float = LLM_DEFAULT_TPM,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base_s: float = LLM_BACKOFF_BASE_S, backoff_max_s: float = LLM_BACKOFF_MAX_S):
+        self.model_limits = model_limits or {}
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._limiters: Dict[str, ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model: str) -> ModelLimiter:
+        with self._lock:
+            if model not in self._limiters:
+                limits = self.model_limits.get(model, {})
+                self._limiters[model] = ModelLimiter(
+                    model,
+                    rpm=limits.get("rpm", self.default_rpm),
+                    tpm=limits.get("tpm", self.default_tpm),
+                    max_concurrency=int(limits.get("concurrency", self.max_concurrency)),
+                )
+            return self._limiters[model]
+
+    # --- admission only (callers that run the model themselves, e.g. ADK) ---
+
+    def acquire(self, model: str, est_tokens: int = 1, prio: Optional[int] = None) -> Dict[str, Any]:
+        prio = llm_priority.get() if prio is None else prio
+        permit = self.limiter(model).acquire(est_tokens, prio)
+        for counter in llm_call_counters.get():
+            counter["calls"] += 1
+        return permit
+
+    async def acquire_async(self, model: str, est_tokens: int = 1, prio: Optional[int] = None) -> Dict[str, Any]:
+        prio = llm_priority.get() if prio is None else prio
+        permit = await self.limiter(model).acquire_async(est_tokens, prio)
+        for counter in llm_call_counters.get():
+            counter["calls"] += 1
+        return permit
+
+    def release(self, permit: Dict[str, Any], used_tokens: Optional[int] = None,
+                error: Optional[BaseException] = None) -> None:
+        self.limiter(permit["model"]).release(permit, used_tokens=used_tokens, error=error)
+
+    # --- full call: admission + retry ---
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        retry_after = retry_after_of(error)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+
+    def call(self, model: str, fn: Callable, *args, est_tokens: int = 1,
+             prio: Optional[int] = None, usage_fn: Optional[Callable[[Any], Optional[int]]] = None,
+             **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) under the model's limits, retrying 429/5xx.
+        usage_fn(result) may return the real token usage to settle the bucket.
+        """
+        attempt = 0
+        while True:
+            permit = self.acquire(model, est_tokens, prio)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as error:
+                self.release(permit, error=error)
+                if not is_retryable(error) or attempt >= self.max_retries:
+                    raise
+                self.limiter(model).stats["retries"] += 1
+                time.sleep(self.backoff(attempt, error))
+                attempt += 1
+                continue
+
+            self.release(permit, used_tokens=usage_fn(result) if usage_fn else None)
+            return result
+
+    async def call_async(self, model: str, fn: Callable, *args, **kwargs) -> Any:
+        return await asyncio.to_thread(self.call, model, fn, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                model: {**lim.stats, "concurrency_limit": round(lim.limit, 2)}
+                for model, lim in self._limiters.items()
+            }
+
+
+def parse_model_limits(spec: str) -> Dict[str, Dict[str, float]]:
+    """
+    "gemini-2.5-flash-lite=15/250000/4;text-embedding-004=1500/1000000"
+      -> {model: {"rpm": .., "tpm": .., "concurrency": ..}}
+    """
+    limits = {}
+    for item in filter(None, (x.strip() for x in (spec or "").split(";"))):
+        model, _, values = item.partition("=")
+        parts = [float(v) for v in values.split("/") if v.strip()]
+        limits[model.strip()] = dict(zip(("rpm", "tpm", "concurrency"), parts))
+    return limits
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    """Process-wide scheduler shared by all model calls."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(parse_model_limits(LLM_MODEL_LIMITS))
+    return _scheduler
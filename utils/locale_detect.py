@@ -0,0 +1,54 @@
+import re
+from typing import Tuple
+
+# ----------------------------------------------------------------------
+# Cheap language detection of a (normalized) request: RO or EN.
+#
+# No model, no dependency: Romanian diacritics and frequent function words
+# of each language are counted. confidence = share of the winning
+# language's markers; with too few markers the answer is "mixed" at 0.5,
+# so retrieval falls back to the global search.
+# ----------------------------------------------------------------------
+
+RO_DIACRITICS = set("ăâîșşțţ")
+
+RO_WORDS = {
+    "si", "și", "sa", "să", "va", "vă", "rog", "pentru", "cu", "de", "la", "in", "în", "din", "pe",
+    "este", "sunt", "care", "noua", "nou", "noul", "valoare", "valoarea", "valuta", "codul", "cod",
+    "adaugati", "adăugați", "actualizati", "actualizați", "modificati", "schimbati", "creati",
+    "tariful", "comision", "comisionul", "denumirea", "semnificatia", "sindicat", "fixa",
+    "procent", "inchideti", "raportul", "lunar", "trimiteti", "mi", "al", "ale", "unei", "unui",
+}
+
+EN_WORDS = {
+    "the", "and", "for", "with", "please", "to", "of", "new", "update", "create", "add", "change",
+    "set", "should", "now", "value", "meaning", "code", "is", "are", "be", "in", "a", "an", "at",
+    "we", "need", "named", "instead", "current", "amount", "fixed", "percent", "fee", "tariff",
+    "close", "insert", "type", "domain", "values", "this", "that", "from", "by", "end", "day",
+}
+
+PREFIX_RE = re.compile(r"\b(?:title|request_text)\s*:", re.IGNORECASE)
+PLACEHOLDER_RE = re.compile(r"<[^>]*>")
+WORD_RE = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+MIN_MARKERS = 3
+
+
+def detect_locale(text: str) -> Tuple[str, float]:
+    """-> ("RO" | "EN" | "mixed", confidence in [0.5, 1])."""
+    text = PLACEHOLDER_RE.sub(" ", PREFIX_RE.sub(" ", str(text or ""))).lower()
+    words = WORD_RE.findall(text)
+
+    ro = 2 * sum(ch in RO_DIACRITICS for ch in text)
+    en = 0
+    for word in words:
+        # words of both lists ("in") count for neither
+        in_ro, in_en = word in RO_WORDS, word in EN_WORDS
+        ro += in_ro and not in_en
+        en += in_en and not in_ro
+
+    if ro + en < MIN_MARKERS:
+        return "mixed", 0.5
+    if ro == en:
+        return "mixed", 0.5
+    return ("RO", ro / (ro + en)) if ro > en else ("EN", en / (ro + en))
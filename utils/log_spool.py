@@ -0,0 +1,249 @@
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils import db_utils
+from utils.config import (
+    LOG_SPOOL_DIR, LOG_SPOOL_FSYNC_EVERY, LOG_SPOOL_FSYNC_INTERVAL_S,
+    LOG_SPOOL_MAX_FILE_BYTES, LOG_SPOOL_MAX_TOTAL_BYTES, get_local_timestamp_string,
+)
+
+# ----------------------------------------------------------------------
+# Local append-only spool for log records the database did not take.
+#
+# Files in LOG_SPOOL_DIR:
+#   active_<pid>.jsonl       being written by process <pid>
+#   spool_<ts>_<pid>.jsonl   closed (rotated), ready for replay
+#
+# One JSON record per line:
+#   {"kind": "pipeline" | "agent", "values": [...], "blobs": {hash: json},
+#    "logged_at": iso timestamp}
+# "blobs" holds every payload the record references (not only new ones):
+# a blob vacuumed while the record sat in the spool is stored again.
+#
+# Writes are fsync'ed every LOG_SPOOL_FSYNC_EVERY records or
+# LOG_SPOOL_FSYNC_INTERVAL_S seconds, the active file is rotated above
+# LOG_SPOOL_MAX_FILE_BYTES and new records are dropped (and counted) once
+# the spool holds LOG_SPOOL_MAX_TOTAL_BYTES.
+# ----------------------------------------------------------------------
+
+SPOOL_COPY_PAYLOADS = "COPY spool_payloads (payload_hash, payload, size_bytes) FROM STDIN"
+
+SPOOL_INSERT_PAYLOADS = """
+    INSERT INTO logs.log_payloads (payload_hash, payload, size_bytes)
+    SELECT payload_hash, payload, size_bytes FROM spool_payloads
+    ON CONFLICT (payload_hash) DO UPDATE SET last_referenced_at = now()
+"""
+
+# db_pipeline_logs.created_at is TIMESTAMP (no time zone), filled by live
+# inserts with now() in the session's time zone. COPY would drop the offset
+# of the spooled timestamp, so pipeline rows go through a temp table and are
+# converted explicitly; agent_llm_logs.run_timestamp is TIMESTAMPTZ.
+SPOOL_COPY = {
+    "pipeline": "COPY spool_pipeline_logs "
+                "(request_id, app_name, pipeline_name, stage, log_data, logged_at) FROM STDIN",
+    "agent": "COPY logs.agent_llm_logs "
+             "(session_id, app_name, agent_name, log_data, run_timestamp) FROM STDIN",
+}
+
+SPOOL_STAGE = {
+    "pipeline": "CREATE TEMP TABLE IF NOT EXISTS spool_pipeline_logs "
+                "(request_id TEXT, app_name TEXT, pipeline_name TEXT, stage TEXT, log_data JSONB, "
+                "logged_at TIMESTAMPTZ) ON COMMIT DELETE ROWS",
+}
+
+SPOOL_INSERT = {
+    "pipeline": """
+        INSERT INTO logs.db_pipeline_logs (request_id, app_name, pipeline_name, stage, log_data, created_at)
+        SELECT request_id, app_name, pipeline_name, stage, log_data,
+               logged_at AT TIME ZONE current_setting('TimeZone')
+          FROM spool_pipeline_logs
+    """,
+}
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class LogSpool:
+
+    def __init__(self, spool_dir: str = LOG_SPOOL_DIR, fsync_every: int = LOG_SPOOL_FSYNC_EVERY,
+                 fsync_interval_s: float = LOG_SPOOL_FSYNC_INTERVAL_S,
+                 max_file_bytes: int = LOG_SPOOL_MAX_FILE_BYTES,
+                 max_total_bytes: int = LOG_SPOOL_MAX_TOTAL_BYTES):
+        self.spool_dir = Path(spool_dir)
+        self.fsync_every = fsync_every
+        self.fsync_interval_s = fsync_interval_s
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.active_path = self.spool_dir / f"active_{os.getpid()}.jsonl"
+        self._file = None
+        self._file_bytes = 0
+        self._total_bytes: Optional[int] = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._lock = threading.Lock()
+        self.stats = {"spooled": 0, "dropped": 0, "fsyncs": 0, "rotations": 0}
+
+    # --- writing ----------------------------------------------------------
+
+    def _spool_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.spool_dir.glob("*.jsonl"))
+
+    def _open(self):
+        if self._file is None:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.active_path, "ab")
+            self._file_bytes = self._file.tell()
+        return self._file
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.stats["fsyncs"] += 1
+
+    def append(self, record: Dict[str, Any]) -> bool:
+        """Append one record; False when the spool is full and the record was dropped."""
+        data = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._spool_bytes() if self.spool_dir.exists() else 0
+            if self._total_bytes + len(data) > self.max_total_bytes:
+                if self.stats["dropped"] == 0:
+                    print(f" LogSpool : spool {self.spool_dir} is full, dropping log records")
+                self.stats["dropped"] += 1
+                return False
+
+            f = self._open()
+            f.write(data)
+            self._file_bytes += len(data)
+            self._total_bytes += len(data)
+            self._unsynced += 1
+            self.stats["spooled"] += 1
+
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval_s):
+                self._sync()
+            if self._file_bytes >= self.max_file_bytes:
+                self._rotate_locked()
+            return True
+
+    def _rotate_locked(self) -> None:
+        if self._file is None:
+            return
+        self._sync()
+        self._file.close()
+        self._file = None
+        if self._file_bytes:
+            closed = self.spool_dir / f"spool_{get_local_timestamp_string()}_{os.getpid()}_{self.stats['rotations']}.jsonl"
+            os.replace(self.active_path, closed)
+            self.stats["rotations"] += 1
+        self._file_bytes = 0
+        self._total_bytes = self._spool_bytes()
+
+    def rotate(self) -> None:
+        """Close the active file so it can be replayed."""
+        with self._lock:
+            self._rotate_locked()
+
+    def close(self) -> None:
+        self.rotate()
+
+    # --- replay -----------------------------------------------------------
+
+    def ready_files(self) -> List[Path]:
+        """Closed spool files, plus active files left behind by dead processes."""
+        if not self.spool_dir.exists():
+            return []
+        for path in self.spool_dir.glob("active_*.jsonl"):
+            pid = int(path.stem.split("_", 1)[1])
+            if pid != os.getpid() and not _pid_alive(pid):
+                os.replace(path, path.with_name(f"spool_{get_local_timestamp_string()}_{pid}_orphan.jsonl"))
+        return sorted(self.spool_dir.glob("spool_*.jsonl"))
+
+
+def read_spool_file(path: Path) -> List[Dict[str, Any]]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # last line of a file cut by a crash
+                print(f" read_spool_file : skipping partial record in {path.name}")
+    return records
+
+
+def replay_spool(spool: Optional["LogSpool"] = None) -> Dict[str, int]:
+    """
+    Bulk-load every closed spool file into the log tables, one transaction
+    per file: payload blobs via a temp table (COPY has no ON CONFLICT), agent
+    rows with COPY straight into the partitioned table, pipeline rows via a
+    temp table (created_at conversion, see SPOOL_INSERT). A file is deleted
+    once its transaction committed.
+    """
+    spool = spool or get_spool()
+    spool.rotate()
+    result = {"files": 0, "pipeline": 0, "agent": 0, "payloads": 0}
+
+    with db_utils.connection() as conn:
+        for path in spool.ready_files():
+            records = read_spool_file(path)
+            blobs = {}
+            for record in records:
+                blobs.update(record.get("blobs") or {})
+
+            with conn.cursor() as cur:
+                if blobs:
+                    cur.execute("CREATE TEMP TABLE IF NOT EXISTS spool_payloads "
+                                "(payload_hash TEXT, payload JSONB, size_bytes INTEGER) ON COMMIT DELETE ROWS")
+                    with cur.copy(SPOOL_COPY_PAYLOADS) as copy:
+                        for payload_hash, text in blobs.items():
+                            copy.write_row((payload_hash, text, len(text.encode("utf-8"))))
+                    cur.execute(SPOOL_INSERT_PAYLOADS)
+                    result["payloads"] += cur.rowcount
+
+                for kind, copy_sql in SPOOL_COPY.items():
+                    rows = [r["values"] + [r["logged_at"]] for r in records if r.get("kind") == kind]
+                    if not rows:
+                        continue
+                    if kind in SPOOL_STAGE:
+                        cur.execute(SPOOL_STAGE[kind])
+                    with cur.copy(copy_sql) as copy:
+                        for row in rows:
+                            copy.write_row(row)
+                    if kind in SPOOL_INSERT:
+                        cur.execute(SPOOL_INSERT[kind])
+                    result[kind] += len(rows)
+            conn.commit()
+
+            path.unlink()
+            result["files"] += 1
+
+    print(f" replay_spool : {result}")
+    return result
+
+
+_spool: Optional[LogSpool] = None
+
+
+def get_spool() -> LogSpool:
+    """Process-wide spool; its active file is closed at exit."""
+    global _spool
+    if _spool is None:
+        _spool = LogSpool()
+        atexit.register(_spool.close)
+    return _spool
@@ -1,11 +1,25 @@
+import asyncio
+import fnmatch
+import hashlib
 import json
-from typing import Any, Dict, List
+import logging
+import time
+import zlib
+from collections import deque
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
 
-import psycopg2
-from psycopg2.extras import Json
 from datetime import datetime, timezone
-from utils.config import APP_NAME, PG_CONN
-from google.adk.events import Event
+from utils.config import (
+    APP_NAME, AGENT_LOG_FLUSH_EVERY, AGENT_EVENT_WINDOW, LOG_PAYLOAD_MIN_BYTES, LOG_PAYLOAD_KNOWN_TTL_S,
+    LOG_DB_TIMEOUT_S, LOG_DB_RETRY_S, LOG_DB_RETRY_MAX_S,
+    LOG_LEVEL, LOG_STAGE_LEVELS, LOG_SAMPLE_RATES,
+)
+from utils import db_utils
+from utils.log_spool import get_spool
+
+if TYPE_CHECKING:  # annotations only: ADK is loaded by the agent runs
+    from google.adk.events import Event
 
 def date_to_local_iso(ts):
     if isinstance(ts, (int, float)):
@@ -22,106 +36,402 @@ def date_to_local_iso(ts):
     return dt.astimezone().isoformat()
 
 
-def extract_llm_interactions(events: List[Event]) -> List[Dict[str, Any]]:
-    llm_logs = []
+def extract_llm_interaction(event: "Event") -> Dict[str, Any]:
+    # Determine "prompt" vs "response"
+    author = getattr(event, "author", None)
+
+    # Parse parts
+    content = getattr(event, "content", None)
+    raw_parts = getattr(content, "parts", None) if content is not None else None
 
-    for event in events:
-        # Determine "prompt" vs "response"
-        author = getattr(event, "author", None)
+    if isinstance(raw_parts, list):
+        parts = raw_parts
+    elif raw_parts is None:
+        parts = []
+    else:
+        parts = [raw_parts]
 
-        # Parse parts
-        content = getattr(event, "content", None)
+    # Split into prompt-like vs response-like for compatibility
+    if author == "user":
+        prompt_contents = [{"role": "user", "text": getattr(p, "text", None)} for p in parts]
+        response_contents = []
+    else:
+        prompt_contents = []
+        response_contents = [{"role": "model", "text": getattr(p, "text", None)} for p in parts]
 
-        if content is not None:
-           
-            raw_parts = getattr(content, "parts", None)
+    return {
+        "timestamp": date_to_local_iso(event.timestamp),
+        "agent_name": getattr(event, "agent_name", None) or author,
+        "model_name": getattr(event, "model_name", None),
 
-            if isinstance(raw_parts, list):
-                parts = raw_parts
-            elif raw_parts is None:
-                parts = []
-            else:
-             
-                parts = [raw_parts]
+        "prompt_contents": prompt_contents,
+        "response_contents": response_contents
+    }
 
-    
-        # Split into prompt-like vs response-like for compatibility
-        if author == "user":
-            prompt_contents = [{"role": "user", "text": getattr(p, "text", None)} for p in parts]
-            response_contents = []
-        else:
-            prompt_contents = []
-            response_contents = [{"role": "model", "text": getattr(p, "text", None)} for p in parts]
-
-        log_entry = {
-            "timestamp": date_to_local_iso(event.timestamp),
-            "agent_name": getattr(event, "agent_name", None),
-            "model_name": getattr(event, "model_name", None),
-
-            "prompt_contents": prompt_contents,
-            "response_contents": response_contents  
-       }
 
-      
-        llm_logs.append(log_entry)
+def extract_llm_interactions(events: List["Event"]) -> List[Dict[str, Any]]:
+    return [extract_llm_interaction(event) for event in events]
+
+
+AGENT_LOG_INSERT = """
+    INSERT INTO logs.agent_llm_logs (session_id, app_name, agent_name, log_data)
+    VALUES (%s, %s, %s, %s::jsonb);
+"""
+
+PIPELINE_LOG_INSERT = """
+    INSERT INTO logs.db_pipeline_logs
+    (request_id, app_name, pipeline_name, stage, log_data)
+    VALUES (%s, %s, %s, %s,  %s::jsonb)
+"""
+
+PAYLOAD_INSERT = """
+    INSERT INTO logs.log_payloads (payload_hash, payload, size_bytes)
+    VALUES (%s, %s::jsonb, %s)
+    ON CONFLICT (payload_hash) DO UPDATE SET last_referenced_at = now()
+"""
+
+# ----------------------------------------------------------------------
+# Content-addressed payloads
+#
+# Values of at least LOG_PAYLOAD_MIN_BYTES are stored once in
+# logs.log_payloads, keyed by the sha256 of their canonical JSON; the log
+# row keeps {"$payload_ref": "<hash>"} in their place. The *_full views in
+# init_log.sql re-hydrate rows for debugging.
+#
+# Every insert of a blob stamps its last_referenced_at, which
+# `log_maintenance.py vacuum-payloads` ages blobs by. A blob this process
+# stored less than LOG_PAYLOAD_KNOWN_TTL_S ago is not sent again (it is
+# younger than the vacuum's minimum age). Records keep every blob they
+# reference, so a spooled record restores its blobs when replayed.
+# ----------------------------------------------------------------------
+
+PAYLOAD_REF_KEY = "$payload_ref"
+
+# Hashes stored by this process -> time.monotonic() of the insert
+_known_payloads: Dict[str, float] = {}
+_KNOWN_PAYLOADS_MAX = 100_000
+
+
+def _payload_ref(value: Any, blobs: Dict[str, str]) -> Any:
+    """Return a reference for a large value (and collect its blob), or the value itself."""
+    text = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    encoded = text.encode("utf-8")
+    if len(encoded) < LOG_PAYLOAD_MIN_BYTES:
+        return value
+
+    payload_hash = hashlib.sha256(encoded).hexdigest()
+    blobs[payload_hash] = text
+    return {PAYLOAD_REF_KEY: payload_hash}
+
+
+def externalize_payloads(data: Dict[str, Any], blobs: Dict[str, str]) -> Dict[str, Any]:
+    """Pipeline log data: every large top-level value becomes a reference."""
+    return {key: _payload_ref(value, blobs) for key, value in data.items()}
+
+
+def externalize_interaction_texts(interactions: List[Dict[str, Any]], blobs: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Agent log data: large prompt/response texts become references."""
+    result = []
+    for item in interactions:
+        item = dict(item)
+        for field in ("prompt_contents", "response_contents"):
+            item[field] = [
+                {**part, "text": _payload_ref(part.get("text"), blobs)} for part in item.get(field, [])
+            ]
+        result.append(item)
+    return result
+
+
+def _blobs_to_send(blobs: Dict[str, str]) -> Dict[str, str]:
+    """The blobs of a record this process did not store within LOG_PAYLOAD_KNOWN_TTL_S."""
+    now = time.monotonic()
+    return {
+        payload_hash: text for payload_hash, text in blobs.items()
+        if now - _known_payloads.get(payload_hash, float("-inf")) >= LOG_PAYLOAD_KNOWN_TTL_S
+    }
+
+
+def _payload_statements(blobs: Dict[str, str]) -> List[tuple]:
+    return [
+        (PAYLOAD_INSERT, (payload_hash, text, len(text.encode("utf-8"))))
+        for payload_hash, text in blobs.items()
+    ]
+
+
+def _remember_payloads(blobs: Dict[str, str], sent_at: float) -> None:
+    if len(_known_payloads) > _KNOWN_PAYLOADS_MAX:
+        _known_payloads.clear()
+    _known_payloads.update(dict.fromkeys(blobs, sent_at))
+
+
+# ----------------------------------------------------------------------
+# Levels and sampling
+#
+# Every pipeline log call has a level (stdlib logging values) and a stage.
+# A call is written only when its level reaches the stage's level
+# (LOG_STAGE_LEVELS, else LOG_LEVEL) and the request falls in the stage's
+# sample (LOG_SAMPLE_RATES). Payloads may be passed as callables: they are
+# only evaluated for calls that will be written, so production runs at
+# INFO skip the DEBUG payload work entirely.
+# ----------------------------------------------------------------------
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+
+def level_value(level: Union[int, str]) -> int:
+    if isinstance(level, int):
+        return level
+    value = logging.getLevelName(level.strip().upper())
+    return value if isinstance(value, int) else INFO
+
+
+def parse_stage_rules(spec: str, convert: Callable[[str], Any]) -> List[tuple]:
+    """
+    "run_adk_pipeline:*=DEBUG;step1_normalize:start=WARNING"
+      -> [(pattern, value)], most specific (longest) pattern first
+    """
+    rules = []
+    for item in filter(None, (x.strip() for x in (spec or "").split(";"))):
+        pattern, _, value = item.rpartition("=")
+        rules.append((pattern.strip(), convert(value.strip())))
+    return sorted(rules, key=lambda rule: len(rule[0]), reverse=True)
+
+
+_stage_levels = parse_stage_rules(LOG_STAGE_LEVELS, level_value)
+_sample_rates = parse_stage_rules(LOG_SAMPLE_RATES, float)
+_default_level = level_value(LOG_LEVEL)
+
+
+def _match(rules: List[tuple], stage: str, default: Any) -> Any:
+    for pattern, value in rules:
+        if fnmatch.fnmatchcase(stage, pattern):
+            return value
+    return default
+
+
+@lru_cache(maxsize=1024)
+def stage_level(stage: str) -> int:
+    return _match(_stage_levels, stage, _default_level)
+
+
+@lru_cache(maxsize=1024)
+def stage_sample_rate(stage: str) -> float:
+    return _match(_sample_rates, stage, 1.0)
+
+
+def log_enabled(stage: str, level: int = INFO, key: Optional[str] = None) -> bool:
+    """
+    True when a call at `level` for `stage` must be written. `key` (the
+    request or session id) makes sampling stable: a sampled request keeps
+    all its events of that stage.
+    """
+    if level < stage_level(stage):
+        return False
+    rate = stage_sample_rate(stage)
+    if level >= WARNING or rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    bucket = zlib.crc32(f"{key}|{stage}".encode("utf-8")) / 0xFFFFFFFF
+    return bucket < rate
+
 
-    return llm_logs
+LogData = Union[Dict[str, Any], Callable[[], Dict[str, Any]]]
+
+
+# ----------------------------------------------------------------------
+# Log sink: database first, local spool as fallback
+#
+# A log record never makes the pipeline wait on the log database: inserts
+# wait at most LOG_DB_TIMEOUT_S for a connection, and after a failure the
+# circuit opens and records go straight to the spool (utils/log_spool.py)
+# until the retry delay has passed.
+# ----------------------------------------------------------------------
+
+class LogCircuit:
+
+    def __init__(self, retry_s: float = LOG_DB_RETRY_S, retry_max_s: float = LOG_DB_RETRY_MAX_S):
+        self.retry_s = retry_s
+        self.retry_max_s = retry_max_s
+        self.failures = 0
+        self.open_until = 0.0
+
+    def allow(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def success(self) -> None:
+        self.failures = 0
+        self.open_until = 0.0
+
+    def failure(self) -> None:
+        self.failures += 1
+        self.open_until = time.monotonic() + min(self.retry_max_s, self.retry_s * 2 ** (self.failures - 1))
+
+
+_log_circuit = LogCircuit()
+
+
+def _record_statements(record: Dict[str, Any], blobs: Dict[str, str]) -> List[tuple]:
+    insert = PIPELINE_LOG_INSERT if record["kind"] == "pipeline" else AGENT_LOG_INSERT
+    return _payload_statements(blobs) + [(insert, tuple(record["values"]))]
+
+
+def _spool_record(caller: str, record: Dict[str, Any], error: Optional[BaseException] = None) -> None:
+    if error is not None:
+        print(f" {caller} : log database unavailable, spooling locally: {error}")
+    get_spool().append(record)
+
+
+# Inserts scheduled from inside the event loop; awaited by flush_log_tasks()
+_pending_log_tasks = set()
+
+
+async def _insert_log_async(caller: str, record: Dict[str, Any]) -> None:
+    blobs = _blobs_to_send(record["blobs"])
+    sent_at = time.monotonic()
+    try:
+        await asyncio.wait_for(
+            db_utils.execute_batch(_record_statements(record, blobs), timeout=LOG_DB_TIMEOUT_S),
+            timeout=LOG_DB_TIMEOUT_S * 2,
+        )
+    except Exception as error:
+        _log_circuit.failure()
+        _spool_record(caller, record, error)
+        return
+    _log_circuit.success()
+    _remember_payloads(blobs, sent_at)
+
+
+def _insert_log(caller: str, record: Dict[str, Any]) -> None:
+    """
+    Write one log record (the row and its new payload blobs, same
+    transaction) without stalling the pipeline:
+    - circuit open (recent DB failure): appended to the local spool;
+    - inside a running event loop the insert is scheduled on the async pool
+      and the caller returns immediately;
+    - outside a loop it goes through the sync pool with a short timeout.
+    Failed inserts end up in the spool, replayed by
+    `python log_maintenance.py replay-spool`.
+    """
+    if not _log_circuit.allow():
+        _spool_record(caller, record)
+        return
+
+    if db_utils.in_event_loop():
+        task = asyncio.get_running_loop().create_task(_insert_log_async(caller, record))
+        _pending_log_tasks.add(task)
+        task.add_done_callback(_pending_log_tasks.discard)
+        return
+
+    blobs = _blobs_to_send(record["blobs"])
+    sent_at = time.monotonic()
+    try:
+        db_utils.execute_batch_sync(_record_statements(record, blobs), timeout=LOG_DB_TIMEOUT_S)
+    except Exception as error:
+        _log_circuit.failure()
+        _spool_record(caller, record, error)
+        return
+    _log_circuit.success()
+    _remember_payloads(blobs, sent_at)
+
+
+async def flush_log_tasks() -> None:
+    """Wait for every log insert scheduled from the event loop."""
+    while _pending_log_tasks:
+        await asyncio.gather(*list(_pending_log_tasks), return_exceptions=True)
 
 
 def log_agent_events(session_id: str, agent_name:str, log_data: List[Dict[str, Any]]):
     
-   
     if not log_data:
-       
         return
-    
-    try:
-       
-        conn = psycopg2.connect(**PG_CONN)
-        cur = conn.cursor()
-        
-        insert_query = """
-            INSERT INTO logs.agent_llm_logs (session_id, app_name, agent_name, log_data) 
-            VALUES (%s, %s, %s, %s);
-        """
-        cur.execute(
-            insert_query,
-            (session_id, APP_NAME, agent_name, Json(log_data))  # Json(...) handles dict/list -> JSONB
-        )
-        
-        conn.commit()
-        cur.close()
-        #print(f" Successfully logged {len(log_data)} LLM interactions for session: {session_id}")
-        
-    except (Exception, psycopg2.Error) as error:
-        print(f" log_agent_events :  Error while connecting to PostgreSQL or inserting data: {error}")
-    finally:
-        if conn is not None:
-            conn.close()
 
+    # serialize now: the caller may keep mutating its structures
+    blobs = {}
+    row = json.dumps(externalize_interaction_texts(log_data, blobs), default=str)
+    _insert_log("log_agent_events", {
+        "kind": "agent",
+        "values": [session_id, APP_NAME, agent_name, row],
+        "blobs": blobs,
+        "logged_at": datetime.now().astimezone().isoformat(),
+    })
 
-def log_pipeline_event( request_id: str, pipeline_name: str, stage: str, data: dict) -> None:
 
-    conn = psycopg2.connect(**PG_CONN)
+def log_pipeline_event( request_id: str, pipeline_name: str, stage: str, data: LogData,
+                        level: int = INFO) -> None:
+    """`data` may be a dict or a callable returning one (evaluated only if the call is written)."""
+    if not log_enabled(stage, level, request_id):
+        return
+    if callable(data):
+        data = data()
 
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO logs.db_pipeline_logs
-                (request_id, app_name, pipeline_name, stage, log_data)
-                VALUES (%s, %s, %s, %s,  %s::jsonb)
-            """,
-            (
-                request_id,
-                APP_NAME,
-                pipeline_name,
-                stage,
-                json.dumps(data)
-            ))
-            conn.commit()
-            cur.close()
-    except (Exception, psycopg2.Error) as error:
-        print(f" log_pipeline_event : Error while connecting to PostgreSQL or inserting data: {error}")
-    finally:
-        if conn is not None:
-            conn.close()
+    blobs = {}
+    row = json.dumps(externalize_payloads(data, blobs), default=str)
+    _insert_log("log_pipeline_event", {
+        "kind": "pipeline",
+        "values": [request_id, APP_NAME, pipeline_name, stage, row],
+        "blobs": blobs,
+        "logged_at": datetime.now().astimezone().isoformat(),
+    })
+
+
+class AgentEventStream:
+    """
+    Incremental processing of ADK events:
+    - each event is converted to an interaction and buffered; every
+      `flush_every` interactions are written as one agent_llm_logs row
+      (skipped entirely when stage "agent_events:<agent_name>" is not enabled)
+    - only the last `window` events are kept in memory (for diagnostics)
+    - output keys (e.g. sql_probe, plan) are captured from the events'
+      state_delta as soon as the producing agent finishes
+    """
+
+    def __init__(self, session_id: str, agent_name: str,
+                 flush_every: int = AGENT_LOG_FLUSH_EVERY, window: int = AGENT_EVENT_WINDOW,
+                 level: int = INFO):
+        self.session_id = session_id
+        self.agent_name = agent_name
+        # stage "agent_events:<agent_name>" for levels and sampling
+        self.enabled = log_enabled(f"agent_events:{agent_name}", level, session_id)
+        self.flush_every = flush_every
+        self.recent = deque(maxlen=window)
+        self.pending: List[Dict[str, Any]] = []
+        self.state: Dict[str, Any] = {}
+        self.event_count = 0
+        self.flushed_count = 0
+
+    def add(self, event: "Event") -> Dict[str, Any]:
+        """Process one event and return the state keys it changed."""
+        self.event_count += 1
+        self.recent.append(event)
+        if self.enabled:
+            self.pending.append(extract_llm_interaction(event))
+            if len(self.pending) >= self.flush_every:
+                self.flush()
+
+        actions = getattr(event, "actions", None)
+        delta = dict(getattr(actions, "state_delta", None) or {})
+        self.state.update(delta)
+        return delta
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        return self.state.get(key, default)
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        log_agent_events(session_id=self.session_id, agent_name=self.agent_name, log_data=self.pending)
+        self.flushed_count += len(self.pending)
+        self.pending = []
+
+    def summary(self) -> Dict[str, Any]:
+        """Cheap replacement for a full state dump: keys and value sizes only."""
+        return {
+            "events": self.event_count,
+            "interactions_logged": self.flushed_count,
+            "state_sizes": {k: len(str(v)) for k, v in self.state.items()},
+            "recent_authors": [getattr(e, "author", None) for e in self.recent],
+        }
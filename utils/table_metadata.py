@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils import db_utils
+from utils.cache_utils import TTLCache
+from utils.config import TABLE_METADATA_TTL_S, TABLE_METADATA_MAX_TABLES
+
+# ----------------------------------------------------------------------
+# Column metadata of the target tables, read from pg_catalog.
+#
+# One query loads every requested table; results are cached per table for
+# TABLE_METADATA_TTL_S seconds. invalidate_table_metadata() drops entries
+# (all tables or some), e.g. after DDL; the DML renderer also reloads a
+# table once before rejecting a column it does not know.
+#
+# Per table: {column: {"type": "numeric(12,2)", "category": "N",
+#                      "not_null": bool, "has_default": bool}}
+# "category" is pg_type.typcategory (N numeric, B boolean, D date/time,
+# S string, ...).
+# ----------------------------------------------------------------------
+
+COLUMNS_QUERY = """
+    SELECT r.name,
+           a.attname,
+           format_type(a.atttypid, a.atttypmod),
+           t.typcategory,
+           a.attnotnull,
+           a.atthasdef
+      FROM unnest(%s::text[]) AS r(name)
+      JOIN pg_attribute a ON a.attrelid = to_regclass(r.name)
+      JOIN pg_type t ON t.oid = a.atttypid
+     WHERE a.attnum > 0
+       AND NOT a.attisdropped
+     ORDER BY r.name, a.attnum
+"""
+
+_metadata_cache = TTLCache(max_entries=TABLE_METADATA_MAX_TABLES, ttl_s=TABLE_METADATA_TTL_S)
+
+
+def _rows_to_metadata(tables: List[str], rows: Iterable[tuple]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    result = {table: {} for table in tables}
+    for table, column, col_type, category, not_null, has_default in rows:
+        result[table][column] = {
+            "type": col_type,
+            "category": category,
+            "not_null": not_null,
+            "has_default": has_default,
+        }
+    return result
+
+
+def _split_cached(tables: Iterable[str]) -> tuple:
+    found, missing = {}, []
+    for table in dict.fromkeys(tables):
+        columns = _metadata_cache.get(table)
+        if columns is None:
+            missing.append(table)
+        else:
+            found[table] = columns
+    return found, missing
+
+
+def _store(loaded: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+    # unknown tables are not cached: they may be created later
+    for table, columns in loaded.items():
+        if columns:
+            _metadata_cache.set(table, columns)
+
+
+def load_table_metadata(tables: Iterable[str], use_cache: bool = True) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Columns per table; unknown tables map to {}."""
+    found, missing = _split_cached(tables) if use_cache else ({}, list(dict.fromkeys(tables)))
+    if missing:
+        loaded = _rows_to_metadata(missing, db_utils.fetch_all_sync(COLUMNS_QUERY, (missing,)))
+        _store(loaded)
+        found.update(loaded)
+    return found
+
+
+async def load_table_metadata_async(tables: Iterable[str],
+                                    use_cache: bool = True) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    found, missing = _split_cached(tables) if use_cache else ({}, list(dict.fromkeys(tables)))
+    if missing:
+        loaded = _rows_to_metadata(missing, await db_utils.fetch_all(COLUMNS_QUERY, (missing,)))
+        _store(loaded)
+        found.update(loaded)
+    return found
+
+
+def invalidate_table_metadata(tables: Optional[Iterable[str]] = None) -> None:
+    if tables is None:
+        _metadata_cache.clear()
+        return
+    for table in tables:
+        _metadata_cache.invalidate(table)
+
+
+def table_metadata_stats() -> Dict[str, int]:
+    return dict(_metadata_cache.stats)